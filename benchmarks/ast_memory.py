@@ -0,0 +1,43 @@
+"""Measures the memory retained by a parsed AST of about 100k nodes.
+
+Run with: poetry run python -m benchmarks.ast_memory
+"""
+import dataclasses
+import time
+import tracemalloc
+
+from compiler import ast
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from benchmarks.programs import straight_line
+
+
+def count_nodes(root: ast.Expression) -> int:
+    count = 0
+    stack: list[object] = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Expression):
+            count += 1
+            stack.extend(getattr(node, f.name) for f in dataclasses.fields(node))
+        elif isinstance(node, (list, tuple)):
+            stack.extend(node)
+    return count
+
+
+def main() -> None:
+    source = straight_line(7_700)
+    tokens = tokenize(source)
+    tracemalloc.start()
+    start = time.perf_counter()
+    tree = parse(tokens)
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nodes = count_nodes(tree)
+    print(f'{nodes} nodes parsed in {elapsed:.3f}s')
+    print(f'{retained / 2**20:.1f} MiB retained ({retained / nodes:.0f} bytes/node), peak {peak / 2**20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Streams compiles over one connection to 'serve --async', and
+compares with one connection per compile to the forking server.
+
+Run with: poetry run python -m benchmarks.async_server
+"""
+import json
+import socket
+import struct
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PORT = 3919
+COMPILES = 300
+SOURCES = [f'var i = 0; while i < {n} do {{ print_int(i * {n}); i = i + 1 }}' for n in range(COMPILES)]
+
+
+def start_server(*flags: str) -> subprocess.Popen[bytes]:
+    server = subprocess.Popen([sys.executable, '-m', 'compiler', 'serve', f'--port={PORT}', '--no-cache', *flags], stdout=subprocess.DEVNULL)
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', PORT)).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+
+
+def framed() -> float:
+    start = time.perf_counter()
+    with socket.create_connection(('127.0.0.1', PORT)) as connection:
+        for i, source in enumerate(SOURCES):
+            payload = json.dumps({'id': i, 'command': 'compile', 'code': source}).encode()
+            connection.sendall(struct.pack('>I', len(payload)) + payload)
+        stream = connection.makefile('rb')
+        for _ in SOURCES:
+            (size,) = struct.unpack('>I', stream.read(4))
+            assert 'program' in json.loads(stream.read(size))
+    return time.perf_counter() - start
+
+
+def connection_per_compile(source: str) -> None:
+    with socket.create_connection(('127.0.0.1', PORT)) as connection:
+        connection.sendall(json.dumps({'command': 'compile', 'code': source}).encode())
+        connection.shutdown(socket.SHUT_WR)
+        assert 'program' in json.loads(connection.makefile('rb').read())
+
+
+def main() -> None:
+    server = start_server('--async')
+    try:
+        seconds = framed()
+        print(f'--async, one connection:      {COMPILES} compiles in {seconds:.2f}s ({COMPILES / seconds:.0f}/s)')
+    finally:
+        server.terminate()
+        server.wait()
+
+    server = start_server()
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(connection_per_compile, SOURCES))
+        seconds = time.perf_counter() - start
+        print(f'forking, connection per compile: {COMPILES} compiles in {seconds:.2f}s ({COMPILES / seconds:.0f}/s)')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Compiles many small programs through 'serve', one request per program
+and then as a single 'compile_batch', streamed and not.
+
+Run with: poetry run python -m benchmarks.batch_compile [serve flags...]
+for example '--batch-workers=4'.
+"""
+import json
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+PORT = 3918
+PROGRAMS = 500
+CONNECTIONS = 8
+
+
+def source(i: int) -> str:
+    return f'var x = {i}; while x > 0 do {{ print_int(x); x = x - 7 }}'
+
+
+def send(request: dict[str, Any]) -> bytes:
+    with socket.create_connection(('127.0.0.1', PORT)) as connection:
+        connection.sendall(json.dumps(request).encode())
+        connection.shutdown(socket.SHUT_WR)
+        return connection.makefile('rb').read()
+
+
+def main() -> None:
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'compiler', 'serve', f'--port={PORT}', '--no-cache', *sys.argv[1:]],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                send({'command': 'ping'})
+                break
+            except OSError:
+                time.sleep(0.05)
+        sources = [source(i) for i in range(PROGRAMS)]
+
+        def compile_one(code: str) -> None:
+            assert 'program' in json.loads(send({'command': 'compile', 'code': code}))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=CONNECTIONS) as executor:
+            list(executor.map(compile_one, sources))
+        print(f'{PROGRAMS} compile requests over {CONNECTIONS} connections: {time.perf_counter() - start:.2f}s')
+
+        start = time.perf_counter()
+        results = json.loads(send({'command': 'compile_batch', 'codes': sources}))['results']
+        assert all('program' in result for result in results)
+        print(f'one compile_batch of {PROGRAMS}: {time.perf_counter() - start:.2f}s')
+
+        start = time.perf_counter()
+        first: float | None = None
+        count = 0
+        with socket.create_connection(('127.0.0.1', PORT)) as connection:
+            connection.sendall(json.dumps({'command': 'compile_batch', 'codes': sources, 'stream': True}).encode())
+            connection.shutdown(socket.SHUT_WR)
+            for line in connection.makefile('rb'):
+                assert 'program' in json.loads(line)
+                if first is None:
+                    first = time.perf_counter() - start
+                count += 1
+        assert count == PROGRAMS and first is not None
+        print(f'streamed compile_batch of {PROGRAMS}: {time.perf_counter() - start:.2f}s, first result after {first * 1000:.0f} ms')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
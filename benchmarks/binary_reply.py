@@ -0,0 +1,93 @@
+"""Fetches a large executable from 'serve' repeatedly with each reply
+format: base64 in JSON, raw bytes, and raw bytes compressed with zlib.
+
+The program is cached by the server after the first request, so this
+measures sending the executable rather than compiling it.
+
+Run with: poetry run python -m benchmarks.binary_reply [serve flags...]
+"""
+import json
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from base64 import b64decode
+from typing import Any, Callable
+
+from benchmarks.programs import straight_line
+
+PORT = 3919
+REQUESTS = 50
+
+
+def best_of(n: int, f: Callable[[], Any]) -> float:
+    best = float('inf')
+    for _ in range(n):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def send(request: dict[str, Any]) -> bytes:
+    with socket.create_connection(('127.0.0.1', PORT)) as connection:
+        connection.sendall(json.dumps(request).encode())
+        connection.shutdown(socket.SHUT_WR)
+        return connection.makefile('rb').read()
+
+
+def fetch_json(code: str) -> bytes:
+    return b64decode(json.loads(send({'command': 'compile', 'code': code}))['program'])
+
+
+def fetch_binary(code: str, compression: str | None = None) -> tuple[bytes, int]:
+    request: dict[str, Any] = {'command': 'compile', 'code': code, 'format': 'binary'}
+    if compression is not None:
+        request['compression'] = compression
+    header, data = send(request).split(b'\n', 1)
+    assert len(data) == json.loads(header)['size']
+    return (zlib.decompress(data) if compression == 'zlib' else data), len(data)
+
+
+def main() -> None:
+    code = straight_line(20000)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'compiler', 'serve', f'--port={PORT}', f'--cache-dir={cache_dir}', *sys.argv[1:]],
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            while True:
+                try:
+                    send({'command': 'ping'})
+                    break
+                except OSError:
+                    time.sleep(0.05)
+            executable = fetch_json(code)
+            assert fetch_binary(code)[0] == executable
+            assert fetch_binary(code, 'zlib')[0] == executable
+            json_size = len(send({'command': 'compile', 'code': code}))
+            compressed_size = fetch_binary(code, 'zlib')[1]
+            print(f'executable: {len(executable)} bytes, JSON reply {json_size} bytes, zlib {compressed_size} bytes')
+
+            def run(fetch: Callable[[], Any]) -> Callable[[], None]:
+                def requests() -> None:
+                    for _ in range(REQUESTS):
+                        fetch()
+                return requests
+
+            for name, fetch in [
+                ('json', lambda: fetch_json(code)),
+                ('binary', lambda: fetch_binary(code)),
+                ('binary+zlib', lambda: fetch_binary(code, 'zlib')),
+            ]:
+                print(f'{name:12} {best_of(3, run(fetch)) / REQUESTS * 1000:.2f} ms per request')
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Measures building control-flow graphs and linearizing them back,
+for programs of growing size. The time per instruction should stay flat.
+
+Run with: poetry run python -m benchmarks.cfg_build
+"""
+import gc
+import time
+from typing import Any, Callable
+
+from benchmarks.loop_ir import loop_heavy
+from compiler.cfg import build_cfgs, linearize
+from compiler.ir_generator import generate_ir
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from compiler.type_checker import type_mappings, typecheck
+
+
+def best_of(n: int, f: Callable[[], Any]) -> float:
+    best = float('inf')
+    for _ in range(n):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    # Like timeit, keep the collector from adding noise
+    gc.disable()
+    for loops in [100, 400, 1600]:
+        tree = parse(tokenize(loop_heavy(loops)))
+        typecheck(tree)
+        instructions = generate_ir(set(type_mappings.keys()), tree)
+        build = best_of(10, lambda: build_cfgs(instructions))
+        graphs = build_cfgs(instructions)
+        blocks = sum(len(graph.blocks) for graph in graphs)
+        assert linearize(graphs) == instructions
+        round_trip = best_of(10, lambda: linearize(build_cfgs(instructions)))
+        print(f'{len(instructions):6} instructions, {blocks:5} blocks: build {build * 1000:6.2f}ms '
+              f'({build / len(instructions) * 1e9:.0f} ns per instruction), '
+              f'build and linearize {round_trip * 1000:6.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Compares the memory of the dataclass IR against 'CompactIR', and
+measures converting between them.
+
+Run with: poetry run python -m benchmarks.compact_ir
+"""
+import gc
+import time
+import tracemalloc
+from typing import Callable, TypeVar
+
+from compiler.ir import from_compact, to_compact
+from compiler.ir_generator import generate_ir
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from compiler.type_checker import type_mappings, typecheck
+from benchmarks.programs import straight_line
+
+T = TypeVar('T')
+
+
+def retained(make: Callable[[], T]) -> tuple[T, int]:
+    tracemalloc.start()
+    result = make()
+    # The IR generator's closures form cycles that hold on to its temporaries
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def best_of(n: int, f: Callable[[], object]) -> float:
+    best = float('inf')
+    for _ in range(n):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    tree = parse(tokenize(straight_line(20_000)))
+    typecheck(tree)
+    reserved_names = set(type_mappings.keys())
+    instructions, ir_bytes = retained(lambda: generate_ir(reserved_names, tree))
+    # Measured with the dataclass IR freed, so that the
+    # variable names CompactIR keeps are counted too.
+    code, compact_bytes = retained(lambda: to_compact(generate_ir(reserved_names, tree)))
+    count = len(instructions)
+    print(f'{count} instructions')
+    print(f'  dataclass IR: {ir_bytes / count:6.1f} bytes/instruction')
+    print(f'  CompactIR:    {compact_bytes / count:6.1f} bytes/instruction')
+
+    print(f'conversion: to_compact {best_of(3, lambda: to_compact(instructions)):.3f}s, '
+          f'from_compact {best_of(3, lambda: from_compact(code)):.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Measures the constant propagation pass on large programs, and the
+running time of an executable before and after it.
+
+Run with: poetry run python -m benchmarks.constant_folding
+"""
+import gc
+import os
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable
+
+from benchmarks.loop_ir import loop_heavy
+from benchmarks.programs import straight_line
+from compiler import ir
+from compiler.assembler import assemble_and_get_executable
+from compiler.assembly_generator import generate_assembly
+from compiler.cfg import build_cfgs
+from compiler.ir_generator import generate_ir
+from compiler.optimizer import optimize, propagate_constants
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from compiler.type_checker import type_mappings, typecheck
+
+# The loop body is mostly arithmetic on constants
+hot_loop = '''
+var i = 0;
+var seconds = 0;
+while i < 20000000 do {
+    seconds = seconds + 60 * 60 * 24 * 7 % 1000 + (1 - 2) * 3 / 2;
+    if 2 * 3 > 5 then i = i + 1 else i = i + 2;
+}
+print_int(seconds);
+'''
+
+
+def best_of(n: int, f: Callable[[], Any]) -> float:
+    best = float('inf')
+    for _ in range(n):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def generate(source: str) -> list[ir.Instruction]:
+    tree = parse(tokenize(source))
+    typecheck(tree)
+    return generate_ir(set(type_mappings.keys()), tree)
+
+
+def count_calls(instructions: list[ir.Instruction]) -> int:
+    return sum(isinstance(insn, ir.Call) for insn in instructions)
+
+
+def main() -> None:
+    for name, source in [
+        ('straight_line(5000)', straight_line(5000)),
+        ('loop_heavy(1600)', loop_heavy(1600)),
+    ]:
+        instructions = generate(source)
+        # Like timeit, keep the collector from adding noise
+        gc.disable()
+        elapsed = best_of(3, lambda: [propagate_constants(graph) for graph in build_cfgs(instructions)])
+        gc.enable()
+        print(f'{name}: {len(instructions)} instructions, calls {count_calls(instructions)} -> '
+              f'{count_calls(optimize(instructions))}, {elapsed * 1000:.0f}ms')
+
+    instructions = generate(hot_loop)
+    with tempfile.TemporaryDirectory() as directory:
+        for name, program in [('unoptimized', instructions), ('optimized', optimize(instructions))]:
+            executable = os.path.join(directory, name)
+            with open(executable, 'wb') as f:
+                f.write(assemble_and_get_executable(assembly_code=generate_assembly(program), backend='native'))
+            os.chmod(executable, 0o755)
+            output = subprocess.run([executable], capture_output=True, check=True).stdout.decode().strip()
+            elapsed = best_of(3, lambda: subprocess.run([executable], check=True, capture_output=True))
+            print(f'hot loop, {name}: {count_calls(program)} calls, prints {output}, {elapsed * 1000:.0f}ms')
+
+
+if __name__ == '__main__':
+    main()
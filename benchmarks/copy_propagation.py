@@ -0,0 +1,76 @@
+"""Measures how many instructions and copies copy propagation and
+coalescing remove, and how long they take.
+
+Run with: poetry run python -m benchmarks.copy_propagation
+"""
+import gc
+import os
+import time
+
+from benchmarks.loop_ir import loop_heavy
+from benchmarks.programs import straight_line
+from compiler import ir
+from compiler.cfg import build_cfgs, linearize
+from compiler.ir_generator import generate_ir
+from compiler.optimizer import coalesce_copies, propagate_constants, propagate_copies
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from compiler.type_checker import type_mappings, typecheck
+
+# Small programs in the style of the tests
+corpus = [
+    'var x = 1; var y = x; y = y + read_int(); print_int(y)',
+    'var a = read_int(); var b = if a > 0 then a else -a; print_int(b)',
+    'var n = read_int(); var i = 0; var s = 0; while i < n do { s = s + i; i = i + 1; } print_int(s)',
+    'fun sq(x: Int): Int { var y = x; return y * y; } var i = read_int(); print_int(sq(i) + sq(i + 1))',
+    'var t = read_int() > 3 and read_int() < 5 or false; print_bool(t)',
+    'fun g(h: (Int) => Int): Int { var k = h; return k(1); } fun f(x: Int): Int { return x; } print_int(g(f))',
+]
+
+
+def generate(source: str) -> list[ir.Instruction]:
+    tree = parse(tokenize(source))
+    typecheck(tree)
+    return generate_ir(set(type_mappings.keys()), tree)
+
+
+def count_copies(instructions: list[ir.Instruction]) -> int:
+    return sum(isinstance(insn, ir.Copy) for insn in instructions)
+
+
+def main() -> None:
+    repo_test = os.path.join(os.path.dirname(__file__), '..', 'test')
+    with open(repo_test) as f:
+        programs = [('corpus', source) for source in corpus] + [('corpus', f.read())]
+    programs += [('straight_line(5000)', straight_line(5000)), ('loop_heavy(1600)', loop_heavy(1600))]
+
+    totals: dict[str, list[int]] = {}
+    for name, source in programs:
+        instructions = generate(source)
+        graphs = build_cfgs(instructions)
+        for graph in graphs:
+            propagate_constants(graph)
+        graphs = build_cfgs(linearize(graphs))
+        folded = linearize(graphs)
+        # Like timeit, keep the collector from adding noise
+        gc.disable()
+        start = time.perf_counter()
+        for graph in graphs:
+            propagate_copies(graph)
+            coalesce_copies(graph)
+        elapsed = time.perf_counter() - start
+        gc.enable()
+        coalesced = linearize(graphs)
+        counts = [len(folded), len(coalesced), count_copies(folded), count_copies(coalesced)]
+        if name == 'corpus':
+            totals[name] = [a + b for a, b in zip(totals.get(name, [0] * 4), counts)]
+        else:
+            totals[name] = counts
+            print(f'{name}: {elapsed * 1000:.0f}ms')
+    for name, (before, after, copies_before, copies_after) in totals.items():
+        print(f'{name}: instructions {before} -> {after} ({(before - after) / before:.1%} fewer), '
+              f'copies {copies_before} -> {copies_after}')
+
+
+if __name__ == '__main__':
+    main()
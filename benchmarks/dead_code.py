@@ -0,0 +1,82 @@
+"""Compares executables compiled with and without the optimization
+passes: IR instructions, assembly lines, executable size and running
+time.
+
+Run with: poetry run python -m benchmarks.dead_code
+"""
+import gc
+import os
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable
+
+from benchmarks.loop_ir import loop_heavy
+from benchmarks.programs import straight_line
+from compiler import ir
+from compiler.assembler import assemble_and_get_executable
+from compiler.assembly_generator import generate_assembly
+from compiler.ir_generator import generate_ir
+from compiler.optimizer import optimize
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from compiler.type_checker import type_mappings, typecheck
+
+# Computes values it never uses, in statement position and in branches
+hot_loop = '''
+var i = 0;
+var total = 0;
+while i < 20000000 do {
+    var square = i * i;
+    var parity = if i % 2 == 0 then { square + 1; 1 } else 0;
+    if parity == 1 then total = total + parity;
+    i = i + 1;
+}
+print_int(total);
+'''
+
+
+def best_of(n: int, f: Callable[[], Any]) -> float:
+    best = float('inf')
+    for _ in range(n):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def generate(source: str) -> list[ir.Instruction]:
+    tree = parse(tokenize(source))
+    typecheck(tree)
+    return generate_ir(set(type_mappings.keys()), tree)
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        for name, source in [
+            ('hot loop', hot_loop),
+            ('straight_line(2000)', straight_line(2000)),
+            ('loop_heavy(400)', loop_heavy(400)),
+        ]:
+            instructions = generate(source)
+            # Like timeit, keep the collector from adding noise
+            gc.disable()
+            elapsed = best_of(3, lambda: optimize(instructions))
+            gc.enable()
+            print(f'{name}: optimize {elapsed * 1000:.0f}ms')
+            outputs = []
+            for label, program in [('before', instructions), ('after', optimize(instructions))]:
+                assembly = generate_assembly(program)
+                executable = os.path.join(directory, label)
+                with open(executable, 'wb') as f:
+                    f.write(assemble_and_get_executable(assembly_code=assembly, backend='native'))
+                os.chmod(executable, 0o755)
+                outputs.append(subprocess.run([executable], capture_output=True, check=True).stdout)
+                running = best_of(3, lambda: subprocess.run([executable], capture_output=True, check=True))
+                print(f'  {label}: {len(program)} instructions, {assembly.count(chr(10))} lines of assembly, '
+                      f'{os.path.getsize(executable)} bytes, runs in {running * 1000:.1f}ms')
+            assert outputs[0] == outputs[1]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Measures IR generation on a loop-heavy program full of break and continue.
+
+Run with: poetry run python -m benchmarks.loop_ir
+"""
+import gc
+import time
+
+from compiler.ir_generator import generate_ir
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from compiler.type_checker import SymTab, type_mappings, typecheck
+
+
+def loop_heavy(loops: int) -> str:
+    lines = ['var n = 0;']
+    for i in range(loops):
+        lines.append(f'''var i{i} = 0;
+while true do {{
+    i{i} = i{i} + 1;
+    if i{i} % 3 == 0 then {{ continue; n = n + 1; }}
+    while n < i{i} do {{ n = n + 2; if n > {i} then break; n = n - 1; }}
+    if i{i} > {i % 10} then {{ break; print_int(i{i}); }} else {{ n = n + 1; }};
+    n = n + i{i};
+}}''')
+    lines.append('n')
+    return '\n'.join(lines)
+
+
+def main() -> None:
+    source = loop_heavy(300)
+    tokens = tokenize(source)
+    tree = parse(tokens)
+    typecheck(tree, SymTab(mapping=dict(type_mappings)))
+    best = float('inf')
+    # Like timeit, keep the collector from adding noise
+    gc.disable()
+    for _ in range(50):
+        start = time.perf_counter()
+        instructions = generate_ir(set(type_mappings.keys()), tree)
+        best = min(best, time.perf_counter() - start)
+    print(f'{len(tokens)} tokens: {len(instructions)} IR instructions in {best * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Compares reading a large source file into a 'str' against memory-mapping it.
+
+Each variant runs in a fresh process so that peak RSS is measured separately.
+
+Run with: poetry run python -m benchmarks.mmap_source
+"""
+import mmap
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+
+from compiler.tokenizer import iter_tokens
+from benchmarks.programs import straight_line
+
+
+def run_variant(variant: str, file_name: str) -> None:
+    start = time.perf_counter()
+    if variant == 'read':
+        with open(file_name) as f:
+            source = f.read()
+        count = sum(1 for _ in iter_tokens(source))
+    else:
+        with open(file_name, 'rb') as binary_file, mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            count = sum(1 for _ in iter_tokens(mapped))
+    elapsed = time.perf_counter() - start
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f'{variant:>5}: {count} tokens, {elapsed:.3f}s, peak RSS {max_rss_kb / 1024:.1f} MiB')
+
+
+def main() -> None:
+    if len(sys.argv) == 3:
+        run_variant(sys.argv[1], sys.argv[2])
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        file_name = path.join(tmp, 'big.src')
+        with open(file_name, 'w') as f:
+            for _ in range(8):
+                f.write(straight_line(20_000))
+        print(f'source: {path.getsize(file_name) / 2**20:.1f} MiB')
+        for variant in ['read', 'mmap']:
+            subprocess.run([sys.executable, '-m', 'benchmarks.mmap_source', variant, file_name], check=True)
+
+
+if __name__ == '__main__':
+    main()
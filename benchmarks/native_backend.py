@@ -0,0 +1,34 @@
+"""Compares compile latency with the 'binutils' and 'native' backends.
+
+Run with: poetry run python -m benchmarks.native_backend
+"""
+import time
+from typing import Any, Callable
+
+from compiler.__main__ import call_compiler
+from benchmarks.programs import straight_line
+
+
+def best_of(n: int, f: Callable[[], Any]) -> float:
+    best = float('inf')
+    for _ in range(n):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    programs = {
+        'small program': 'fun f(x: Int): Int { return x * 2; } var i = 0; while i < 10 do { print_int(f(i)); i = i + 1 }',
+        'straight_line(2000)': straight_line(2000),
+    }
+    for label, source in programs.items():
+        print(f'{label}:')
+        for backend in ['binutils', 'native']:
+            seconds = best_of(10, lambda: call_compiler(source, backend=backend))
+            print(f'  {backend:8}  {seconds * 1000:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
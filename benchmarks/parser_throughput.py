@@ -0,0 +1,35 @@
+"""Measures parse throughput on operator-heavy expressions.
+
+Run with: poetry run python -m benchmarks.parser_throughput
+"""
+import random
+import time
+
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+
+OPERATORS = ['or', 'and', '==', '!=', '<', '<=', '>', '>=', '+', '-', '*', '/', '%']
+
+
+def operator_chain(rng: random.Random, operands: int) -> str:
+    parts = [f'a{rng.randrange(100)}']
+    for _ in range(operands - 1):
+        parts.append(rng.choice(OPERATORS))
+        parts.append(f'a{rng.randrange(100)}' if rng.random() < 0.8 else str(rng.randrange(1000)))
+    return ' '.join(parts)
+
+
+def main() -> None:
+    rng = random.Random(1)
+    source = '{\n' + ';\n'.join(operator_chain(rng, 40) for _ in range(5_000)) + '\n}\n'
+    tokens = tokenize(source)
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        parse(tokens)
+        best = min(best, time.perf_counter() - start)
+    print(f'{len(tokens)} tokens parsed in {best:.3f}s ({len(tokens) / best / 1e6:.2f} M tokens/s)')
+
+
+if __name__ == '__main__':
+    main()
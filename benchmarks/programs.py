@@ -0,0 +1,16 @@
+"""Generators for large synthetic source programs used by the benchmarks."""
+
+
+def straight_line(n: int) -> str:
+    """A block of `n` small statements mixing declarations, arithmetic,
+    comparisons, loops and calls."""
+    lines = ['{']
+    for i in range(n):
+        lines.append(f'    var v{i} = {i} * 3 + {i % 7} - (v{i - 1} % 5);' if i > 0 else '    var v0 = 1;')
+        if i % 10 == 9:
+            lines.append(f'    while v{i} > 100 do {{ v{i} = v{i} / 2; }}')
+        if i % 25 == 24:
+            lines.append(f'    if v{i} >= 10 and not (v{i} == 11) then print_int(v{i}) else print_bool(true);')
+    lines.append(f'    v{n - 1}')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,44 @@
+"""Compares saving and loading the typed AST and the IR against pickle.
+
+Run with: poetry run python -m benchmarks.serialization
+"""
+import pickle
+import time
+from typing import Any, Callable
+
+from compiler.ir_generator import generate_ir
+from compiler.parser import parse
+from compiler.serialization import dump_ast, dump_ir, load_ast, load_ir
+from compiler.tokenizer import tokenize
+from compiler.type_checker import type_mappings, typecheck
+from benchmarks.programs import straight_line
+
+
+def best_of(n: int, f: Callable[[], Any]) -> float:
+    best = float('inf')
+    for _ in range(n):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def compare(label: str, value: Any, dump: Callable[[Any], bytes], load: Callable[[bytes], Any]) -> None:
+    ours = dump(value)
+    pickled = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    assert load(ours) == value
+    print(f'{label}:')
+    print(f'  ours:   {len(ours) / 2**20:5.1f} MiB, save {best_of(3, lambda: dump(value)):.3f}s, load {best_of(3, lambda: load(ours)):.3f}s')
+    print(f'  pickle: {len(pickled) / 2**20:5.1f} MiB, save {best_of(3, lambda: pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)):.3f}s, load {best_of(3, lambda: pickle.loads(pickled)):.3f}s')
+
+
+def main() -> None:
+    tree = parse(tokenize(straight_line(20_000)))
+    typecheck(tree)
+    instructions = generate_ir(set(type_mappings.keys()), tree)
+    compare('typed AST', tree, dump_ast, load_ast)
+    compare(f'IR ({len(instructions)} instructions)', instructions, dump_ir, load_ir)
+
+
+if __name__ == '__main__':
+    main()
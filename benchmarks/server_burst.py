@@ -0,0 +1,97 @@
+"""Sends a burst of concurrent compile requests to 'serve' and reports
+latency percentiles and the peak number of server processes.
+
+Run with: poetry run python -m benchmarks.server_burst [serve flags...]
+for example '--workers=2 --max-requests=100'.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PORT = 3917
+REQUESTS = 64
+SOURCE = 'fun f(x: Int): Int { return x * 2; } var i = 0; while i < 10 do { print_int(f(i)); i = i + 1 }'
+
+
+def send(request: dict[str, str]) -> dict[str, str]:
+    with socket.create_connection(('127.0.0.1', PORT)) as connection:
+        connection.sendall(json.dumps(request).encode())
+        connection.shutdown(socket.SHUT_WR)
+        reply: dict[str, str] = json.loads(connection.makefile('rb').read())
+        return reply
+
+
+def descendants(pid: int) -> int:
+    children: dict[int, list[int]] = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    parent = int(f.read().rsplit(')', 1)[1].split()[1])
+            except OSError:
+                continue
+            children.setdefault(parent, []).append(int(entry))
+    count = 0
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            count += 1
+            stack.append(child)
+    return count
+
+
+def main() -> None:
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'compiler', 'serve', f'--port={PORT}', '--no-cache', *sys.argv[1:]],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                send({'command': 'ping'})
+                break
+            except OSError:
+                time.sleep(0.05)
+
+        peak = 0
+        done = threading.Event()
+
+        def sample() -> None:
+            nonlocal peak
+            while not done.is_set():
+                peak = max(peak, descendants(server.pid))
+                time.sleep(0.005)
+
+        def timed_compile(_: int) -> float:
+            start = time.perf_counter()
+            reply = send({'command': 'compile', 'code': SOURCE})
+            assert 'program' in reply, reply
+            return time.perf_counter() - start
+
+        sampler = threading.Thread(target=sample)
+        sampler.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=REQUESTS) as executor:
+            latencies = sorted(executor.map(timed_compile, range(REQUESTS)))
+        total = time.perf_counter() - start
+        done.set()
+        sampler.join()
+
+        def percentile(p: float) -> float:
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+        print(f'{REQUESTS} requests in {total:.2f}s: p50 {percentile(0.5):.0f} ms, '
+              f'p99 {percentile(0.99):.0f} ms, max {latencies[-1] * 1000:.0f} ms, '
+              f'peak {peak} processes under the server')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
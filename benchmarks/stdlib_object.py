@@ -0,0 +1,45 @@
+"""Measures the per-compile latency of assembling and linking,
+and how much of it assembling the standard library used to take.
+
+Run with: poetry run python -m benchmarks.stdlib_object
+"""
+import tempfile
+import time
+from os import path
+from typing import Any, Callable
+
+from compiler.assembler import _assemble_stdlib, assemble_and_get_executable, stdlib_object
+from compiler.assembly_generator import generate_assembly
+from compiler.ir_generator import generate_ir
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from compiler.type_checker import type_mappings, typecheck
+
+
+def best_of(n: int, f: Callable[[], Any]) -> float:
+    best = float('inf')
+    for _ in range(n):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    tree = parse(tokenize('var x = read_int(); while x > 0 do { print_int(x); x = x - 1 }'))
+    typecheck(tree)
+    assembly = generate_assembly(generate_ir(set(type_mappings.keys()), tree))
+    stdlib_object(link_with_c=False)
+
+    def assemble_stdlib() -> None:
+        with tempfile.TemporaryDirectory() as wd:
+            _assemble_stdlib(False, wd, path.join(wd, 'stdlib.o'))
+
+    compile_time = best_of(20, lambda: assemble_and_get_executable(assembly))
+    stdlib_time = best_of(20, assemble_stdlib)
+    print(f'assemble and link, prebuilt stdlib: {compile_time * 1000:.1f} ms')
+    print(f'assembling the stdlib on its own:   {stdlib_time * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
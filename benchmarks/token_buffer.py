@@ -0,0 +1,32 @@
+"""Compares memory and time of 'tokenize()' against 'TokenBuffer'.
+
+Run with: poetry run python -m benchmarks.token_buffer
+"""
+import time
+import tracemalloc
+from typing import Callable, Sized
+
+from compiler.tokenizer import TokenBuffer, tokenize
+from benchmarks.programs import straight_line
+
+
+def measure(label: str, make: Callable[[], Sized]) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    tokens = make()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(tokens)
+    print(f'{label:>12}: {count} tokens, {elapsed:.3f}s, {current / count:.1f} bytes/token retained, {peak / count:.1f} bytes/token peak')
+
+
+def main() -> None:
+    source = straight_line(20_000)
+    print(f'source: {len(source)} characters')
+    measure('tokenize', lambda: tokenize(source))
+    measure('TokenBuffer', lambda: TokenBuffer(source))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""Measures type checking time on a program dominated by function calls.
+
+Run with: poetry run python -m benchmarks.type_checker_calls
+"""
+import time
+
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from compiler.type_checker import typecheck
+
+
+def call_heavy(functions: int, calls: int) -> str:
+    lines = []
+    for i in range(functions):
+        lines.append(f'fun f{i}(a: Int, b: Bool, c: Int): Int {{ if b then return a + c; return a - c; }}')
+    lines.append('var total = 0;')
+    for i in range(calls):
+        f = i % functions
+        lines.append(f'total = total + f{f}(total, total < {i}, f{(f + 1) % functions}({i}, true, {i}));')
+    lines.append('total')
+    return '\n'.join(lines)
+
+
+def main() -> None:
+    source = call_heavy(50, 20_000)
+    tokens = tokenize(source)
+    best = float('inf')
+    for _ in range(5):
+        tree = parse(tokens)
+        start = time.perf_counter()
+        typecheck(tree)
+        best = min(best, time.perf_counter() - start)
+    print(f'type checked {len(tokens)} tokens in {best:.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,97 @@
 from base64 import b64encode
+import asyncio
+import gc
+import importlib
+import io
 import json
+import mmap
+import os
 import re
+import signal
+import socket
+import struct
 import sys
-from socketserver import ForkingTCPServer, StreamRequestHandler
+import zlib
+from collections.abc import AsyncIterator, Generator, Iterator
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import partial
+from socketserver import BaseServer, ForkingTCPServer, StreamRequestHandler, TCPServer
 from traceback import format_exception
-from typing import Any
-from compiler.tokenizer import tokenize
+from typing import Any, BinaryIO, Callable
+from compiler.tokenizer import SourceBytes, iter_tokens
 from compiler.parser import parse
 from compiler.type_checker import type_mappings, typecheck
 from compiler.ir_generator import generate_ir
+from compiler.optimizer import optimize
 from compiler.assembly_generator import generate_assembly
-from compiler.assembler import assemble_and_get_executable
+from compiler.assembler import assemble_and_get_executable, assemble_and_get_executable_async, backends, executable_file
+from compiler.cache import ExecutableCache, default_cache_dir
 
+# Compressions a client can ask the executable to be sent with. Fast
+# levels, as compressing only pays off if it takes less time than
+# sending the bytes it saves.
+compressions: dict[str, Callable[[bytes], bytes]] = {'zlib': partial(zlib.compress, level=1)}
+try:
+    # In the standard library since Python 3.14
+    compressions['zstd'] = importlib.import_module('compression.zstd').compress
+except ImportError:
+    pass
 
-def call_compiler(source_code: str) -> bytes:
+
+def call_compiler(source_code: str | SourceBytes, cache: ExecutableCache | None = None, backend: str = 'binutils') -> bytes:
     # *** TODO ***
     # Call your compiler here and return the compiled executable.
     # Raise an exception on compilation error.
     # *** TODO ***
     #raise NotImplementedError("Compiler not implemented")
-    tokens = tokenize(source_code=source_code)
-    ast_tree = parse(tokens=tokens)
+    # Raw bytes (e.g. a memory-mapped file) are lexed in place
+    # and token text is only decoded as the parser reads it.
+    if cache is not None:
+        key = cache.key(source_code, {'backend': backend})
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    assembly = compile_to_assembly(source_code)
+    executable = assemble_and_get_executable(assembly_code=assembly, backend=backend)
+    if cache is not None:
+        cache.put(key, executable)
+    return executable
+
+
+@contextmanager
+def open_executable(source_code: str, cache: ExecutableCache | None = None, backend: str = 'binutils') -> Iterator[BinaryIO]:
+    """Like 'call_compiler', but gives the executable as a file open for
+    reading: the cache entry or the linker's output file, if there is one.
+    """
+    key: str | None = None
+    if cache is not None:
+        key = cache.key(source_code, {'backend': backend})
+        cached = cache.open_entry(key)
+        if cached is not None:
+            with cached:
+                yield cached
+            return
+    assembly = compile_to_assembly(source_code)
+    if backend == 'native':
+        executable = assemble_and_get_executable(assembly_code=assembly, backend=backend)
+        if cache is not None and key is not None:
+            cache.put(key, executable)
+        yield io.BytesIO(executable)
+        return
+    with executable_file(assembly) as path:
+        if cache is not None and key is not None:
+            cache.put_file(key, path)
+        with open(path, 'rb') as f:
+            yield f
+
+
+def compile_to_assembly(source_code: str | SourceBytes) -> str:
+    ast_tree = parse(iter_tokens(source_code))
     typecheck(ast_tree)
     reserved_names=set(type_mappings.keys())
     ir = generate_ir(reserved_names=reserved_names, root_expr=ast_tree)
-    assembly = generate_assembly(ir)
-    return assemble_and_get_executable(assembly_code=assembly)
+    return generate_assembly(optimize(ir))
 
 
 
@@ -36,6 +102,13 @@ def main() -> int:
     output_file: str | None = None
     host = "127.0.0.1"
     port = 3000
+    threads: int | None = None
+    use_asyncio = False
+    workers: int | None = None
+    max_requests: int | None = None
+    batch_workers: int | None = None
+    cache_dir: str | None = default_cache_dir()
+    backend = 'binutils'
     for arg in sys.argv[1:]:
         if (m := re.fullmatch(r'--output=(.+)', arg)) is not None:
             output_file = m[1]
@@ -43,6 +116,24 @@ def main() -> int:
             host = m[1]
         elif (m := re.fullmatch(r'--port=(.+)', arg)) is not None:
             port = int(m[1])
+        elif (m := re.fullmatch(r'--threads=([1-9]\d*)', arg)) is not None:
+            threads = int(m[1])
+        elif arg == '--async':
+            use_asyncio = True
+        elif (m := re.fullmatch(r'--workers=([1-9]\d*)', arg)) is not None:
+            workers = int(m[1])
+        elif (m := re.fullmatch(r'--max-requests=([1-9]\d*)', arg)) is not None:
+            max_requests = int(m[1])
+        elif (m := re.fullmatch(r'--batch-workers=([1-9]\d*)', arg)) is not None:
+            batch_workers = int(m[1])
+        elif (m := re.fullmatch(r'--cache-dir=(.+)', arg)) is not None:
+            cache_dir = m[1]
+        elif arg == '--no-cache':
+            cache_dir = None
+        elif (m := re.fullmatch(r'--backend=(.+)', arg)) is not None:
+            if m[1] not in backends:
+                raise Exception(f"Unknown backend: {m[1]}. Valid backends: {', '.join(backends)}")
+            backend = m[1]
         elif arg.startswith('-'):
             raise Exception(f"Unknown argument: {arg}")
         elif command is None:
@@ -52,6 +143,17 @@ def main() -> int:
         else:
             raise Exception("Multiple input files not supported")
 
+    if threads is not None and (workers is not None or use_asyncio):
+        raise Exception("--threads can't be used with --workers or --async")
+    if use_asyncio and max_requests is not None:
+        raise Exception("--max-requests can't be used with --async")
+    if max_requests is not None and workers is None:
+        # Only the worker pool recycles its processes
+        raise Exception("--max-requests requires --workers")
+    if use_asyncio and batch_workers is not None:
+        # Batches share the '--workers' pool
+        raise Exception("--batch-workers can't be used with --async")
+
     valid_commands = ['compile', 'serve']
     if command is None:
         print(f"Error: command argument missing. Valid commands: {', '.join(valid_commands)}", file=sys.stderr)
@@ -68,51 +170,525 @@ def main() -> int:
         else:
             return sys.stdin.read()
 
+    cache: ExecutableCache | None = None
+    if cache_dir is not None:
+        try:
+            cache = ExecutableCache(cache_dir)
+        except OSError as e:
+            print(f"Warning: not using the cache: {e}", file=sys.stderr)
+
     # === Command implementations ===
 
     if command == 'compile':
-        source_code = read_source_code()
         if output_file is None:
             raise Exception("Output file flag --output=... required")
-        executable = call_compiler(source_code)
+        # Large inputs are mapped into memory instead of being copied
+        # into a string. Empty files can't be mapped.
+        if input_file is not None and os.path.getsize(input_file) > 0:
+            with open(input_file, 'rb') as source_file, mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ) as source:
+                executable = call_compiler(source, cache, backend)
+        else:
+            executable = call_compiler(read_source_code(), cache, backend)
         with open(output_file, 'wb') as f:
             f.write(executable)
     elif command == 'serve':
         try:
-            run_server(host, port)
+            if use_asyncio:
+                run_async_server(host, port, workers, cache, backend)
+            else:
+                run_server(host, port, threads, cache, backend, workers, max_requests, batch_workers)
         except KeyboardInterrupt:
             pass
     return 0
 
 
-def run_server(host: str, port: int) -> None:
-    class Server(ForkingTCPServer):
-        allow_reuse_address = True
-        request_queue_size = 32
+def handle_request(request: bytes, cache: ExecutableCache | None = None, backend: str = 'binutils', batch_workers: int | None = None) -> bytes:
+    """Answers one JSON request from a client with a JSON reply."""
+    return b''.join(
+        chunk if isinstance(chunk, bytes) else chunk.read()
+        for chunk in reply_chunks(request, cache, backend, batch_workers)
+    )
+
+
+def reply_chunks(
+    request: bytes,
+    cache: ExecutableCache | None = None,
+    backend: str = 'binutils',
+    batch_workers: int | None = None,
+) -> Generator[bytes | BinaryIO, None, None]:
+    """The reply to one request, in pieces to send as soon as each is ready.
+    A piece is bytes or a file to send the contents of.
+
+    A 'compile' may ask for the executable to be compressed with
+    "compression", which the reply repeats. With "format": "binary" the
+    reply is one line of JSON and, after a successful 'compile', the
+    number of raw bytes of the executable given by its "size". By
+    default the executable is base64 in "program" instead.
+
+    A 'compile_batch' with "stream" set is answered with one line of
+    JSON per program, in the order they finish, each with the "index"
+    of its source. Every other reply is a single JSON object.
+    """
+    result: dict[str, Any] = {}
+    binary = False
+    try:
+        input = json.loads(request.decode())
+        binary = input.get("format") == "binary"
+        if input["command"] == "compile":
+            source_code = input["code"]
+            compression = requested_compression(input)
+            if binary:
+                yield from binary_compile_reply(source_code, compression, cache, backend)
+                return
+            executable = call_compiler(source_code, cache, backend)
+            if compression is not None:
+                executable = compressions[compression](executable)
+                result["compression"] = compression
+            result["program"] = b64encode(executable).decode()
+        elif input["command"] == "compile_batch":
+            sources = batch_sources(input)
+            # A pool per request, as forked request handlers can't share one
+            executor = ProcessPoolExecutor(max_workers=batch_workers)
+            try:
+                outcomes = compile_batch(sources, executor, cache, backend)
+                if input.get("stream"):
+                    for index, outcome in outcomes:
+                        yield (json.dumps({"index": index, **outcome}) + "\n").encode()
+                    return
+                results: list[dict[str, str]] = [{}] * len(sources)
+                for index, outcome in outcomes:
+                    results[index] = outcome
+                result["results"] = results
+            finally:
+                # Don't compile the rest if the client went away
+                executor.shutdown(cancel_futures=True)
+        else:
+            result = command_reply(input, cache)
+    except Exception as e:
+        result["error"] = "".join(format_exception(e))
+    yield str.encode(json.dumps(result) + ("\n" if binary else ""))
+
+
+def requested_compression(input: dict[str, Any]) -> str | None:
+    compression: str | None = input.get("compression")
+    if compression is not None and compression not in compressions:
+        raise Exception(f"Unknown compression: {compression}. Valid compressions: {', '.join(compressions)}")
+    return compression
+
+
+def binary_compile_reply(
+    source_code: str,
+    compression: str | None,
+    cache: ExecutableCache | None,
+    backend: str,
+) -> Generator[bytes | BinaryIO, None, None]:
+    with open_executable(source_code, cache, backend) as executable:
+        if compression is None:
+            # Sent straight from the file by the kernel where possible
+            size = executable.seek(0, os.SEEK_END)
+            executable.seek(0)
+            yield (json.dumps({"size": size}) + "\n").encode()
+            yield executable
+        else:
+            data = compressions[compression](executable.read())
+            yield (json.dumps({"size": len(data), "compression": compression}) + "\n").encode() + data
+
+
+def batch_sources(input: dict[str, Any]) -> list[str]:
+    sources = input["codes"]
+    if not isinstance(sources, list) or not all(isinstance(source, str) for source in sources):
+        raise Exception('"codes" must be a list of strings')
+    return sources
+
+
+def compile_batch_item(source_code: str, backend: str) -> bytes | str:
+    """Compiles one program of a batch in a pool process.
+
+    Returns the executable or the error. The error is formatted here,
+    where its traceback is.
+    """
+    try:
+        return call_compiler(source_code, backend=backend)
+    except Exception as e:
+        return "".join(format_exception(e))
+
+
+def compile_batch(
+    sources: list[str],
+    executor: Executor,
+    cache: ExecutableCache | None = None,
+    backend: str = 'binutils',
+) -> Iterator[tuple[int, dict[str, str]]]:
+    """Compiles 'sources' in parallel on 'executor' and yields the index
+    and result of each as soon as it is ready.
+
+    A result is {"program": ...} or {"error": ...}, like the reply to
+    'compile'. Cached programs come first, and a source that appears
+    more than once is compiled once.
+    """
+    indices: dict[str, list[int]] = {}
+    for index, source_code in enumerate(sources):
+        indices.setdefault(source_code, []).append(index)
+
+    ready: list[tuple[list[int], dict[str, str]]] = []
+    pending: dict[Future[bytes | str], tuple[list[int], str | None]] = {}
+    for source_code, same_indices in indices.items():
+        key: str | None = None
+        if cache is not None:
+            key = cache.key(source_code, {'backend': backend})
+            cached = cache.get(key)
+            if cached is not None:
+                ready.append((same_indices, {"program": b64encode(cached).decode()}))
+                continue
+        pending[executor.submit(compile_batch_item, source_code, backend)] = (same_indices, key)
+
+    for same_indices, outcome in ready:
+        for index in same_indices:
+            yield index, outcome
+    for future in as_completed(pending):
+        same_indices, key = pending[future]
+        try:
+            executable = future.result()
+        except Exception as e:
+            # For example a pool process that died
+            executable = "".join(format_exception(e))
+        if isinstance(executable, bytes):
+            if cache is not None and key is not None:
+                cache.put(key, executable)
+            outcome = {"program": b64encode(executable).decode()}
+        else:
+            outcome = {"error": executable}
+        for index in same_indices:
+            yield index, outcome
+
+
+def command_reply(input: dict[str, Any], cache: ExecutableCache | None) -> dict[str, Any]:
+    """The reply to requests other than 'compile'."""
+    result: dict[str, Any] = {}
+    if input["command"] == "ping":
+        pass
+    elif input["command"] == "stats":
+        if cache is not None:
+            result["cache"] = {"hits": cache.hits, "misses": cache.misses}
+    else:
+        result["error"] = "Unknown command: " + input['command']
+    return result
+
+
+class ThreadPoolTCPServer(TCPServer):
+    """Handles requests on a fixed pool of threads.
+
+    Every phase of the compiler keeps its state per call, so compiles
+    can run side by side in one process. Threads mostly overlap
+    while waiting for 'as' and 'ld'.
+    """
+    allow_reuse_address = True
+    request_queue_size = 32
+
+    def __init__(self, server_address: tuple[str, int], handler: Callable[[Any, Any, BaseServer], Any], threads: int) -> None:
+        super().__init__(server_address, handler)
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        self.executor.submit(self.process_request_in_thread, request, client_address)
+
+    def process_request_in_thread(self, request: Any, client_address: Any) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
 
+    def server_close(self) -> None:
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+class PreForkTCPServer(TCPServer):
+    """Handles requests in a fixed pool of long-lived worker processes.
+
+    The workers are forked once, after everything has been imported
+    and warmed up, and all accept connections from the same listening
+    socket. A worker exits after 'max_requests' requests, if given,
+    and is replaced by a fresh fork.
+    """
+    allow_reuse_address = True
+    # Bursts wait in the kernel's accept queue until a worker is free
+    request_queue_size = socket.SOMAXCONN
+
+    def __init__(self, server_address: tuple[str, int], handler: Callable[[Any, Any, BaseServer], Any], workers: int, max_requests: int | None = None) -> None:
+        super().__init__(server_address, handler)
+        self.workers = workers
+        self.max_requests = max_requests
+        self.worker_pids: set[int] = set()
+        # Set in workers
+        self.server_pid = 0
+        self.handled = 0
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        # Objects allocated so far are never collected, so the
+        # collector doesn't write to (and copy) pages shared with workers
+        gc.collect()
+        gc.freeze()
+        # Stop the workers too when the server is terminated
+        previous_handler = signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            for _ in range(self.workers):
+                self.start_worker()
+            while True:
+                pid, _ = os.wait()
+                if pid in self.worker_pids:
+                    self.worker_pids.remove(pid)
+                    self.start_worker()
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+            self.stop_workers()
+
+    def start_worker(self) -> None:
+        # A signal between fork() and recording the pid would leave
+        # a worker behind that 'stop_workers' doesn't know about
+        signals = {signal.SIGINT, signal.SIGTERM}
+        signal.pthread_sigmask(signal.SIG_BLOCK, signals)
+        pid = os.fork()
+        if pid != 0:
+            self.worker_pids.add(pid)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, signals)
+            return
+        status = 1
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, signals)
+            self.server_pid = os.getppid()
+            # Wake up now and then to notice if the server is gone
+            self.timeout = 1.0
+            self.handled = 0
+            while self.max_requests is None or self.handled < self.max_requests:
+                # Waits for a connection. If another worker accepts it
+                # first, the socket is blocking so this waits in accept().
+                self.handle_request()
+            status = 0
+        except KeyboardInterrupt:
+            status = 0
+        finally:
+            os._exit(status)
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        super().process_request(request, client_address)
+        self.handled += 1
+
+    def handle_timeout(self) -> None:
+        if os.getppid() != self.server_pid:
+            raise SystemExit(1)
+
+    def stop_workers(self) -> None:
+        for pid in self.worker_pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self.worker_pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.worker_pids.clear()
+
+
+def run_server(
+    host: str,
+    port: int,
+    threads: int | None = None,
+    cache: ExecutableCache | None = None,
+    backend: str = 'binutils',
+    workers: int | None = None,
+    max_requests: int | None = None,
+    batch_workers: int | None = None,
+) -> None:
     class Handler(StreamRequestHandler):
         def handle(self) -> None:
-            result: dict[str, Any] = {}
+            chunks = reply_chunks(self.rfile.read(), cache, backend, batch_workers)
             try:
-                input_str = self.rfile.read().decode()
-                input = json.loads(input_str)
-                if input["command"] == "compile":
-                    source_code = input["code"]
-                    executable = call_compiler(source_code)
-                    result["program"] = b64encode(executable).decode()
-                elif input["command"] == "ping":
-                    pass
-                else:
-                    result["error"] = "Unknown command: " + input['command']
-            except Exception as e:
-                result["error"] = "".join(format_exception(e))
-            result_str = json.dumps(result)
-            self.request.sendall(str.encode(result_str))
+                for chunk in chunks:
+                    if isinstance(chunk, bytes):
+                        self.request.sendall(chunk)
+                    else:
+                        self.request.sendfile(chunk)
+            finally:
+                # Closes files and shuts down a batch's process pool even if sending failed
+                chunks.close()
+
+    server: TCPServer
+    if workers is not None:
+        # Compile once so workers start with the stdlib assembled
+        # and every lazily initialized part of the compiler ready
+        call_compiler('0', backend=backend)
+        server = PreForkTCPServer((host, port), Handler, workers, max_requests)
+    elif threads is None:
+        # Without '--threads', every request is compiled in a forked process
+        class Server(ForkingTCPServer):
+            allow_reuse_address = True
+            request_queue_size = 32
+        server = Server((host, port), Handler)
+    else:
+        server = ThreadPoolTCPServer((host, port), Handler, threads)
 
     print(f"Starting TCP server at {host}:{port}")
-    with Server((host, port), Handler) as server:
+    with server:
         server.serve_forever()
 
 
+class AsyncServer:
+    """Serves requests over connections that stay open, with asyncio.
+
+    Every request and reply is a frame: a 4-byte big-endian length
+    followed by that many bytes of JSON. Requests are the same as with
+    'handle_request' plus an optional "id", which is copied to the
+    reply. A streamed 'compile_batch' gets a frame per program. The
+    frame of a binary 'compile' reply is followed by "size" raw bytes
+    of the executable. A client can send many requests without waiting
+    for the replies, which come back in the order they finish.
+
+    The CPU-bound phases run on 'executor', and 'as' and 'ld' run as
+    asyncio subprocesses.
+    """
+    frame_header = struct.Struct('>I')
+    max_frame_size = 64 * 2**20
+    # Requests read from one connection but not answered yet
+    max_in_flight = 256
+
+    def __init__(self, executor: Executor, cache: ExecutableCache | None = None, backend: str = 'binutils', toolchain_jobs: int | None = None) -> None:
+        self.executor = executor
+        self.cache = cache
+        self.backend = backend
+        # Running more 'as' and 'ld' processes than cores only adds overhead
+        self.toolchain_slots = asyncio.Semaphore(toolchain_jobs or os.cpu_count() or 1)
+
+    async def compile(self, source_code: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        if self.cache is not None:
+            key = self.cache.key(source_code, {'backend': self.backend})
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        if self.backend == 'native':
+            executable = await loop.run_in_executor(self.executor, call_compiler, source_code, None, 'native')
+        else:
+            assembly = await loop.run_in_executor(self.executor, compile_to_assembly, source_code)
+            async with self.toolchain_slots:
+                executable = await assemble_and_get_executable_async(assembly)
+        if self.cache is not None:
+            self.cache.put(key, executable)
+        return executable
+
+    async def compile_item(self, index: int, source_code: str) -> tuple[int, dict[str, str]]:
+        try:
+            return index, {"program": b64encode(await self.compile(source_code)).decode()}
+        except Exception as e:
+            return index, {"error": "".join(format_exception(e))}
+
+    async def replies(self, frame: bytes) -> AsyncIterator[tuple[dict[str, Any], bytes]]:
+        """The replies to one request: one, or one per program for a
+        streamed 'compile_batch'. Each is JSON and the raw bytes to send
+        after its frame, which are only there for a binary 'compile'."""
+        result: dict[str, Any] = {}
+        request_id: Any = None
+        try:
+            input = json.loads(frame.decode())
+            request_id = input.get("id")
+            if input["command"] == "compile":
+                compression = requested_compression(input)
+                executable = await self.compile(input["code"])
+                if compression is not None:
+                    executable = compressions[compression](executable)
+                    result["compression"] = compression
+                if input.get("format") == "binary":
+                    result["size"] = len(executable)
+                    if request_id is not None:
+                        result["id"] = request_id
+                    yield result, executable
+                    return
+                result["program"] = b64encode(executable).decode()
+            elif input["command"] == "compile_batch":
+                sources = batch_sources(input)
+                items = [self.compile_item(index, source_code) for index, source_code in enumerate(sources)]
+                if input.get("stream"):
+                    for item in asyncio.as_completed(items):
+                        index, outcome = await item
+                        streamed: dict[str, Any] = {"index": index, **outcome}
+                        if request_id is not None:
+                            streamed["id"] = request_id
+                        yield streamed, b''
+                    return
+                result["results"] = [outcome for _, outcome in await asyncio.gather(*items)]
+            else:
+                result = command_reply(input, self.cache)
+        except Exception as e:
+            result["error"] = "".join(format_exception(e))
+        if request_id is not None:
+            result["id"] = request_id
+        yield result, b''
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        tasks: set[asyncio.Task[None]] = set()
+
+        async def answer(frame: bytes) -> None:
+            try:
+                async for result, data in self.replies(frame):
+                    payload = json.dumps(result).encode()
+                    # One write per frame, so concurrent replies don't interleave
+                    writer.write(self.frame_header.pack(len(payload)) + payload + data)
+                    await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                in_flight.release()
+
+        try:
+            while True:
+                (size,) = self.frame_header.unpack(await reader.readexactly(self.frame_header.size))
+                if size > self.max_frame_size:
+                    break
+                frame = await reader.readexactly(size)
+                await in_flight.acquire()
+                task = asyncio.create_task(answer(frame))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # The client is done sending
+            pass
+        finally:
+            # Answer what has been asked before closing
+            await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def start(self, host: str, port: int) -> asyncio.Server:
+        return await asyncio.start_server(self.handle_connection, host, port, reuse_address=True)
+
+
+def run_async_server(host: str, port: int, workers: int | None = None, cache: ExecutableCache | None = None, backend: str = 'binutils') -> None:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Start the worker processes before the event loop and its
+        # threads exist, and assemble the stdlib now
+        executor.submit(compile_to_assembly, '0').result()
+        call_compiler('0', backend=backend)
+
+        async def serve() -> None:
+            server = await AsyncServer(executor, cache, backend).start(host, port)
+            print(f"Starting asyncio server at {host}:{port}")
+            # Return normally on SIGTERM, so the worker processes are shut down too
+            stop = asyncio.Event()
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+            async with server:
+                await stop.wait()
+
+        asyncio.run(serve())
+
+
 if __name__ == '__main__':
     sys.exit(main())
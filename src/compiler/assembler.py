@@ -1,13 +1,22 @@
+import asyncio
+import hashlib
+import os
 import subprocess
 import tempfile
-from contextlib import nullcontext
+import threading
+from contextlib import contextmanager, nullcontext
+from functools import cache
 from os import path
-from typing import Any, Callable, ContextManager, TypeVar
+from typing import Any, Callable, ContextManager, Iterator, TypeVar
 import shutil
 from pathlib import Path
+from compiler import elf, x86_encoder
 
 T = TypeVar('T')
 
+# 'binutils' runs 'as' and 'ld', 'native' encodes and links in-process
+backends = ['binutils', 'native']
+
 
 def assemble(
     assembly_code: str,
@@ -16,11 +25,16 @@ def assemble(
     tempfile_basename: str = 'program',
     link_with_c: bool = False,
     extra_libraries: list[str] = [],
+    backend: str = 'binutils',
 ) -> None:
     """Invokes 'as' and 'ld' to generate an executable file from Assembly code.
 
     The file is written to the given path.
     """
+    if backend == 'native':
+        Path(output_file).write_bytes(native_executable(assembly_code, link_with_c, extra_libraries))
+        os.chmod(output_file, 0o755)
+        return
     _assemble(
         assembly_code=assembly_code,
         workdir=workdir,
@@ -37,11 +51,14 @@ def assemble_and_get_executable(
     tempfile_basename: str = 'program',
     link_with_c: bool = False,
     extra_libraries: list[str] = [],
+    backend: str = 'binutils',
 ) -> bytes:
     """Invokes 'as' and 'ld' to generate an executable file from Assembly code.
 
     The file is returned.
     """
+    if backend == 'native':
+        return native_executable(assembly_code, link_with_c, extra_libraries)
     return _assemble(
         assembly_code=assembly_code,
         workdir=workdir,
@@ -52,6 +69,22 @@ def assemble_and_get_executable(
     )
 
 
+@contextmanager
+def executable_file(
+    assembly_code: str,
+    tempfile_basename: str = 'program',
+    link_with_c: bool = False,
+    extra_libraries: list[str] = [],
+) -> Iterator[str]:
+    """Invokes 'as' and 'ld' and gives the path of the executable they
+    wrote, which is removed when the context exits.
+
+    For sending the file somewhere without reading it into memory.
+    """
+    with tempfile.TemporaryDirectory(prefix='compiler_') as wd:
+        yield _assemble_impl(assembly_code, wd, tempfile_basename, link_with_c, extra_libraries, take_output=lambda f: f)
+
+
 def _assemble(
     assembly_code: str,
     workdir: str | None,
@@ -76,37 +109,127 @@ def _assemble_impl(
     extra_libraries: list[str],
     take_output: Callable[[str], T],
 ) -> T:
-    stdlib_asm = path.join(workdir, 'stdlib.s')
-    stdlib_obj = path.join(workdir, 'stdlib.o')
+    commands, output_file = _prepare(assembly_code, workdir, tempfile_basename, link_with_c, extra_libraries)
+    for command in commands:
+        subprocess.run(command, check=True)
+    return take_output(output_file)
+
+
+async def assemble_and_get_executable_async(
+    assembly_code: str,
+    tempfile_basename: str = 'program',
+    link_with_c: bool = False,
+    extra_libraries: list[str] = [],
+) -> bytes:
+    """Like 'assemble_and_get_executable', but runs 'as' and 'ld'
+    with asyncio instead of blocking while they run."""
+    with tempfile.TemporaryDirectory(prefix='compiler_') as wd:
+        commands, output_file = _prepare(assembly_code, wd, tempfile_basename, link_with_c, extra_libraries)
+        for command in commands:
+            process = await asyncio.create_subprocess_exec(*command)
+            returncode = await process.wait()
+            if returncode != 0:
+                raise subprocess.CalledProcessError(returncode, command)
+        return Path(output_file).read_bytes()
+
+
+def _prepare(
+    assembly_code: str,
+    workdir: str,
+    tempfile_basename: str,
+    link_with_c: bool,
+    extra_libraries: list[str],
+) -> tuple[list[list[str]], str]:
+    """Writes the program to 'workdir' and returns the commands that
+    turn it into an executable, and the path they write it to."""
     program_asm = path.join(workdir, f'{tempfile_basename}.s')
     program_obj = path.join(workdir, f'{tempfile_basename}.o')
     output_file = path.join(workdir, 'a.out')
 
-    if link_with_c:
-        final_stdlib_asm_code = drop_start_symbol(stdlib_asm_code)
-    else:
-        final_stdlib_asm_code = stdlib_asm_code
+    try:
+        stdlib_obj = stdlib_object(link_with_c)
+    except OSError:
+        # No usable cache directory: assemble it for this compile only
+        stdlib_obj = path.join(workdir, 'stdlib.o')
+        _assemble_stdlib(link_with_c, workdir, stdlib_obj)
 
-    with open(stdlib_asm, 'w') as f:
-        f.write(final_stdlib_asm_code)
     with open(program_asm, 'w') as f:
         f.write(assembly_code)
-    subprocess.run(['as', '-g', '-o' +
-                    stdlib_obj, stdlib_asm], check=True)
-    subprocess.run(['as', '-g', '-o' +
-                    program_obj, program_asm], check=True)
     linker_flags = ['-static', *[f'-l{lib}' for lib in extra_libraries]]
     if link_with_c:
         # Linking with the C standard library correctly is complicated,
         # as evidenced by the complicated linker command shown by `cc -v something.c`.
         # Instead of trying to build the right `ld` command ourselves, we use the C compiler
         # to do the linking.
-        subprocess.run(
-            ['cc', '-o' + output_file, *linker_flags, stdlib_obj, program_obj], check=True)
+        linker = 'cc'
     else:
-        subprocess.run(
-            ['ld', '-o' + output_file, *linker_flags, stdlib_obj, program_obj], check=True)
-    return take_output(output_file)
+        linker = 'ld'
+    return [
+        ['as', '-g', '-o' + program_obj, program_asm],
+        [linker, '-o' + output_file, *linker_flags, stdlib_obj, program_obj],
+    ], output_file
+
+
+_stdlib_lock = threading.Lock()
+
+
+def stdlib_cache_dir() -> str:
+    """A directory for assembled standard libraries, private to this user."""
+    directory = path.join(tempfile.gettempdir(), f'compiler_stdlib_{os.getuid()}')
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    # Don't link objects that someone else could have put there
+    stat = os.stat(directory)
+    if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+        raise PermissionError(f'{directory} is not private to this user')
+    return directory
+
+
+def stdlib_object(link_with_c: bool) -> str:
+    """The path to the assembled standard library.
+
+    The object file is named after a hash of its Assembly code and
+    is only assembled if it doesn't exist yet, so compiles just
+    assemble the program and link. It is written to a temporary name
+    and renamed into place, so processes can share it.
+    """
+    code = _stdlib_code(link_with_c)
+    directory = stdlib_cache_dir()
+    object_file = path.join(directory, f'stdlib-{hashlib.sha256(code.encode()).hexdigest()}.o')
+    if path.exists(object_file):
+        return object_file
+    with _stdlib_lock:
+        if not path.exists(object_file):
+            with tempfile.TemporaryDirectory(dir=directory) as wd:
+                temp_obj = path.join(wd, 'stdlib.o')
+                _assemble_stdlib(link_with_c, wd, temp_obj)
+                os.replace(temp_obj, object_file)
+    return object_file
+
+
+def _stdlib_code(link_with_c: bool) -> str:
+    if link_with_c:
+        return drop_start_symbol(stdlib_asm_code)
+    else:
+        return stdlib_asm_code
+
+
+def _assemble_stdlib(link_with_c: bool, workdir: str, output_file: str) -> None:
+    stdlib_asm = path.join(workdir, 'stdlib.s')
+    with open(stdlib_asm, 'w') as f:
+        f.write(_stdlib_code(link_with_c))
+    subprocess.run(['as', '-g', '-o' + output_file, stdlib_asm], check=True)
+
+
+def native_executable(assembly_code: str, link_with_c: bool = False, extra_libraries: list[str] = []) -> bytes:
+    """Encodes and links an executable in memory, without 'as' or 'ld'."""
+    if link_with_c or extra_libraries:
+        raise Exception('the native backend cannot link with libraries')
+    return elf.link([_encoded_stdlib(), x86_encoder.encode(assembly_code)])
+
+
+@cache
+def _encoded_stdlib() -> x86_encoder.ObjectCode:
+    return x86_encoder.encode(stdlib_asm_code)
 
 
 def drop_start_symbol(code: str) -> str:
@@ -1,11 +1,10 @@
 from compiler import ir
 import dataclasses
+from typing import AbstractSet
 from compiler import intrinsics
 
 global_funcs = {'print_int', 'print_bool', 'read_int'}
 
-user_funcs: set[str] = set()
-
 class Locals:
     """Knows the memory location of every local variable."""
     _var_to_location: dict[ir.IRVar, str]
@@ -32,8 +31,9 @@ class Locals:
         return self._stack_used
 
 
-def get_all_ir_variables_in_range(instructions: list[ir.Instruction], start: int, end: int) -> list[ir.IRVar]:
-    """Get all IR variables from instructions within some range"""
+def get_all_ir_variables_in_range(instructions: list[ir.Instruction], start: int, end: int, user_funcs: AbstractSet[str] = frozenset()) -> list[ir.IRVar]:
+    """Get all IR variables from instructions within some range,
+    except the names of functions in 'user_funcs'"""
     result_list: list[ir.IRVar] = []
     result_set: set[ir.IRVar] = set()
 
@@ -55,8 +55,8 @@ def get_all_ir_variables_in_range(instructions: list[ir.Instruction], start: int
                             add(v)
     return result_list
     
-def get_all_ir_variables(instructions: list[ir.Instruction]) -> list[ir.IRVar]:
-    return get_all_ir_variables_in_range(instructions, 0, len(instructions))
+def get_all_ir_variables(instructions: list[ir.Instruction], user_funcs: AbstractSet[str] = frozenset()) -> list[ir.IRVar]:
+    return get_all_ir_variables_in_range(instructions, 0, len(instructions), user_funcs)
 
 def generate_assembly(instructions: list[ir.Instruction]) -> str:
     lines = []
@@ -73,13 +73,20 @@ def generate_assembly(instructions: list[ir.Instruction]) -> str:
             main_end = i
             break
 
-    main_vars = get_all_ir_variables_in_range(instructions, 0, main_end)
+    main_vars = get_all_ir_variables_in_range(instructions, 0, main_end, user_funcs)
     locals = Locals(variables=main_vars)
     
     current_locals = locals
 
     arg_regs = ['%rdi', '%rsi', '%rdx', '%rcx', '%r8', '%r9']
 
+    # Functions have no stack slot, so using one as a value loads its address
+    def load(var: ir.IRVar, register: str) -> None:
+        if var.name in global_funcs or var.name in user_funcs:
+            emit(f'leaq {var.name}(%rip), {register}')
+        else:
+            emit(f'movq {current_locals.get_ref(var)}, {register}')
+
     # ... Emit initial declarations and stack setup here ...
     emit('.extern print_int')
     emit('.extern print_bool')
@@ -115,7 +122,7 @@ def generate_assembly(instructions: list[ir.Instruction]) -> str:
                         break
                     func_end += 1
                 
-                func_vars = get_all_ir_variables_in_range(instructions, i, func_end + 1)
+                func_vars = get_all_ir_variables_in_range(instructions, i, func_end + 1, user_funcs)
                 func_locals = Locals(variables=func_vars)
                 current_locals = func_locals
                 
@@ -170,12 +177,7 @@ def generate_assembly(instructions: list[ir.Instruction]) -> str:
                 else:
                     emit(f'movq $0, {current_locals.get_ref(insn.dest)}')
             case ir.Copy():
-                if insn.source.name in global_funcs:
-                    emit(f'leaq {insn.source.name}(%rip), %rax')
-                elif insn.source.name in user_funcs:
-                    emit(f'leaq {insn.source.name}(%rip), %rax')
-                else:
-                    emit(f'movq {current_locals.get_ref(insn.source)}, %rax')
+                load(insn.source, '%rax')
                 emit(f'movq %rax, {current_locals.get_ref(insn.dest)}')
 
             case ir.CondJump():
@@ -191,20 +193,20 @@ def generate_assembly(instructions: list[ir.Instruction]) -> str:
                 elif insn.fun.name in global_funcs:
                     for j, arg in enumerate(insn.args):
                         if j < len(arg_regs):
-                            emit(f'movq {current_locals.get_ref(arg)}, {arg_regs[j]}')
+                            load(arg, arg_regs[j])
                     emit(f'call {insn.fun.name}')
                     emit(f'movq %rax, {current_locals.get_ref(insn.dest)}')
                 elif insn.fun.name in user_funcs:
                     for j, arg in enumerate(insn.args):
                         if j < len(arg_regs):
-                            emit(f'movq {current_locals.get_ref(arg)}, {arg_regs[j]}')
+                            load(arg, arg_regs[j])
                     emit(f'call {insn.fun.name}')
                     emit(f'movq %rax, {current_locals.get_ref(insn.dest)}')
                 else:
                     # use pointer call
                     for j, arg in enumerate(insn.args):
                         if j < len(arg_regs):
-                            emit(f'movq {current_locals.get_ref(arg)}, {arg_regs[j]}')
+                            load(arg, arg_regs[j])
                     emit(f'call *{current_locals.get_ref(insn.fun)}')
                     emit(f'movq %rax, {current_locals.get_ref(insn.dest)}')
             
@@ -1,29 +1,32 @@
 from dataclasses import dataclass, field
-from compiler.tokenizer import TokenLocation
+from compiler.tokenizer import L, TokenLocation
 from compiler.types import Type, Unit
 
-@dataclass
+# Nodes are slotted to keep large ASTs small.
+# Types are interned, so every node shares the one 'Unit' until
+# the type checker sets its real type.
+@dataclass(slots=True)
 class Expression:
     """Base class for AST nodes representing expressions."""
     location: TokenLocation
-    type: Type = field(kw_only=True, default_factory=lambda: Unit())
+    type: Type = field(kw_only=True, default=Unit())
 
-@dataclass
+@dataclass(slots=True)
 class Literal(Expression):
     value: int | bool | None
 
-@dataclass
+@dataclass(slots=True)
 class Identifier(Expression):
     name: str
 
-@dataclass
+@dataclass(slots=True)
 class BinaryOp(Expression):
     """AST node for a binary operation like `A + B`"""
     left: Expression
     op: str
     right: Expression
 
-@dataclass
+@dataclass(slots=True)
 class IfStatement(Expression):
     """AST node for if-then-else statement where else is optional.
     
@@ -37,7 +40,7 @@ class IfStatement(Expression):
     third_expr: Expression | None
     
 
-@dataclass
+@dataclass(slots=True)
 class FunctionCall(Expression):
     """Function call 
 
@@ -46,7 +49,7 @@ class FunctionCall(Expression):
     function_name: Identifier
     arguments: list[Expression]
 
-@dataclass
+@dataclass(slots=True)
 class UnaryOperator(Expression):
     """
 
@@ -55,7 +58,7 @@ class UnaryOperator(Expression):
     op: str
     right: Expression
 
-@dataclass 
+@dataclass(slots=True)
 class Block(Expression):
     """
     Block: { E1; E2; ...; En } or { E1; E2; ...; En; } (may be empty, last semicolon optional).
@@ -65,13 +68,13 @@ class Block(Expression):
     has_semicolon: bool
     result_expression: Expression | Literal
 
-@dataclass
+@dataclass(slots=True)
 class VariableDeclaration(Expression):
     ID: Identifier
     expression: Expression
     var_type: Type | None
 
-@dataclass
+@dataclass(slots=True)
 class WhileStatement(Expression):
     """AST node for while loop statement.
     
@@ -83,27 +86,38 @@ class WhileStatement(Expression):
     body_expr: Expression
     
 
-@dataclass
+@dataclass(slots=True)
 class EmptyInput(Expression):
     pass
 
-@dataclass
+@dataclass(slots=True)
 class Break(Expression):
     """Exits the innermost loop"""
     pass
 
-@dataclass
+@dataclass(slots=True)
 class Continue(Expression):
     """Goes back to the beginning of the innermost loop"""
     pass
 
-@dataclass
+@dataclass(slots=True)
 class FunctionDefinition(Expression):
     name: Identifier
     params: list[tuple[Identifier, Type]]
     return_type: Type
     body: Expression
 
-@dataclass
+@dataclass(slots=True)
 class Return(Expression):
     value: Expression
+
+
+# Shared nodes for the keywords of 'if' and 'while'.
+# The parser puts these in every IfStatement and WhileStatement
+# instead of allocating new Identifiers for each one.
+# Nothing may modify them.
+KEYWORD_IF = Identifier(name='if', location=L)
+KEYWORD_THEN = Identifier(name='then', location=L)
+KEYWORD_ELSE = Identifier(name='else', location=L)
+KEYWORD_WHILE = Identifier(name='while', location=L)
+KEYWORD_DO = Identifier(name='do', location=L)
@@ -0,0 +1,155 @@
+"""On-disk cache of compiled executables.
+
+Entries are keyed by a hash of everything that affects the output:
+the source code, the compiler's own source files, the Assembly
+standard library and the compiler flags. Each entry is one file, so
+any number of processes can share a cache directory: entries are
+written to a temporary file and renamed into place, and a reader
+either sees a whole entry or none.
+
+The least recently used entries are evicted when the total size goes
+over the limit. A hit updates the file's modification time, which is
+what the eviction order is based on.
+"""
+import hashlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+from functools import cache
+from pathlib import Path
+from typing import BinaryIO, Callable, Mapping
+
+from compiler.assembler import stdlib_asm_code
+from compiler.tokenizer import SourceBytes
+
+DEFAULT_MAX_BYTES = 256 * 2**20
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'compiler')
+
+
+@cache
+def compiler_fingerprint() -> bytes:
+    """A hash of the compiler's source files and standard library.
+
+    Any change to the compiler gives new cache keys, so stale
+    executables are never returned.
+    """
+    digest = hashlib.sha256()
+    package_dir = Path(__file__).parent
+    for path in sorted(package_dir.glob('*.py')):
+        digest.update(path.name.encode() + b'\0')
+        digest.update(path.read_bytes())
+    digest.update(stdlib_asm_code.encode())
+    return digest.digest()
+
+
+class ExecutableCache:
+    """A size-bounded, least-recently-used cache of executables on disk.
+
+    Hit and miss counts are kept in shared memory, so they include the
+    lookups of worker processes forked after the cache was created.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        # [hits, misses]
+        self._counters = multiprocessing.Array('q', 2)
+
+    @property
+    def hits(self) -> int:
+        return int(self._counters[0])
+
+    @property
+    def misses(self) -> int:
+        return int(self._counters[1])
+
+    def _count(self, index: int) -> None:
+        with self._counters.get_lock():
+            self._counters[index] += 1
+
+    def key(self, source_code: str | SourceBytes, flags: Mapping[str, str] | None = None) -> str:
+        digest = hashlib.sha256(compiler_fingerprint())
+        for name, value in sorted((flags or {}).items()):
+            digest.update(f'{name}={value}\0'.encode())
+        digest.update(b'\0')
+        digest.update(source_code.encode() if isinstance(source_code, str) else source_code)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.out')
+
+    def get(self, key: str) -> bytes | None:
+        """The cached executable for 'key', or None if there isn't one."""
+        f = self.open_entry(key)
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    def open_entry(self, key: str) -> BinaryIO | None:
+        """The cached executable for 'key' as an open file, or None if
+        there isn't one. The file stays readable even if it's evicted."""
+        path = self._path(key)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            # Possibly evicted by another process just now
+            self._count(1)
+            return None
+        self._count(0)
+        try:
+            # Mark the entry as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return f
+
+    def put(self, key: str, executable: bytes) -> None:
+        self._store(key, lambda temp_path: Path(temp_path).write_bytes(executable))
+
+    def put_file(self, key: str, path: str) -> None:
+        """Stores the executable at 'path' without reading it into memory."""
+        self._store(key, lambda temp_path: shutil.copyfile(path, temp_path))
+
+    def _store(self, key: str, write: Callable[[str], object]) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        os.close(fd)
+        try:
+            write(temp_path)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes the least recently used entries until the cache fits in 'max_bytes'."""
+        entries: list[tuple[float, int, str]] = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.out'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                # Another process evicted it first
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
@@ -0,0 +1,134 @@
+"""Control-flow graphs of basic blocks over the IR.
+
+'build_cfgs' splits the main program and every function into basic
+blocks and links them with successor and predecessor indices.
+'linearize' turns the graphs back into a flat list of instructions.
+"""
+from dataclasses import dataclass, field
+
+from compiler import ir
+
+
+@dataclass
+class BasicBlock:
+    """Instructions that always run from the first to the last.
+
+    Only the first instruction can be a 'Label', and only the last can
+    be a 'Jump', 'CondJump' or 'Return'. A block that doesn't end in one
+    of those falls through to the next block of its graph, or out of
+    the function if it's the last one.
+    """
+    instructions: list[ir.Instruction]
+    # Indices of blocks in the same graph
+    successors: list[int] = field(default_factory=list)
+    predecessors: list[int] = field(default_factory=list)
+
+    @property
+    def label(self) -> ir.Label | None:
+        first = self.instructions[0] if self.instructions else None
+        return first if isinstance(first, ir.Label) else None
+
+    @property
+    def terminator(self) -> ir.Jump | ir.CondJump | ir.Return | None:
+        last = self.instructions[-1] if self.instructions else None
+        return last if isinstance(last, (ir.Jump, ir.CondJump, ir.Return)) else None
+
+
+@dataclass
+class ControlFlowGraph:
+    """The basic blocks of one function, or of the main program.
+
+    Block 0 is the entry, which may be empty, and nothing jumps to it.
+    'start' and 'end' are the function's 'FunctionStart' and
+    'FunctionEnd', and None for the main program.
+    """
+    name: str
+    blocks: list[BasicBlock]
+    start: ir.FunctionStart | None = None
+    end: ir.FunctionEnd | None = None
+
+
+def build_cfgs(instructions: list[ir.Instruction]) -> list[ControlFlowGraph]:
+    """Splits 'instructions' into the graph of the main program, which
+    is everything before the first function, followed by a graph for
+    each function. Takes time linear in the number of instructions."""
+    graphs: list[ControlFlowGraph] = []
+    main_end = next((j for j, insn in enumerate(instructions) if isinstance(insn, ir.FunctionStart)), len(instructions))
+    graphs.append(ControlFlowGraph('main', _build_blocks(instructions, 0, main_end)))
+    i = main_end
+    while i < len(instructions):
+        start = instructions[i]
+        if not isinstance(start, ir.FunctionStart):
+            raise Exception(f'{start.location}: expected a function, got {start}')
+        end_index = i + 1
+        while end_index < len(instructions) and not isinstance(instructions[end_index], ir.FunctionEnd):
+            end_index += 1
+        if end_index == len(instructions):
+            raise Exception(f'{start.location}: function {start.name} has no end')
+        end = instructions[end_index]
+        assert isinstance(end, ir.FunctionEnd)
+        graphs.append(ControlFlowGraph(start.name, _build_blocks(instructions, i + 1, end_index), start, end))
+        i = end_index + 1
+    return graphs
+
+
+def _build_blocks(instructions: list[ir.Instruction], start: int, end: int) -> list[BasicBlock]:
+    blocks: list[BasicBlock] = []
+    if start < end and isinstance(instructions[start], ir.Label):
+        # Jumps to the first label would otherwise make the entry block a
+        # join point without an edge for entering the function
+        blocks.append(BasicBlock([]))
+    current: list[ir.Instruction] = []
+    for insn in instructions[start:end]:
+        if isinstance(insn, (ir.FunctionStart, ir.FunctionEnd)):
+            raise Exception(f'{insn.location}: unexpected {insn} inside a function')
+        if isinstance(insn, ir.Label) and current:
+            blocks.append(BasicBlock(current))
+            current = []
+        current.append(insn)
+        if isinstance(insn, (ir.Jump, ir.CondJump, ir.Return)):
+            blocks.append(BasicBlock(current))
+            current = []
+    if current or not blocks:
+        # Every graph has an entry block, even if it's empty
+        blocks.append(BasicBlock(current))
+
+    block_of_label: dict[str, int] = {}
+    for index, block in enumerate(blocks):
+        if (label := block.label) is not None:
+            block_of_label[label.name] = index
+
+    def target(label: ir.Label) -> int:
+        if label.name not in block_of_label:
+            raise Exception(f'{label.location}: jump to {label.name} outside of its function')
+        return block_of_label[label.name]
+
+    for index, block in enumerate(blocks):
+        match block.terminator:
+            case ir.Jump() as jump:
+                block.successors.append(target(jump.label))
+            case ir.CondJump() as cond_jump:
+                block.successors.append(target(cond_jump.then_label))
+                if cond_jump.else_label.name != cond_jump.then_label.name:
+                    block.successors.append(target(cond_jump.else_label))
+            case ir.Return():
+                pass
+            case None:
+                if index + 1 < len(blocks):
+                    block.successors.append(index + 1)
+        for successor in block.successors:
+            blocks[successor].predecessors.append(index)
+    return blocks
+
+
+def linearize(graphs: list[ControlFlowGraph]) -> list[ir.Instruction]:
+    """The instructions of 'graphs', with the blocks of each in order."""
+    instructions: list[ir.Instruction] = []
+    for graph in graphs:
+        if graph.start is not None:
+            instructions.append(graph.start)
+        for block in graph.blocks:
+            instructions.extend(block.instructions)
+        if graph.end is not None:
+            instructions.append(graph.end)
+    return instructions
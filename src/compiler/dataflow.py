@@ -0,0 +1,353 @@
+"""Dataflow analysis over control-flow graphs.
+
+'solve' is a worklist solver for forward and backward analyses whose
+facts are sets, represented as Python ints used as bitsets: bit i is
+set if element i is in the set. Union, intersection and difference
+are then single operations on whole sets, which stays fast with tens
+of thousands of elements.
+
+'liveness' and 'reaching_definitions' are built on it.
+"""
+import heapq
+import operator
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
+
+from compiler import ir
+from compiler.cfg import ControlFlowGraph
+
+
+def uses(insn: ir.Instruction) -> list[ir.IRVar]:
+    """The variables 'insn' reads."""
+    match insn:
+        case ir.Copy():
+            return [insn.source]
+        case ir.Call():
+            return [insn.fun, *insn.args]
+        case ir.CondJump():
+            return [insn.cond]
+        case ir.Return():
+            return [insn.value]
+        case _:
+            return []
+
+
+def definition(insn: ir.Instruction) -> ir.IRVar | None:
+    """The variable 'insn' writes, if any."""
+    match insn:
+        case ir.LoadBoolConst() | ir.LoadIntConst() | ir.Copy() | ir.Call():
+            return insn.dest
+        case _:
+            return None
+
+
+def bits(indices: Iterable[int]) -> int:
+    """The bitset of 'indices'."""
+    # Or-ing in one bit at a time would copy the whole int every time
+    array = bytearray()
+    for index in indices:
+        byte = index >> 3
+        if byte >= len(array):
+            array.extend(bytes(byte + 1 - len(array)))
+        array[byte] |= 1 << (index & 7)
+    return int.from_bytes(array, 'little')
+
+
+def indices(bitset: int) -> Iterator[int]:
+    """The elements of 'bitset', in increasing order."""
+    while bitset:
+        low = bitset & -bitset
+        yield low.bit_length() - 1
+        bitset ^= low
+
+
+def _without(a: int, b: int) -> int:
+    """The bitset 'a' without the elements of 'b'."""
+    # 'a & ~b' would go through a negative int, which is slower
+    return (a | b) ^ b
+
+
+class Variables:
+    """Numbers the variables of a graph, for sets of them as bitsets.
+
+    The variables are the parameters and everything that an instruction
+    writes to. Other names that are read are functions, built-ins or
+    'unit', which are not tracked.
+    """
+
+    def __init__(self, graph: ControlFlowGraph) -> None:
+        self.variables: list[ir.IRVar] = []
+        # By name, which hashes faster than 'IRVar'
+        self._indices: dict[str, int] = {}
+        if graph.start is not None:
+            for param in graph.start.params:
+                self._add(param)
+        for block in graph.blocks:
+            for insn in block.instructions:
+                if (dest := definition(insn)) is not None:
+                    self._add(dest)
+
+    def _add(self, var: ir.IRVar) -> None:
+        if var.name not in self._indices:
+            self._indices[var.name] = len(self.variables)
+            self.variables.append(var)
+
+    def __len__(self) -> int:
+        return len(self.variables)
+
+    def index(self, var: ir.IRVar) -> int | None:
+        return self._indices.get(var.name)
+
+    def bit(self, var: ir.IRVar) -> int:
+        """The bitset of just 'var', which is empty if it's not tracked."""
+        index = self._indices.get(var.name)
+        return 0 if index is None else 1 << index
+
+    def bits(self, variables: Iterable[ir.IRVar]) -> int:
+        return bits(index for var in variables if (index := self._indices.get(var.name)) is not None)
+
+    def decode(self, bitset: int) -> list[ir.IRVar]:
+        return [self.variables[index] for index in indices(bitset)]
+
+
+@dataclass
+class DataflowResult:
+    """The facts at the start and at the end of every block."""
+    block_in: list[int]
+    block_out: list[int]
+
+
+def reverse_postorder(graph: ControlFlowGraph) -> list[int]:
+    """The blocks reachable from the entry, each before its successors
+    except along back edges, followed by the unreachable ones.
+
+    Successors are explored last to first, so that the first successor
+    comes right after its block. For a loop condition, that's the body,
+    which keeps each loop together instead of putting its body after
+    everything that follows the loop.
+    """
+    visited = bytearray(len(graph.blocks))
+    postorder: list[int] = []
+    # Blocks paired with how many of their successors have been visited
+    stack = [(0, 0)]
+    visited[0] = 1
+    while stack:
+        block, explored = stack[-1]
+        successors = graph.blocks[block].successors
+        if explored < len(successors):
+            stack[-1] = (block, explored + 1)
+            successor = successors[-1 - explored]
+            if not visited[successor]:
+                visited[successor] = 1
+                stack.append((successor, 0))
+        else:
+            stack.pop()
+            postorder.append(block)
+    postorder.reverse()
+    return postorder + [block for block in range(len(graph.blocks)) if not visited[block]]
+
+
+def solve(
+    graph: ControlFlowGraph,
+    transfer: Callable[[int, int], int],
+    forward: bool,
+    boundary: int = 0,
+    meet: Callable[[int, int], int] = operator.or_,
+    initial: int = 0,
+) -> DataflowResult:
+    """Finds the fixed point of a dataflow analysis on 'graph'.
+
+    'transfer(block, fact)' gives the fact after a block given the fact
+    before it, in the direction of the analysis: for a backward
+    analysis, the fact at the start of the block given the fact at its
+    end. Facts flowing into a block are combined with 'meet', which is
+    union by default. 'boundary' is what flows into the entry block of
+    a forward analysis and into the exits of a backward one, and every
+    other fact starts out as 'initial'. For an analysis that intersects
+    facts, 'initial' should have every bit set.
+    """
+    count = len(graph.blocks)
+    # Facts flowing into and out of each block, in the direction of the analysis
+    facts_in = [initial] * count
+    facts_out = [initial] * count
+    if forward:
+        order = reverse_postorder(graph)
+        sources = [block.predecessors for block in graph.blocks]
+        targets = [block.successors for block in graph.blocks]
+    else:
+        order = reverse_postorder(graph)[::-1]
+        sources = [block.successors for block in graph.blocks]
+        targets = [block.predecessors for block in graph.blocks]
+
+    # Blocks are taken from the worklist in 'order', so a loop settles
+    # before the blocks after it are visited again
+    position = [0] * count
+    for i, block in enumerate(order):
+        position[block] = i
+    worklist = list(range(count))
+    in_worklist = bytearray([1]) * count
+    while worklist:
+        block = order[heapq.heappop(worklist)]
+        in_worklist[block] = 0
+        fact: int | None = None
+        for source in sources[block]:
+            fact = facts_out[source] if fact is None else meet(fact, facts_out[source])
+        is_boundary = block == 0 if forward else not graph.blocks[block].successors
+        if is_boundary:
+            fact = boundary if fact is None else meet(fact, boundary)
+        facts_in[block] = initial if fact is None else fact
+        out = transfer(block, facts_in[block])
+        if out != facts_out[block]:
+            facts_out[block] = out
+            for target in targets[block]:
+                if not in_worklist[target]:
+                    in_worklist[target] = 1
+                    heapq.heappush(worklist, position[target])
+
+    if forward:
+        return DataflowResult(facts_in, facts_out)
+    return DataflowResult(facts_out, facts_in)
+
+
+@dataclass
+class Liveness:
+    """The variables that may be read later, before being written to
+    again, at the start and at the end of every block."""
+    variables: Variables
+    live_in: list[int]
+    live_out: list[int]
+
+    def live_after(self, graph: ControlFlowGraph, block: int) -> list[int]:
+        """The live variables after each instruction of 'block'."""
+        instructions = graph.blocks[block].instructions
+        result = [0] * len(instructions)
+        live = self.live_out[block]
+        for i in range(len(instructions) - 1, -1, -1):
+            result[i] = live
+            insn = instructions[i]
+            if (dest := definition(insn)) is not None:
+                bit = self.variables.bit(dest)
+                live = _without(live, bit)
+            for var in uses(insn):
+                live |= self.variables.bit(var)
+        return result
+
+
+def liveness(graph: ControlFlowGraph, variables: Variables | None = None) -> Liveness:
+    if variables is None:
+        variables = Variables(graph)
+    # Variables read before being written in each block, and those written
+    block_uses: list[int] = []
+    block_defs: list[int] = []
+    for block in graph.blocks:
+        used: set[int] = set()
+        defined: set[int] = set()
+        for insn in reversed(block.instructions):
+            if (dest := definition(insn)) is not None and (index := variables.index(dest)) is not None:
+                defined.add(index)
+                used.discard(index)
+            for var in uses(insn):
+                if (index := variables.index(var)) is not None:
+                    used.add(index)
+        block_uses.append(bits(used))
+        block_defs.append(bits(defined))
+
+    result = solve(graph, lambda block, live: block_uses[block] | _without(live, block_defs[block]), forward=False)
+    return Liveness(variables, result.block_in, result.block_out)
+
+
+@dataclass(frozen=True)
+class Definition:
+    """An instruction that writes 'var': the 'index'th of 'block', or
+    the 'index'th parameter of the function if 'block' is None."""
+    var: ir.IRVar
+    block: int | None
+    index: int
+
+
+@dataclass
+class ReachingDefinitions:
+    """The definitions that may have written the current value of their
+    variable, at the start and at the end of every block. Bit i of a set
+    is 'definitions[i]'.
+
+    Only variables with more than one definition are tracked. The one
+    definition of any other variable is the only one that can reach its
+    uses, and leaving those out keeps the sets small: most variables
+    are temporaries that are written once.
+    """
+    definitions: list[Definition]
+    reach_in: list[int]
+    reach_out: list[int]
+    # All definitions of each tracked variable, by name
+    of_variable: dict[str, int]
+    # Number of the first definition in each block
+    first_in_block: list[int]
+
+    def reaching_before(self, graph: ControlFlowGraph, block: int) -> list[int]:
+        """The definitions that reach each instruction of 'block'."""
+        instructions = graph.blocks[block].instructions
+        result = [0] * len(instructions)
+        reaching = self.reach_in[block]
+        number = self.first_in_block[block]
+        for i, insn in enumerate(instructions):
+            result[i] = reaching
+            if (dest := definition(insn)) is not None and (kill := self.of_variable.get(dest.name)) is not None:
+                reaching = _without(reaching, kill) | (1 << number)
+                number += 1
+        return result
+
+
+def reaching_definitions(graph: ControlFlowGraph) -> ReachingDefinitions:
+    params = graph.start.params if graph.start is not None else []
+    definition_counts: dict[str, int] = {}
+    for param in params:
+        definition_counts[param.name] = definition_counts.get(param.name, 0) + 1
+    for block in graph.blocks:
+        for insn in block.instructions:
+            if (dest := definition(insn)) is not None:
+                definition_counts[dest.name] = definition_counts.get(dest.name, 0) + 1
+
+    definitions: list[Definition] = []
+    numbers: dict[str, list[int]] = {}
+
+    def add(new: Definition) -> int:
+        numbers.setdefault(new.var.name, []).append(len(definitions))
+        definitions.append(new)
+        return len(definitions) - 1
+
+    for i, param in enumerate(params):
+        if definition_counts[param.name] > 1:
+            add(Definition(param, None, i))
+    entry = bits(range(len(definitions)))
+
+    first_in_block: list[int] = []
+    # The last definition of each variable in each block, which reaches
+    # its end. Every other definition of those variables is killed.
+    last_in_block: list[dict[str, int]] = []
+    for block_index, block in enumerate(graph.blocks):
+        first_in_block.append(len(definitions))
+        last: dict[str, int] = {}
+        for i, insn in enumerate(block.instructions):
+            if (dest := definition(insn)) is not None and definition_counts[dest.name] > 1:
+                last[dest.name] = add(Definition(dest, block_index, i))
+        last_in_block.append(last)
+
+    of_variable = {name: bits(variable_numbers) for name, variable_numbers in numbers.items()}
+    block_gen: list[int] = []
+    block_kill: list[int] = []
+    for last in last_in_block:
+        gen = bits(last.values())
+        kill = 0
+        for name in last:
+            kill |= of_variable[name]
+        block_gen.append(gen)
+        block_kill.append(kill ^ gen)
+
+    result = solve(
+        graph,
+        lambda block, reaching: block_gen[block] | _without(reaching, block_kill[block]),
+        forward=True,
+        boundary=entry,
+    )
+    return ReachingDefinitions(definitions, result.block_in, result.block_out, of_variable, first_in_block)
@@ -0,0 +1,98 @@
+"""Links encoded Assembly files into a static x86-64 ELF executable in memory.
+
+This does what 'ld -static' does for the object files 'as' makes
+of our Assembly, without any libraries. Everything lives in one
+read-only, executable segment: the code, and the strings the
+standard library keeps in '.text'. Nothing is written to after the
+program starts except the stack.
+"""
+import struct
+
+from compiler.x86_encoder import ObjectCode
+
+BASE_ADDRESS = 0x400000
+
+_ELF_HEADER = struct.Struct('<16sHHIQQQIHHHHHH')
+_PROGRAM_HEADER = struct.Struct('<IIQQQQQQ')
+_PT_LOAD = 1
+_PT_GNU_STACK = 0x6474E551
+_PF_X, _PF_W, _PF_R = 1, 2, 4
+
+
+def _align(n: int, alignment: int) -> int:
+    return (n + alignment - 1) // alignment * alignment
+
+
+def link(objects: list[ObjectCode], entry: str = '_start') -> bytes:
+    """Lays out 'objects' one after another, resolves their symbols
+    and returns an executable that starts at 'entry'.
+
+    Symbols are looked up in the object that uses them first,
+    then among the '.global' symbols of all objects.
+    """
+    code_start = _align(_ELF_HEADER.size + 2 * _PROGRAM_HEADER.size, 16)
+    image = bytearray(code_start)
+    bases: list[int] = []
+    global_addresses: dict[str, int] = {}
+    for obj in objects:
+        image += bytes(_align(len(image), 16) - len(image))
+        base = BASE_ADDRESS + len(image)
+        bases.append(base)
+        image += obj.code
+        for name in obj.global_names:
+            if name in obj.labels:
+                address = base + obj.labels[name]
+            elif name in obj.constants:
+                address = obj.constants[name]
+            else:
+                continue
+            if name in global_addresses:
+                raise Exception(f'multiple definitions of {name}')
+            global_addresses[name] = address
+
+    for obj, base in zip(objects, bases):
+        def resolve(name: str) -> int:
+            if name in obj.labels:
+                return base + obj.labels[name]
+            if name in obj.constants:
+                return obj.constants[name]
+            if name in global_addresses:
+                return global_addresses[name]
+            raise Exception(f'undefined reference to {name}')
+
+        file_base = base - BASE_ADDRESS
+        for fixup in obj.fixups:
+            value = resolve(fixup.symbol) + fixup.addend
+            if fixup.pc_relative:
+                value -= base + fixup.end
+            bits = 8 * fixup.size
+            # Like 'as' and 'ld', accept values that fit either signed or unsigned
+            if not -2**(bits - 1) <= value < 2**bits:
+                raise Exception(f'relocation of {fixup.symbol} does not fit in {bits} bits')
+            position = file_base + fixup.offset
+            image[position:position + fixup.size] = (value % 2**bits).to_bytes(fixup.size, 'little')
+
+    if entry not in global_addresses:
+        raise Exception(f'undefined entry point {entry}')
+
+    header = _ELF_HEADER.pack(
+        b'\x7fELF\x02\x01\x01' + bytes(9),  # 64-bit, little-endian, version 1
+        2,  # ET_EXEC
+        0x3E,  # EM_X86_64
+        1,  # EV_CURRENT
+        global_addresses[entry],
+        _ELF_HEADER.size,  # program headers follow the ELF header
+        0,  # no section headers
+        0,
+        _ELF_HEADER.size,
+        _PROGRAM_HEADER.size,
+        2,
+        64,
+        0,
+        0,
+    )
+    # The whole file is mapped at BASE_ADDRESS
+    load = _PROGRAM_HEADER.pack(_PT_LOAD, _PF_R | _PF_X, 0, BASE_ADDRESS, BASE_ADDRESS, len(image), len(image), 0x1000)
+    stack = _PROGRAM_HEADER.pack(_PT_GNU_STACK, _PF_R | _PF_W, 0, 0, 0, 0, 0, 16)
+    image[:len(header) + 2 * len(load)] = header + load + stack
+    return bytes(image)
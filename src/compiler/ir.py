@@ -1,7 +1,10 @@
+from array import array
 from dataclasses import dataclass
 import dataclasses
+from enum import IntEnum
 from compiler.parser import TokenLocation
-from typing import Any
+from compiler.tokenizer import L
+from typing import Any, Callable
 
 @dataclass(frozen=True)
 class IRVar:
@@ -90,3 +93,184 @@ class Return(Instruction):
     """Returns a value from func"""
     value: IRVar
 
+
+
+class Opcode(IntEnum):
+    """Instruction kinds of 'CompactIR', one per instruction class."""
+    LABEL = 0
+    LOAD_BOOL_CONST = 1
+    LOAD_INT_CONST = 2
+    COPY = 3
+    CALL = 4
+    JUMP = 5
+    COND_JUMP = 6
+    FUNCTION_START = 7
+    FUNCTION_END = 8
+    RETURN = 9
+
+
+class CompactIR:
+    """Compact struct-of-arrays storage for a list of IR instructions.
+
+    Every instruction takes an opcode byte and three integer operands
+    in the columns 'a', 'b' and 'c'. Variables are dense integer ids
+    into 'variables', and labels and function names are ids into
+    'names'. Argument and parameter lists are stored in 'lists' as their
+    length followed by the variable ids, and the instruction keeps the
+    offset where that starts. Locations are kept in 'rows' and 'columns'.
+
+        LABEL            a=name
+        LOAD_BOOL_CONST  a=value    b=dest
+        LOAD_INT_CONST   a=value    b=dest
+        COPY             a=source   b=dest
+        CALL             a=fun      b=dest        c=args
+        JUMP             a=label
+        COND_JUMP        a=cond     b=then_label  c=else_label
+        FUNCTION_START   a=name                   c=params
+        FUNCTION_END     a=name
+        RETURN           a=value
+
+    Use 'to_compact()' and 'from_compact()' to convert
+    from and to a list of 'Instruction's.
+
+    This is a storage format: 'serialization' writes its columns as they
+    are. The compiler's phases and passes work on the dataclass IR.
+    """
+
+    def __init__(self) -> None:
+        self.opcodes = array('B')
+        self.a = array('q')
+        self.b = array('q')
+        self.c = array('q')
+        self.lists = array('q')
+        self.rows = array('i')
+        self.columns = array('i')
+        self.variables: list[str] = []
+        self.names: list[str] = []
+        # Indexes from names to ids, only kept while adding instructions
+        self._variable_ids: dict[str, int] | None = {}
+        self._name_ids: dict[str, int] | None = {}
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def variable_id(self, name: str) -> int:
+        """The id of variable 'name', adding it if it is new."""
+        if self._variable_ids is None:
+            self._variable_ids = {name: var_id for var_id, name in enumerate(self.variables)}
+        var_id = self._variable_ids.get(name)
+        if var_id is None:
+            var_id = self._variable_ids[name] = len(self.variables)
+            self.variables.append(name)
+        return var_id
+
+    def name_id(self, name: str) -> int:
+        """The id of label or function 'name', adding it if it is new."""
+        if self._name_ids is None:
+            self._name_ids = {name: name_id for name_id, name in enumerate(self.names)}
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def append(self, opcode: Opcode, location: TokenLocation, a: int = 0, b: int = 0, c: int = 0) -> None:
+        self.opcodes.append(opcode)
+        self.a.append(a)
+        self.b.append(b)
+        self.c.append(c)
+        self.rows.append(location.row)
+        self.columns.append(location.col)
+
+    def add_list(self, variable_ids: list[int]) -> int:
+        """Stores a list of variable ids and returns its offset in 'lists'."""
+        offset = len(self.lists)
+        self.lists.append(len(variable_ids))
+        self.lists.extend(variable_ids)
+        return offset
+
+    def list_at(self, offset: int) -> 'array[int]':
+        return self.lists[offset + 1:offset + 1 + self.lists[offset]]
+
+    def drop_indexes(self) -> None:
+        """Frees the name to id indexes, which take about as much memory
+        as the instructions. They are rebuilt if more are added."""
+        self._variable_ids = None
+        self._name_ids = None
+
+    def location(self, i: int) -> TokenLocation:
+        return TokenLocation(self.rows[i], self.columns[i])
+
+
+def to_compact(instructions: list[Instruction]) -> CompactIR:
+    """Converts 'instructions' to a 'CompactIR'."""
+    code = CompactIR()
+    var = code.variable_id
+    name = code.name_id
+    for insn in instructions:
+        loc = insn.location
+        match insn:
+            case Label():
+                code.append(Opcode.LABEL, loc, name(insn.name))
+            case LoadBoolConst():
+                code.append(Opcode.LOAD_BOOL_CONST, loc, int(insn.value), var(insn.dest.name))
+            case LoadIntConst():
+                if not -2**63 <= insn.value < 2**63:
+                    raise Exception(f'{loc}: integer {insn.value} does not fit in 64 bits')
+                code.append(Opcode.LOAD_INT_CONST, loc, insn.value, var(insn.dest.name))
+            case Copy():
+                code.append(Opcode.COPY, loc, var(insn.source.name), var(insn.dest.name))
+            case Call():
+                fun = var(insn.fun.name)
+                args = code.add_list([var(arg.name) for arg in insn.args])
+                code.append(Opcode.CALL, loc, fun, var(insn.dest.name), args)
+            case Jump():
+                code.append(Opcode.JUMP, loc, name(insn.label.name))
+            case CondJump():
+                code.append(Opcode.COND_JUMP, loc, var(insn.cond.name), name(insn.then_label.name), name(insn.else_label.name))
+            case FunctionStart():
+                function = name(insn.name)
+                params = code.add_list([var(param.name) for param in insn.params])
+                code.append(Opcode.FUNCTION_START, loc, function, 0, params)
+            case FunctionEnd():
+                code.append(Opcode.FUNCTION_END, loc, name(insn.name))
+            case Return():
+                code.append(Opcode.RETURN, loc, var(insn.value.name))
+            case _:
+                raise Exception(f'{loc}: unknown instruction {insn}')
+    code.drop_indexes()
+    return code
+
+
+def from_compact(code: CompactIR) -> list[Instruction]:
+    """Converts a 'CompactIR' back to a list of 'Instruction's."""
+    variables = [IRVar(name) for name in code.variables]
+    names = code.names
+    lists = code.lists.tolist()
+
+    def var_list(offset: int) -> list[IRVar]:
+        return [variables[var_id] for var_id in lists[offset + 1:offset + 1 + lists[offset]]]
+
+    # Jumps refer to the same 'Label' object that marks their target
+    labels = [Label(L, name) for name in names]
+    for i in range(len(code)):
+        if code.opcodes[i] == Opcode.LABEL:
+            labels[code.a[i]] = Label(code.location(i), names[code.a[i]])
+
+    # Indexed by opcode
+    builders: list[Callable[[TokenLocation, int, int, int], Instruction]] = [
+        lambda loc, a, b, c: labels[a],
+        lambda loc, a, b, c: LoadBoolConst(loc, bool(a), variables[b]),
+        lambda loc, a, b, c: LoadIntConst(loc, a, variables[b]),
+        lambda loc, a, b, c: Copy(loc, variables[a], variables[b]),
+        lambda loc, a, b, c: Call(loc, variables[a], var_list(c), variables[b]),
+        lambda loc, a, b, c: Jump(loc, labels[a]),
+        lambda loc, a, b, c: CondJump(loc, variables[a], labels[b], labels[c]),
+        lambda loc, a, b, c: FunctionStart(loc, names[a], var_list(c)),
+        lambda loc, a, b, c: FunctionEnd(loc, names[a]),
+        lambda loc, a, b, c: Return(loc, variables[a]),
+    ]
+    return [
+        builders[opcode](TokenLocation(row, col), a, b, c)
+        for opcode, a, b, c, row, col in zip(code.opcodes, code.a, code.b, code.c, code.rows, code.columns)
+    ]
@@ -3,15 +3,7 @@ from compiler.types import Bool, Int, Unit, FunType
 from compiler.ir import IRVar, Call, Label, Instruction, Jump, Copy
 from compiler.tokenizer import L
 from compiler import ast, ir
-
-class BreakException(Exception):
-    pass
-
-class ContinueException(Exception):
-    pass
-
-# Global list to store function definitions
-_function_definitions: list[ast.FunctionDefinition] = []
+from compiler.trampoline import Step, run
 
 def generate_ir(
     # 'reserved_names' should contain all global names
@@ -44,6 +36,34 @@ def generate_ir(
     # (start_label, end_label) or None if not inside a loop
     current_loop_labels: tuple[Label, Label] | None = None
 
+    # Whether control can reach the next instruction. After a jump or
+    # a return it can't until a label that some emitted jump targets.
+    # Blocks skip expressions while it is False, so nothing is generated
+    # for code after 'break', 'continue' or 'return'.
+    reachable = True
+    jump_targets: set[str] = set()
+
+    # Control flow goes through these two so that 'reachable' stays
+    # up to date. Other instructions are appended to 'ins' directly.
+    def emit_jump(insn: ir.Jump | ir.CondJump | ir.Return) -> None:
+        nonlocal reachable
+        if not reachable:
+            return
+        ins.append(insn)
+        match insn:
+            case ir.Jump():
+                jump_targets.add(insn.label.name)
+            case ir.CondJump():
+                jump_targets.add(insn.then_label.name)
+                jump_targets.add(insn.else_label.name)
+        reachable = False
+
+    def emit_label(label: Label) -> None:
+        nonlocal reachable
+        if reachable or label.name in jump_targets:
+            ins.append(label)
+            reachable = True
+
     # This function visits an AST node,
     # appends IR instructions to 'ins',
     # and returns the IR variable where
@@ -53,7 +73,11 @@ def generate_ir(
     # (which may be shadowed) to unique IR variables.
     # The symbol table will be updated in the same way as
     # in the interpreter and type checker.
-    def visit(st: SymTab[IRVar], expr: ast.Expression) -> IRVar:
+    #
+    # It is a step for 'trampoline.run': subexpressions are
+    # visited by yielding them, so deeply nested programs
+    # don't run into the recursion limit.
+    def visit(st: SymTab[IRVar], expr: ast.Expression) -> Step[IRVar]:
         nonlocal current_loop_labels
         loc = expr.location
         match expr:
@@ -90,19 +114,19 @@ def generate_ir(
                 l_end = new_label("and_end")
                 l_skip = new_label("and_skip")
 
-                var_left = visit(st, expr.left)
-                ins.append(ir.CondJump(loc, var_left, l_right, l_skip))
+                var_left = yield visit(st, expr.left)
+                emit_jump(ir.CondJump(loc, var_left, l_right, l_skip))
 
-                ins.append(l_right)
-                var_right = visit(st, expr.right)
+                emit_label(l_right)
+                var_right = yield visit(st, expr.right)
                 ins.append(ir.Copy(loc, var_right, var_result))
-                ins.append(Jump(loc, l_end))
+                emit_jump(Jump(loc, l_end))
 
-                ins.append(l_skip)
+                emit_label(l_skip)
                 ins.append(ir.Copy(loc, var_left, var_result))
-                ins.append(ir.Jump(loc, l_end))
+                emit_jump(ir.Jump(loc, l_end))
 
-                ins.append(l_end)
+                emit_label(l_end)
                 return var_result
             
             case ast.BinaryOp() if expr.op == 'or':
@@ -112,25 +136,25 @@ def generate_ir(
                 l_skip = new_label("or_skip")
                 l_end = new_label("or_end")
 
-                var_left = visit(st, expr.left)
-                ins.append(ir.CondJump(loc, var_left, l_skip, l_right))
+                var_left = yield visit(st, expr.left)
+                emit_jump(ir.CondJump(loc, var_left, l_skip, l_right))
 
-                ins.append(l_right)
-                var_right = visit(st, expr.right)
+                emit_label(l_right)
+                var_right = yield visit(st, expr.right)
                 ins.append(ir.Copy(loc, var_right, var_result))
-                ins.append(Jump(loc, l_end))
+                emit_jump(Jump(loc, l_end))
 
-                ins.append(l_skip)
+                emit_label(l_skip)
                 ins.append(ir.Copy(loc, var_left, var_result))
 
-                ins.append(Jump(loc, l_end))
-                ins.append(l_end)
+                emit_jump(Jump(loc, l_end))
+                emit_label(l_end)
                 return var_result                
 
             case ast.BinaryOp() if expr.op == '=':
                 assert isinstance(expr.left, ast.Identifier), "LHS of assignment must be an identifier"
                 var_dest = st.map(expr.left.name)
-                var_src = visit(st, expr.right)
+                var_src = yield visit(st, expr.right)
                 ins.append(ir.Copy(loc, var_src, var_dest))
                 return var_src
 
@@ -139,8 +163,8 @@ def generate_ir(
                 # to the operator to call.
                 var_op = st.map(expr.op)
                 # Recursively emit instructions to calculate the operands.
-                var_left = visit(st, expr.left)
-                var_right = visit(st, expr.right)
+                var_left = yield visit(st, expr.left)
+                var_right = yield visit(st, expr.right)
                 # Generate variable to hold the result.
                 var_result = new_var()
                 # Emit a Call instruction that writes to that variable.
@@ -156,25 +180,21 @@ def generate_ir(
 
                     # Recursively emit instructions for
                     # evaluating the condition.
-                    var_cond = visit(st, expr.first_expr)
+                    var_cond = yield visit(st, expr.first_expr)
                     # Emit a conditional jump instruction
                     # to jump to 'l_then' or 'l_end',
                     # depending on the content of 'var_cond'.
-                    ins.append(ir.CondJump(loc, var_cond, l_then, l_end))
+                    emit_jump(ir.CondJump(loc, var_cond, l_then, l_end))
  
                     # Emit the label that marks the beginning of
                     # the "then" branch.
-                    ins.append(l_then)
+                    emit_label(l_then)
                     # Recursively emit instructions for the "then" branch.
-                    try:
-                        visit(st, expr.second_expr)
-                    except (BreakException, ContinueException):
-                        ins.append(l_end)
-                        raise
+                    yield visit(st, expr.second_expr)
  
                     # Emit the label that we jump to
                     # when we don't want to go to the "then" branch.
-                    ins.append(l_end)
+                    emit_label(l_end)
  
                     # An if-then expression doesn't return anything, so we
                     # return a special variable "unit".
@@ -187,31 +207,22 @@ def generate_ir(
                     # Create a single result variable that both branches will write to
                     var_result = new_var()
 
-                    first_cond = visit(st, expr.first_expr)
-                    ins.append(ir.CondJump(loc, first_cond, l_then, l_else))
+                    first_cond = yield visit(st, expr.first_expr)
+                    emit_jump(ir.CondJump(loc, first_cond, l_then, l_else))
 
-                    ins.append(l_then)
-                    pending_exception: BreakException | ContinueException | None = None
-                    try:
-                        var_then = visit(st, expr.second_expr)
+                    emit_label(l_then)
+                    var_then = yield visit(st, expr.second_expr)
+                    if reachable:
                         ins.append(ir.Copy(loc, var_then, var_result))
-                        ins.append(Jump(location=loc, label=l_end))
-                    except (BreakException, ContinueException) as exc:
-                        pending_exception = exc
-                    
-                    ins.append(l_else)
+                    emit_jump(Jump(location=loc, label=l_end))
+
+                    emit_label(l_else)
                     if expr.third_expr is not None:
-                        try:
-                            var_else = visit(st, expr.third_expr)
+                        var_else = yield visit(st, expr.third_expr)
+                        if reachable:
                             ins.append(ir.Copy(loc, var_else, var_result))
-                        except (BreakException, ContinueException):
-                            ins.append(l_end)
-                            raise
 
-                    ins.append(l_end)
-                    
-                    if pending_exception is not None:
-                        raise pending_exception
+                    emit_label(l_end)
 
                     return var_result
             case ast.FunctionCall():
@@ -219,7 +230,9 @@ def generate_ir(
                 # the function name.
                 var_fun = st.map(expr.function_name.name)
                 # Recursively emit instructions to calculate the arguments.
-                var_args = [visit(st, arg) for arg in expr.arguments]
+                var_args = []
+                for arg in expr.arguments:
+                    var_args.append((yield visit(st, arg)))
                 # Generate variable to hold the result.
                 var_result = new_var()
                 # Emit a Call instruction that writes to that variable.
@@ -234,51 +247,32 @@ def generate_ir(
                 l_end = new_label("while_end")
                 current_loop_labels = (l_start, l_end)
 
-                ins.append(l_start)
-                var_cond = visit(st, expr.condition_expr)
-                ins.append(ir.CondJump(loc, var_cond, l_body, l_end))
-
-                ins.append(l_body)
-                try:
-                    visit(st, expr.body_expr)
-                except BreakException:
-                    pass
-                except ContinueException:
-                    pass
-                ins.append(Jump(location=loc, label=l_start))
-                ins.append(l_end)
+                emit_label(l_start)
+                var_cond = yield visit(st, expr.condition_expr)
+                emit_jump(ir.CondJump(loc, var_cond, l_body, l_end))
+
+                emit_label(l_body)
+                yield visit(st, expr.body_expr)
+                emit_jump(Jump(location=loc, label=l_start))
+                emit_label(l_end)
                 current_loop_labels = old_loop_labels
 
                 return var_unit
             
             case ast.Block():
-                new_symtab_for_block = SymTab[IRVar](mapping=st.mapping.copy())
-
-                block_pending_exception: BreakException | ContinueException | None = None
+                new_symtab_for_block = st.child()
 
                 for e in expr.expressions:
-                    if e is not expr.result_expression:
-                        if block_pending_exception is None:
-                            try:
-                                visit(new_symtab_for_block, e)
-                            except (BreakException, ContinueException) as exc:
-                                block_pending_exception = exc
-                        else:
-                            try:
-                                visit(new_symtab_for_block, e)
-                            except (BreakException, ContinueException):
-                                pass
-                
-                if block_pending_exception is None:
-                    return visit(new_symtab_for_block, expr.result_expression)
-                else:
-                    try:
-                        visit(new_symtab_for_block, expr.result_expression)
-                    except (BreakException, ContinueException):
-                        pass
-                    raise block_pending_exception
+                    # Skip expressions that can't be reached, e.g. after
+                    # a 'break', but still collect function definitions.
+                    if e is not expr.result_expression and (reachable or isinstance(e, ast.FunctionDefinition)):
+                        yield visit(new_symtab_for_block, e)
+
+                if reachable or isinstance(expr.result_expression, ast.FunctionDefinition):
+                    return (yield visit(new_symtab_for_block, expr.result_expression))
+                return var_unit
             case ast.VariableDeclaration():
-                var_value = visit(st, expr.expression)
+                var_value = yield visit(st, expr.expression)
                 if not isinstance(expr.ID, ast.Identifier):
                     raise Exception(f"{loc}: expected variable name to be an identifier")
                 var_name = expr.ID.name
@@ -287,7 +281,7 @@ def generate_ir(
                 st.add_local(var_name, var_new)
                 return var_unit
             case ast.UnaryOperator():
-                var = visit(st, expr.right)
+                var = yield visit(st, expr.right)
                 var_op = st.map(expr.op)
                 var_result = new_var()
                 if expr.op == '-':
@@ -302,15 +296,15 @@ def generate_ir(
                 if current_loop_labels is None:
                     raise Exception(f"{loc}: break outside of loop")
                 l_start, l_end = current_loop_labels
-                ins.append(ir.Jump(loc, l_end))
-                raise BreakException()
+                emit_jump(ir.Jump(loc, l_end))
+                return var_unit
 
             case ast.Continue():
                 if current_loop_labels is None:
                     raise Exception(f"{loc}: continue outside of loop")
                 l_start, l_end = current_loop_labels
-                ins.append(ir.Jump(loc, l_start))
-                raise ContinueException()
+                emit_jump(ir.Jump(loc, l_start))
+                return var_unit
             
             case ast.FunctionDefinition():
                 st.add_local(expr.name.name, IRVar(expr.name.name))
@@ -318,8 +312,8 @@ def generate_ir(
                 return var_unit
             
             case ast.Return():
-                var_value = visit(st, expr.value)
-                ins.append(ir.Return(loc, var_value))
+                var_value = yield visit(st, expr.value)
+                emit_jump(ir.Return(loc, var_value))
                 return var_value
             
             #... # Other AST node cases (see below)
@@ -334,6 +328,8 @@ def generate_ir(
     # they just need to exist so the variable lookups work,
     # and clashing variable names can be avoided.
     
+    # Function definitions found while visiting.
+    # Their bodies are generated after the main program.
     _function_definitions: list[ast.FunctionDefinition] = []
     
     empty_dict: dict[str, IRVar] = {}
@@ -342,7 +338,7 @@ def generate_ir(
         root_symtab.add_local(name, IRVar(name))
 
     # Start visiting the AST from the root.
-    var_final_result = visit(root_symtab, root_expr)
+    var_final_result = run(visit(root_symtab, root_expr))
 
     # Add IR code to print the result, based on the type assigned earlier
     # by the type checker.
@@ -357,7 +353,7 @@ def generate_ir(
         root_symtab.add_local(func_def.name.name, IRVar(func_def.name.name))
 
     for func_def in _function_definitions:
-        func_symtab = SymTab[IRVar](mapping=root_symtab.mapping.copy())
+        func_symtab = root_symtab.child()
         
         func_symtab.add_local(func_def.name.name, IRVar(func_def.name.name))
         
@@ -368,8 +364,13 @@ def generate_ir(
             param_vars.append(param_var)
             func_symtab.add_local(param_name.name, param_var)
         
+        # Every function body starts reachable,
+        # even if the previous one ended in a 'return'.
+        reachable = True
         ins.append(ir.FunctionStart(L, func_def.name.name, param_vars))
-        visit(func_symtab, func_def.body)
+        body_result = run(visit(func_symtab, func_def.body))
+        # The value of the body is returned, unless it ends in a 'return'
+        emit_jump(ir.Return(func_def.body.location, body_result))
         ins.append(ir.FunctionEnd(L, func_def.name.name))
 
     return ins
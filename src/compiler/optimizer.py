@@ -0,0 +1,549 @@
+"""Optimization passes over the IR.
+
+Each pass works on one control-flow graph and rewrites the instructions
+of its blocks in place. 'optimize' runs them all on a whole program.
+"""
+import operator
+from enum import Enum
+from typing import Callable
+
+from compiler import ir
+from compiler.cfg import BasicBlock, ControlFlowGraph, build_cfgs, linearize
+from compiler.dataflow import Variables, bits, definition, liveness, solve, uses
+from compiler.ssa import NOT_A_VARIABLE, UNDEFINED, SSAForm
+from compiler.tokenizer import TokenLocation
+
+INT_MIN = -2**63
+
+
+def wrap(value: int) -> int:
+    """'value' as a signed 64-bit integer, as the machine computes it."""
+    return (value + 2**63) % 2**64 - 2**63
+
+
+class Lattice(Enum):
+    # No value seen yet: the definition hasn't run, or may never run
+    TOP = 'top'
+    # Different values on different paths, or not known until runtime
+    BOTTOM = 'bottom'
+
+
+# What a variable is known to hold: a constant Int or Bool, or Lattice
+Value = int | bool | Lattice
+
+
+def meet(a: Value, b: Value) -> Value:
+    if a is Lattice.TOP:
+        return b
+    if b is Lattice.TOP:
+        return a
+    # 'True == 1', but an Int and a Bool are different constants
+    if type(a) is type(b) and a == b:
+        return a
+    return Lattice.BOTTOM
+
+
+def _divide(a: int, b: int) -> int | None:
+    # 'idivq' traps on these, which has to happen at runtime
+    if b == 0 or (a == INT_MIN and b == -1):
+        return None
+    quotient = abs(a) // abs(b)
+    # Rounds towards zero, unlike '//'
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+def _remainder(a: int, b: int) -> int | None:
+    quotient = _divide(a, b)
+    # Has the sign of 'a', unlike '%'
+    return None if quotient is None else a - b * quotient
+
+
+# Intrinsics that compute their result from their arguments and nothing
+# else, as in 'intrinsics.py'. None means the result isn't a constant.
+foldable_intrinsics: dict[str, Callable[..., int | bool | None]] = {
+    '+': lambda a, b: wrap(a + b),
+    '-': lambda a, b: wrap(a - b),
+    '*': lambda a, b: wrap(a * b),
+    '/': _divide,
+    '%': _remainder,
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    'unary_-': lambda a: wrap(-a),
+    'unary_not': lambda a: not a,
+}
+
+
+def _load_constant(location: TokenLocation, value: int | bool, dest: ir.IRVar) -> ir.Instruction:
+    if isinstance(value, bool):
+        return ir.LoadBoolConst(location, value, dest)
+    return ir.LoadIntConst(location, value, dest)
+
+
+def propagate_constants(graph: ControlFlowGraph) -> int:
+    """Sparse conditional constant propagation (Wegman and Zadeck).
+
+    Finds the variables that hold the same constant whenever they're
+    read, ignoring code that can't run because branch conditions are
+    constant. Calls to foldable intrinsics that compute a constant
+    become loads of it, and branches on a constant become jumps. Calls
+    that would trap at runtime, like division by zero, are left alone.
+    Returns the number of instructions that changed.
+    """
+    ssa = SSAForm(graph)
+    blocks = graph.blocks
+    values: list[Value] = [Lattice.TOP] * ssa.value_count
+    for param in ssa.params:
+        values[param] = Lattice.BOTTOM
+
+    # Where each value is read: instructions as (block, index), and
+    # phis as (block, -1 - position)
+    users: list[list[tuple[int, int]]] = [[] for _ in range(ssa.value_count)]
+    for block in range(len(blocks)):
+        for index, operands in enumerate(ssa.operands[block]):
+            for value in operands:
+                if value >= 0:
+                    users[value].append((block, index))
+        for position, phi in enumerate(ssa.phis[block]):
+            for value in phi.args:
+                if value >= 0:
+                    users[value].append((block, -1 - position))
+
+    def value_of(operand: int) -> Value:
+        if operand == NOT_A_VARIABLE:
+            return Lattice.BOTTOM
+        if operand == UNDEFINED:
+            return Lattice.TOP
+        return values[operand]
+
+    executable = bytearray(len(blocks))
+    executable_edges: set[tuple[int, int]] = set()
+    # Edges as (from, to), where -1 is the caller
+    flow_worklist: list[tuple[int, int]] = [(-1, 0)]
+    value_worklist: list[int] = []
+
+    def lower(value: int, new: Value) -> None:
+        merged = meet(values[value], new)
+        # Only ever moves down from TOP to a constant to BOTTOM
+        if merged is not values[value]:
+            values[value] = merged
+            value_worklist.append(value)
+
+    def visit_phi(block: int, position: int) -> None:
+        phi = ssa.phis[block][position]
+        result: Value = Lattice.TOP
+        for predecessor, arg in zip(blocks[block].predecessors, phi.args):
+            if (predecessor, block) in executable_edges:
+                result = meet(result, value_of(arg))
+        lower(phi.value, result)
+
+    def visit(block: int, index: int) -> None:
+        insn = blocks[block].instructions[index]
+        operands = ssa.operands[block][index]
+        successors = blocks[block].successors
+        result: Value
+        match insn:
+            case ir.LoadIntConst():
+                result = wrap(insn.value)
+            case ir.LoadBoolConst():
+                result = insn.value
+            case ir.Copy():
+                result = value_of(operands[0])
+            case ir.Call():
+                fold = foldable_intrinsics.get(insn.fun.name) if operands[0] == NOT_A_VARIABLE else None
+                args = [value_of(operand) for operand in operands[1:]]
+                if fold is None or Lattice.BOTTOM in args:
+                    result = Lattice.BOTTOM
+                elif Lattice.TOP in args:
+                    result = Lattice.TOP
+                else:
+                    folded = fold(*args)
+                    result = Lattice.BOTTOM if folded is None else folded
+            case ir.CondJump():
+                cond = value_of(operands[0])
+                if cond is Lattice.BOTTOM:
+                    flow_worklist.extend((block, successor) for successor in successors)
+                elif cond is not Lattice.TOP:
+                    flow_worklist.append((block, successors[0] if cond else successors[-1]))
+                return
+            case _:
+                return
+        lower(ssa.results[block][index], result)
+
+    while flow_worklist or value_worklist:
+        while flow_worklist:
+            edge = flow_worklist.pop()
+            if edge in executable_edges:
+                continue
+            executable_edges.add(edge)
+            block = edge[1]
+            for position in range(len(ssa.phis[block])):
+                visit_phi(block, position)
+            if executable[block]:
+                continue
+            executable[block] = 1
+            for index in range(len(blocks[block].instructions)):
+                visit(block, index)
+            if not isinstance(blocks[block].terminator, (ir.CondJump, ir.Return)):
+                flow_worklist.extend((block, successor) for successor in blocks[block].successors)
+        while value_worklist and not flow_worklist:
+            for block, index in users[value_worklist.pop()]:
+                if executable[block]:
+                    if index < 0:
+                        visit_phi(block, -1 - index)
+                    else:
+                        visit(block, index)
+
+    changed = 0
+    for block, node in enumerate(blocks):
+        if not executable[block]:
+            continue
+        for index, insn in enumerate(node.instructions):
+            if isinstance(insn, ir.CondJump):
+                cond = value_of(ssa.operands[block][index][0])
+                if isinstance(cond, bool):
+                    node.instructions[index] = ir.Jump(insn.location, insn.then_label if cond else insn.else_label)
+                    changed += 1
+            elif isinstance(insn, (ir.Copy, ir.Call)):
+                result = values[ssa.results[block][index]]
+                if not isinstance(result, Lattice):
+                    node.instructions[index] = _load_constant(insn.location, result, insn.dest)
+                    changed += 1
+    return changed
+
+
+def reachable(graph: ControlFlowGraph) -> bytearray:
+    """Which blocks can be reached from the entry."""
+    seen = bytearray(len(graph.blocks))
+    seen[0] = 1
+    stack = [0]
+    while stack:
+        for successor in graph.blocks[stack.pop()].successors:
+            if not seen[successor]:
+                seen[successor] = 1
+                stack.append(successor)
+    return seen
+
+
+def _map_uses(insn: ir.Instruction, f: Callable[[ir.IRVar], ir.IRVar]) -> ir.Instruction:
+    """'insn' with 'f' applied to the variables it reads."""
+    match insn:
+        case ir.Copy():
+            return ir.Copy(insn.location, f(insn.source), insn.dest)
+        case ir.Call():
+            return ir.Call(insn.location, f(insn.fun), [f(arg) for arg in insn.args], insn.dest)
+        case ir.CondJump():
+            return ir.CondJump(insn.location, f(insn.cond), insn.then_label, insn.else_label)
+        case ir.Return():
+            return ir.Return(insn.location, f(insn.value))
+        case _:
+            return insn
+
+
+def _map_variables(insn: ir.Instruction, f: Callable[[ir.IRVar], ir.IRVar]) -> ir.Instruction:
+    """'insn' with 'f' applied to the variables it reads and writes."""
+    insn = _map_uses(insn, f)
+    match insn:
+        case ir.LoadIntConst():
+            return ir.LoadIntConst(insn.location, insn.value, f(insn.dest))
+        case ir.LoadBoolConst():
+            return ir.LoadBoolConst(insn.location, insn.value, f(insn.dest))
+        case ir.Copy():
+            return ir.Copy(insn.location, insn.source, f(insn.dest))
+        case ir.Call():
+            return ir.Call(insn.location, insn.fun, insn.args, f(insn.dest))
+        case _:
+            return insn
+
+
+def propagate_copies(graph: ControlFlowGraph) -> int:
+    """Makes instructions read the source of a 'Copy' instead of its
+    destination, wherever neither has been written to since the copy.
+
+    Only copies from variables are propagated. A copy from a function
+    or a built-in stays, because those can't be read everywhere a
+    variable can. The copies themselves are left for dead code
+    elimination or 'coalesce_copies' to remove. Returns the number of
+    operands replaced.
+    """
+    variables = Variables(graph)
+    # Copies as (source, destination), numbered in program order
+    copies: list[tuple[ir.IRVar, ir.IRVar]] = []
+    # The number of each instruction of each block that is one of them, or -1
+    copy_numbers: list[list[int]] = []
+    involving: dict[str, list[int]] = {}
+    into: dict[str, list[int]] = {}
+    for block in graph.blocks:
+        numbers: list[int] = []
+        copy_numbers.append(numbers)
+        for insn in block.instructions:
+            if not (isinstance(insn, ir.Copy) and variables.index(insn.source) is not None and insn.source != insn.dest):
+                numbers.append(-1)
+            else:
+                number = len(copies)
+                numbers.append(number)
+                copies.append((insn.source, insn.dest))
+                involving.setdefault(insn.source.name, []).append(number)
+                involving.setdefault(insn.dest.name, []).append(number)
+                into.setdefault(insn.dest.name, []).append(number)
+    if not copies:
+        return 0
+    # Copies that a write to each variable makes stale, and those into each variable
+    kills = {name: bits(numbers) for name, numbers in involving.items()}
+    sources = {name: bits(numbers) for name, numbers in into.items()}
+
+    def step(available: int, insn: ir.Instruction, number: int) -> int:
+        if (dest := definition(insn)) is not None and (kill := kills.get(dest.name)) is not None:
+            available = (available | kill) ^ kill
+        if number != -1:
+            available |= 1 << number
+        return available
+
+    block_gen: list[int] = []
+    block_kill: list[int] = []
+    for block, numbers in zip(graph.blocks, copy_numbers):
+        gen = 0
+        kill = 0
+        for insn, number in zip(block.instructions, numbers):
+            if (dest := definition(insn)) is not None:
+                kill |= kills.get(dest.name, 0)
+            gen = step(gen, insn, number)
+        block_gen.append(gen)
+        block_kill.append(kill)
+
+    # A copy is available if it is on every path, so facts meet by intersecting
+    everything = (1 << len(copies)) - 1
+    result = solve(
+        graph,
+        lambda block, available: block_gen[block] | ((available | block_kill[block]) ^ block_kill[block]),
+        forward=True,
+        meet=operator.and_,
+        initial=everything,
+    )
+
+    replaced = 0
+    is_reachable = reachable(graph)
+    for index, block in enumerate(graph.blocks):
+        if not is_reachable[index]:
+            continue
+        available = result.block_in[index]
+
+        def original(var: ir.IRVar) -> ir.IRVar:
+            nonlocal replaced
+            # Follows chains of copies: each source is still unchanged
+            while (copy := available & sources.get(var.name, 0)):
+                var = copies[copy.bit_length() - 1][0]
+                replaced += 1
+            return var
+
+        for i, (insn, number) in enumerate(zip(block.instructions, copy_numbers[index])):
+            if available:
+                block.instructions[i] = _map_uses(insn, original)
+            available = step(available, insn, number)
+    return replaced
+
+
+def coalesce_copies(graph: ControlFlowGraph) -> int:
+    """Merges the source and destination of each 'Copy' into one
+    variable where that doesn't change what any instruction reads, and
+    removes the copies that become copies of a variable to itself.
+
+    Two variables can be merged if neither is written to while the
+    other is live, except by a copy between them, after which they hold
+    the same value anyway. Merged variables take the name of a
+    parameter if there is one among them, so the function's parameters
+    stay as they are. Returns the number of copies removed.
+    """
+    variables = Variables(graph)
+    copies = [
+        (insn.source.name, insn.dest.name)
+        for block in graph.blocks
+        for insn in block.instructions
+        if isinstance(insn, ir.Copy) and variables.index(insn.source) is not None
+    ]
+    if not copies:
+        return 0
+    # Only variables in copies can be merged, so only their interference matters
+    related = {name for copy in copies for name in copy}
+    related_bits = bits(index for name in related if (index := variables.index(ir.IRVar(name))) is not None)
+    interferes: dict[str, set[str]] = {name: set() for name in related}
+    live = liveness(graph, variables)
+    for index, block in enumerate(graph.blocks):
+        if not any((dest := definition(insn)) is not None and dest.name in related for insn in block.instructions):
+            continue
+        for insn, after in zip(block.instructions, live.live_after(graph, index)):
+            if (dest := definition(insn)) is None or dest.name not in related:
+                continue
+            if isinstance(insn, ir.Copy):
+                after = (after | variables.bit(insn.source)) ^ variables.bit(insn.source)
+            for var in variables.decode(after & related_bits):
+                if var.name != dest.name:
+                    interferes[dest.name].add(var.name)
+                    interferes[var.name].add(dest.name)
+    params = [param.name for param in graph.start.params] if graph.start is not None else []
+    # Parameters are all written on entry
+    entry_live = [var.name for var in variables.decode(live.live_in[0] & related_bits)]
+    for param in params:
+        if param in related:
+            for other in params + entry_live:
+                if other != param and other in related:
+                    interferes[param].add(other)
+                    interferes[other].add(param)
+
+    # Union-find, with the members and interference of each class at its root
+    root = {name: name for name in related}
+    members = {name: [name] for name in related}
+    has_param = {name: name in params for name in related}
+
+    def find(name: str) -> str:
+        while root[name] != name:
+            root[name] = root[root[name]]
+            name = root[name]
+        return name
+
+    for copy_source, copy_dest in copies:
+        a, b = find(copy_source), find(copy_dest)
+        if a == b or (has_param[a] and has_param[b]) or not interferes[b].isdisjoint(members[a]):
+            continue
+        # The smaller class joins the larger, unless it has the parameter
+        if has_param[b] or (len(members[a]) < len(members[b]) and not has_param[a]):
+            a, b = b, a
+        root[b] = a
+        members[a].extend(members.pop(b))
+        interferes[a] |= interferes.pop(b)
+        has_param[a] = has_param[a] or has_param[b]
+
+    renamed = {name: ir.IRVar(find(name)) for name in related if find(name) != name}
+    if not renamed:
+        return 0
+    removed = 0
+    for block in graph.blocks:
+        instructions: list[ir.Instruction] = []
+        for insn in block.instructions:
+            insn = _map_variables(insn, lambda var: renamed.get(var.name, var))
+            if isinstance(insn, ir.Copy) and insn.source == insn.dest:
+                removed += 1
+            else:
+                instructions.append(insn)
+        block.instructions = instructions
+    return removed
+
+
+def remove_unreachable_blocks(graph: ControlFlowGraph) -> int:
+    """Removes the blocks that can't be reached from the entry, like code
+    after a 'Return' or a 'Jump', or a branch that is never taken.
+    Returns the number of instructions removed."""
+    is_reachable = reachable(graph)
+    new_index: list[int] = []
+    blocks: list[BasicBlock] = []
+    removed = 0
+    for index, block in enumerate(graph.blocks):
+        new_index.append(len(blocks))
+        if is_reachable[index]:
+            blocks.append(block)
+        else:
+            removed += len(block.instructions)
+    if len(blocks) == len(graph.blocks):
+        return 0
+    # A block that falls through to the next one makes it reachable, so
+    # removing blocks never changes where a remaining one falls through
+    for block in blocks:
+        block.successors = [new_index[successor] for successor in block.successors]
+        block.predecessors = [new_index[predecessor] for predecessor in block.predecessors if is_reachable[predecessor]]
+    graph.blocks = blocks
+    return removed
+
+
+# Intrinsics that can be left out when their result isn't used. Division
+# and remainder can trap, which has to happen anyway.
+pure_intrinsics = set(foldable_intrinsics) - {'/', '%'}
+
+
+def has_side_effects(insn: ir.Instruction, variables: Variables) -> bool:
+    """Whether running 'insn' does more than write to its destination.
+    Calls do, except those of pure intrinsics: built-ins and user
+    functions may print or read input, and a call through a variable
+    may call either."""
+    match insn:
+        case ir.LoadIntConst() | ir.LoadBoolConst() | ir.Copy():
+            return False
+        case ir.Call():
+            return insn.fun.name not in pure_intrinsics or variables.index(insn.fun) is not None
+        case _:
+            return True
+
+
+def eliminate_dead_code(graph: ControlFlowGraph) -> int:
+    """Removes instructions whose only effect is to write a variable
+    that isn't read afterwards. Removing one can make the instructions
+    that computed its operands dead in turn, so this repeats until
+    nothing changes. Returns the number of instructions removed."""
+    removed = 0
+    while True:
+        live = liveness(graph)
+        variables = live.variables
+        removed_now = 0
+        for index, block in enumerate(graph.blocks):
+            alive = live.live_out[index]
+            kept: list[ir.Instruction] = []
+            for insn in reversed(block.instructions):
+                dest = definition(insn)
+                if dest is not None:
+                    bit = variables.bit(dest)
+                    if not alive & bit and not has_side_effects(insn, variables):
+                        removed_now += 1
+                        continue
+                    alive = (alive | bit) ^ bit
+                for var in uses(insn):
+                    alive |= variables.bit(var)
+                kept.append(insn)
+            if len(kept) != len(block.instructions):
+                kept.reverse()
+                block.instructions = kept
+        if removed_now == 0:
+            return removed
+        removed += removed_now
+
+
+def remove_unused_labels(graph: ControlFlowGraph) -> int:
+    """Removes jumps to the label right after them, and then the labels
+    that nothing jumps to. Returns the number of instructions removed."""
+    removed = 0
+    for block, next_block in zip(graph.blocks, graph.blocks[1:]):
+        jump = block.terminator
+        if isinstance(jump, ir.Jump) and next_block.label is not None and next_block.label.name == jump.label.name:
+            # Falling through goes to the same block
+            block.instructions.pop()
+            removed += 1
+    targets: set[str] = set()
+    for block in graph.blocks:
+        match block.terminator:
+            case ir.Jump() as jump:
+                targets.add(jump.label.name)
+            case ir.CondJump() as cond_jump:
+                targets.add(cond_jump.then_label.name)
+                targets.add(cond_jump.else_label.name)
+    for block in graph.blocks:
+        if (label := block.label) is not None and label.name not in targets:
+            block.instructions.pop(0)
+            removed += 1
+    return removed
+
+
+def optimize(instructions: list[ir.Instruction]) -> list[ir.Instruction]:
+    """Runs the optimization passes on every function of a program."""
+    graphs = build_cfgs(instructions)
+    for graph in graphs:
+        propagate_constants(graph)
+    # Branches that became jumps leave edges that can't be taken
+    graphs = build_cfgs(linearize(graphs))
+    for graph in graphs:
+        remove_unreachable_blocks(graph)
+        propagate_copies(graph)
+        coalesce_copies(graph)
+        eliminate_dead_code(graph)
+        remove_unused_labels(graph)
+    return linearize(graphs)
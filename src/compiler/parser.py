@@ -1,41 +1,61 @@
-from compiler.tokenizer import Token, TokenLocation
+from itertools import chain
+from typing import Callable, Iterable
+from compiler.tokenizer import Token, TokenLocation, TokenStream
+from compiler.trampoline import Step, run
 import compiler.ast as ast
 from compiler.types import *
 
-def parse(tokens: list[Token]) -> ast.Expression:
+# Binding power of each left-associative binary operator.
+# Higher binds tighter. Assignment is handled separately in
+# 'parse_expression' because it is right-associative.
+binary_precedence: dict[str, int] = {
+    'or': 1,
+    'and': 2,
+    '==': 3, '!=': 3,
+    '<': 4, '<=': 4, '>': 4, '>=': 4,
+    '+': 5, '-': 5,
+    '*': 6, '/': 6, '%': 6,
+}
 
-    # This keeps track of which token we're looking at.
-    pos = 0
+def parse(tokens: Iterable[Token]) -> ast.Expression:
 
-    # 'peek()' returns the token at 'pos',
+    # The tokens are pulled lazily from 'tokens', so a generator
+    # such as 'iter_tokens()' lets parsing start before lexing finishes.
+    # The whole program is parsed as if it were wrapped in a block.
+    token_iter = iter(tokens)
+    first = next(token_iter, None)
+    if first is None:
+        return ast.EmptyInput(location=TokenLocation(0, 0))
+    stream = TokenStream(chain(
+        [Token(text='{', type='punctuation', loc=first.loc), first],
+        token_iter,
+        [Token(text='}', type='punctuation', loc=first.loc)],
+    ))
+
+    # 'peek()' returns the current token,
     # or a special 'end' token if we're past the end
-    # of the token list.
+    # of the token stream.
     # This way we don't have to worry about going past
     # the end elsewhere.
     def peek() -> Token:
-        if pos < len(tokens) and len(tokens) > 0:
-            return tokens[pos]
-        else:
-            return Token(text="", type="end", loc=tokens[-1].loc if tokens else TokenLocation(pos, pos))
+        return stream.current
         
 
-    # 'consume()' returns the token at 'pos'
-    # and increments 'pos' by one.
+    # 'consume()' returns the current token
+    # and moves the stream past it.
     #
     # If the optional parameter 'expected' is given,
     # it checks that the token being consumed has that text.
     # If 'expected' is a list, then the token must have
     # one of the texts in the list.
     def consume(expected: str | list[str] | None = None) -> Token:
-        nonlocal pos
         token = peek()
         if isinstance(expected, str) and token.text != expected:
             raise Exception(f'{token.loc}: expected {expected} but got {token.text}')
         if isinstance(expected, list) and token.text not in expected:
             comma_separated = ", ".join([f'"{e}"' for e in expected])
             raise Exception(f'{token.loc}: expected one of: {comma_separated}')
-        pos += 1
-        return token
+        return stream.consume()
     
     
     # This is the parsing function for integer literals.
@@ -54,140 +74,103 @@ def parse(tokens: list[Token]) -> ast.Expression:
         token = consume()
         return ast.Identifier(name=token.text, location=token.loc)
     
-    def parse_unary() -> ast.UnaryOperator:
+    # The functions below that parse nested expressions are written as
+    # steps for 'trampoline.run': instead of calling each other, they
+    # 'yield' the sub-parse they need and get its result sent back.
+    # This way arbitrarily deep nesting never hits the recursion limit.
+    # Leaf parsers like 'parse_int_literal' stay ordinary functions,
+    # and yielding their result directly is fine too.
+
+    def parse_unary() -> Step[ast.Expression]:
         our_op = consume(['not', '-']).text
         if peek().text == '(':
-            our_right = parse_parenthesized()
+            our_right = yield parse_parenthesized()
         else:
-            our_right = parse_factor(allow_var=False)
+            our_right = yield parse_factor(allow_var=False)
         our_unary = ast.UnaryOperator(op=our_op, right=our_right, location=our_right.location)
         return our_unary
             
-    def parse_expression(allow_var: bool = True) -> ast.Expression:
-        left = parse_expression_left(allow_var)
+    def parse_expression(allow_var: bool = True) -> Step[ast.Expression]:
+        left = yield parse_factor(allow_var)
+        if peek().text in binary_precedence:
+            left = yield parse_binary_operators(left, 1)
         if peek().text == '=':
             operator_token = consume('=')
             operator = operator_token.text
-            right = parse_expression(allow_var)
+            right = yield parse_expression(allow_var)
             return ast.BinaryOp(left=left, op=operator, right=right, location=left.location)
         return left
     
-    #def parse_expression_left(allow_var: bool) -> ast.Expression:
-    #    left_associative_binary_operators = [
-    #        ['or'],
-    #        ['and'],
-    #        ['==', '!='],
-    #        ['<', '<=', '>', '>='],
-    #        ['+', '-'],
-    #        ['*', '/', '%'],
-    #    ]
-    #    left = parse_factor(allow_var)
-    #    for i, operators in enumerate(left_associative_binary_operators):
-    #        while peek().text in operators:
-    #            operator_token = consume()
-    #            operator = operator_token.text
-    #            right = parse_factor(allow_var=False)
-    #            left = ast.BinaryOp(left=left, op=operator, right=right, location=left.location)
-    #    return left
-    def parse_expression_left(allow_var: bool) -> ast.Expression:
-        left_associative_binary_operators = [
-            ['or'],
-            ['and'],
-            ['==', '!='],
-            ['<', '<=', '>', '>='],
-            ['+', '-'],
-            ['*', '/', '%'],
-        ]
-        
-        first_factor = True
-        
-        def parse_level(level: int) -> ast.Expression:
-            nonlocal first_factor
-            if level >= len(left_associative_binary_operators):
-                use_allow_var = allow_var and first_factor
-                first_factor = False
-                return parse_factor(use_allow_var)
-            
-            left = parse_level(level + 1)
-            while peek().text in left_associative_binary_operators[level]:
-                operator_token = consume()
-                operator = operator_token.text
-                right = parse_level(level + 1)
-                left = ast.BinaryOp(left=left, op=operator, right=right, location=left.location)
-            return left
-        
-        return parse_level(0)
+    # Precedence climbing: every binary operator has a binding power
+    # and all of them are left-associative. An operand costs one
+    # 'parse_factor' call no matter how many precedence levels there are.
+    def parse_binary_operators(left: ast.Expression, min_precedence: int) -> Step[ast.Expression]:
+        while (precedence := binary_precedence.get(peek().text, 0)) >= min_precedence:
+            operator = consume().text
+            right = yield parse_factor(allow_var=False)
+            # Let tighter-binding operators to the right take 'right' first.
+            while binary_precedence.get(peek().text, 0) > precedence:
+                right = yield parse_binary_operators(right, precedence + 1)
+            left = ast.BinaryOp(left=left, op=operator, right=right, location=left.location)
+        return left
 
-    def parse_factor(allow_var: bool = False) -> ast.Expression:
-        operators = ['or', 'and', '==', '!=', '<', '<=', '>', '>=', '+', '*', '/', '%']
-        assert peek().text not in operators, f'Unexpected operator {peek().text} at {peek().loc}'
+    def parse_factor(allow_var: bool = False) -> Step[ast.Expression] | ast.Expression:
+        token = peek()
+        parse_keyword = keyword_parsers.get(token.text)
+        if parse_keyword is not None:
+            return parse_keyword(allow_var)
+        # 'and' and 'or' are identifier tokens, but not operands
+        if token.text in binary_precedence:
+            raise Exception(f'{token.loc}: unexpected operator {token.text}')
+        parse_kind = kind_parsers.get(token.type)
+        if parse_kind is not None:
+            return parse_kind()
+        raise Exception(f'{token.loc}: expected "(", an integer literal or an identifier but got {token.type} with {token.text}')
 
+    def parse_identifier_or_call() -> Step[ast.Expression]:
+        identifier = parse_identifier()
         if peek().text == '(':
-            return parse_parenthesized()
-        if peek().text == '{':
-            return parse_block()
-        elif peek().text == 'if':
-            return parse_if_statement()
-        elif peek().type == 'int_literal':
-            return parse_int_literal()
-        elif peek().text in ['not', '-']:
-            return parse_unary()
-        elif peek().text == 'while':
-            return parse_while_statement()
-        elif peek().text == 'break':
-            token = consume('break')
-            return ast.Break(location=token.loc)
-        elif peek().text == 'continue':
-            token = consume('continue')
-            return ast.Continue(location=token.loc)
-        elif peek().text == 'return':
-            token = consume('return')
-            value = parse_expression(allow_var=False)
-            return ast.Return(value=value, location=token.loc)
-        elif peek().text == 'fun':
-            return parse_function_definition()
-        elif peek().type == 'identifier' and peek().text not in ['true', 'false'] and peek().text != 'var':
-            identifier = parse_identifier()
+            # we are in a function call
+            consume('(')
+            args = []
+            while peek().text != ')':
+                if peek().text != ',':
+                    args.append((yield parse_expression(allow_var=False)))
+                else:
+                    consume(',')
+            consume(')')
+            return ast.FunctionCall(function_name=identifier, arguments=args, location=identifier.location)
+        return identifier
 
-            if peek().text == '(':
-                # we are in a function call
-                consume('(')
-                args = []
-                while peek().text != ')':
-                    if peek().text != ',':
-                        args.append(parse_expression(allow_var=False))
-                    else:
-                        consume(',')
-                consume(')')
-                our_func = ast.FunctionCall(function_name=identifier, arguments=args, location=identifier.location)
-                return our_func
-            else:
-                return identifier
+    def parse_break(allow_var: bool) -> ast.Expression:
+        return ast.Break(location=consume('break').loc)
 
-        elif peek().text == 'var':
-            if not allow_var:
-                raise Exception(f'{peek().loc}: variable declarations are only allowed at top-level or directly inside blocks')
-            return parse_var()
-        elif peek().text == 'true':
-            token = consume('true')
-            return ast.Literal(value=True, location=token.loc, type=Bool())
-        elif peek().text == 'false':
-            token = consume('false')
-            return ast.Literal(value=False, location=token.loc, type=Bool())
-        elif peek().type == 'end':
-            return ast.EmptyInput(location=peek().loc)
-        else:
-            raise Exception(f'{peek().loc}: expected "(", an integer literal or an identifier but got {peek().type} with {peek().text}')
-    
-    def parse_parenthesized() -> ast.Expression:
+    def parse_continue(allow_var: bool) -> ast.Expression:
+        return ast.Continue(location=consume('continue').loc)
+
+    def parse_return(allow_var: bool) -> Step[ast.Expression]:
+        token = consume('return')
+        value = yield parse_expression(allow_var=False)
+        return ast.Return(value=value, location=token.loc)
+
+    def parse_var_if_allowed(allow_var: bool) -> Step[ast.Expression]:
+        if not allow_var:
+            raise Exception(f'{peek().loc}: variable declarations are only allowed at top-level or directly inside blocks')
+        return parse_var()
+
+    def parse_bool_literal(allow_var: bool) -> ast.Expression:
+        token = consume(['true', 'false'])
+        return ast.Literal(value=token.text == 'true', location=token.loc, type=Bool())
+
+    def parse_parenthesized() -> Step[ast.Expression]:
         consume('(')
         # Recursively call the top level parsing function
         # to parse whatever is inside the parentheses.
-        expr = parse_expression(allow_var=False)
+        expr = yield parse_expression(allow_var=False)
         consume(')')
         return expr
     
-    def parse_block() -> ast.Expression:
+    def parse_block() -> Step[ast.Expression]:
         consume('{')
         exprs: list[ast.Expression] = []
         has_semicolon = False
@@ -200,32 +183,45 @@ def parse(tokens: list[Token]) -> ast.Expression:
             else:
                 if exprs and not has_semicolon and not prev_was_brace:
                     raise Exception(f'{peek().loc}: expected ";" between expressions in block') 
-                result_expression = parse_expression(allow_var=True)
+                result_expression = yield parse_expression(allow_var=True)
                 exprs.append(result_expression)
                 has_semicolon = False
-                prev_was_brace = (tokens[pos - 1].text == '}')
+                prev_was_brace = stream.previous is not None and stream.previous.text == '}'
         consume('}')
         our_block = ast.Block(expressions=exprs, has_semicolon=has_semicolon, result_expression=result_expression if not has_semicolon else ast.Literal(value=None, location=peek().loc), location=peek().loc)
         return our_block
 
-    def parse_while_statement() -> ast.Expression:
+    def parse_while_statement() -> Step[ast.Expression]:
+        consume('while')
+        condition_expr = yield parse_expression(allow_var=False)
+        consume('do')
+        body_expr = yield parse_expression(allow_var=False)
         our_while = ast.WhileStatement(
-            the_while = ast.Identifier(name=consume('while').text, location=peek().loc),
-            condition_expr = parse_expression(allow_var=False),
-            the_do = ast.Identifier(name=consume('do').text, location=peek().loc),
-            body_expr = parse_expression(allow_var=False), location=peek().loc
+            the_while = ast.KEYWORD_WHILE,
+            condition_expr = condition_expr,
+            the_do = ast.KEYWORD_DO,
+            body_expr = body_expr, location=peek().loc
         )
         return our_while
     
-    def parse_if_statement() -> ast.IfStatement:
-        has_else: bool = False
+    def parse_if_statement() -> Step[ast.Expression]:
+        consume('if')
+        first_expr = yield parse_expression(allow_var=False)
+        consume('then')
+        second_expr = yield parse_expression(allow_var=False)
+        the_else = None
+        third_expr = None
+        if peek().text == 'else':
+            consume('else')
+            the_else = ast.KEYWORD_ELSE
+            third_expr = yield parse_expression(allow_var=False)
         our_if = ast.IfStatement(
-            the_if = ast.Identifier(name=consume('if').text, location=peek().loc),
-            first_expr = parse_expression(allow_var=False),
-            the_then = ast.Identifier(name=consume('then').text, location=peek().loc),
-            second_expr = parse_expression(allow_var=False),
-            the_else = ast.Identifier(name=consume('else').text, location=peek().loc) if (has_else := peek().text == 'else') else None,
-            third_expr = parse_expression(allow_var=False) if has_else else None,
+            the_if = ast.KEYWORD_IF,
+            first_expr = first_expr,
+            the_then = ast.KEYWORD_THEN,
+            second_expr = second_expr,
+            the_else = the_else,
+            third_expr = third_expr,
             location=peek().loc
         )
         return our_if
@@ -239,7 +235,7 @@ def parse(tokens: list[Token]) -> ast.Expression:
                 param_types.append(parse_type())
             consume(')')
 
-            if peek().text == '=' and tokens[pos+1].text == '>':
+            if peek().text == '=' and stream.peek(1).text == '>':
                 consume('=')
                 consume('>')
 
@@ -260,7 +256,7 @@ def parse(tokens: list[Token]) -> ast.Expression:
         else:
             raise Exception(f'{peek().loc}: expected a type but got {peek().text}')
 
-    def parse_var() -> ast.VariableDeclaration:
+    def parse_var() -> Step[ast.Expression]:
         consume('var')
         ID = parse_identifier()
         var_type = None
@@ -270,9 +266,10 @@ def parse(tokens: list[Token]) -> ast.Expression:
 
         
         consume('=')
-        return ast.VariableDeclaration(ID=ID, expression=parse_expression(allow_var=False), var_type=var_type, location=ID.location)
+        expression = yield parse_expression(allow_var=False)
+        return ast.VariableDeclaration(ID=ID, expression=expression, var_type=var_type, location=ID.location)
 
-    def parse_function_definition() -> ast.FunctionDefinition:
+    def parse_function_definition() -> Step[ast.Expression]:
         token = consume('fun')
         name = parse_identifier()
         consume('(')
@@ -290,7 +287,7 @@ def parse(tokens: list[Token]) -> ast.Expression:
         consume(':')
         return_type = parse_type()
         
-        body = parse_block()
+        body = yield parse_block()
         
         return ast.FunctionDefinition(
             name=name,
@@ -300,11 +297,30 @@ def parse(tokens: list[Token]) -> ast.Expression:
             location=token.loc
         )
 
-    loc = tokens[0].loc if tokens else TokenLocation(-1, -1)
-    tokens.insert(0, Token(text='{', type='punctuation', loc=loc))
-    tokens.append(Token(text='}', type='punctuation', loc=loc))
+    # Factors are dispatched on the token text for keywords and
+    # punctuation, and otherwise on the token type.
+    keyword_parsers: dict[str, Callable[[bool], Step[ast.Expression] | ast.Expression]] = {
+        '(': lambda allow_var: parse_parenthesized(),
+        '{': lambda allow_var: parse_block(),
+        'if': lambda allow_var: parse_if_statement(),
+        'while': lambda allow_var: parse_while_statement(),
+        'fun': lambda allow_var: parse_function_definition(),
+        'not': lambda allow_var: parse_unary(),
+        '-': lambda allow_var: parse_unary(),
+        'break': parse_break,
+        'continue': parse_continue,
+        'return': parse_return,
+        'var': parse_var_if_allowed,
+        'true': parse_bool_literal,
+        'false': parse_bool_literal,
+    }
+    kind_parsers: dict[str, Callable[[], Step[ast.Expression] | ast.Expression]] = {
+        'int_literal': parse_int_literal,
+        'identifier': parse_identifier_or_call,
+        'end': lambda: ast.EmptyInput(location=peek().loc),
+    }
 
-    result = parse_block()
+    result = run(parse_block())
 
     if isinstance(result, ast.Block):
         if len(result.expressions) == 0:
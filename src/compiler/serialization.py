@@ -0,0 +1,514 @@
+"""Binary formats for the typed AST and the IR, and a parser for IR text.
+
+They let a compile save the output of a phase and restart from it later.
+Both binary formats start with a 4-byte magic and a format version,
+followed by sections that are either integer arrays or string tables.
+Integers are little-endian.
+"""
+import gc
+import re
+import struct
+import sys
+from array import array
+from contextlib import contextmanager
+from typing import Iterator
+
+import compiler.ast as ast
+from compiler.ir import CompactIR, Instruction, IRVar, from_compact, to_compact
+from compiler import ir
+from compiler.tokenizer import L, TokenLocation
+from compiler.types import Bool, FunType, Int, Type, Unit
+
+FORMAT_VERSION = 1
+
+_AST_MAGIC = b'CAST'
+_IR_MAGIC = b'CIR\0'
+
+
+class _Writer:
+    def __init__(self, magic: bytes) -> None:
+        self.parts: list[bytes] = [magic, struct.pack('<I', FORMAT_VERSION)]
+
+    def array(self, values: 'array[int]') -> None:
+        if sys.byteorder == 'big':
+            values = array(values.typecode, values)
+            values.byteswap()
+        self.parts.append(struct.pack('<cQ', values.typecode.encode(), len(values)))
+        self.parts.append(values.tobytes())
+
+    def strings(self, strings: list[str]) -> None:
+        data = '\0'.join(strings).encode()
+        self.parts.append(struct.pack('<QQ', len(strings), len(data)))
+        self.parts.append(data)
+
+    def getvalue(self) -> bytes:
+        return b''.join(self.parts)
+
+
+class _Reader:
+    def __init__(self, data: bytes, magic: bytes, what: str) -> None:
+        self.data = memoryview(data)
+        if bytes(self.data[:4]) != magic:
+            raise Exception(f'not a serialized {what}')
+        version, = struct.unpack_from('<I', self.data, 4)
+        if version != FORMAT_VERSION:
+            raise Exception(f'unsupported {what} format version {version}, expected {FORMAT_VERSION}')
+        self.offset = 8
+
+    def array(self, typecode: str) -> 'array[int]':
+        code, count = struct.unpack_from('<cQ', self.data, self.offset)
+        if code.decode() != typecode:
+            raise Exception(f'expected an array of {typecode!r} but got {code.decode()!r}')
+        self.offset += struct.calcsize('<cQ')
+        values = array(typecode)
+        end = self.offset + count * values.itemsize
+        values.frombytes(self.data[self.offset:end])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        self.offset = end
+        return values
+
+    def strings(self) -> list[str]:
+        count, size = struct.unpack_from('<QQ', self.data, self.offset)
+        self.offset += 16
+        text = bytes(self.data[self.offset:self.offset + size]).decode()
+        self.offset += size
+        return text.split('\0') if count > 0 else []
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    """Loading creates many objects that all stay referenced. Letting
+    the cyclic collector run meanwhile would only rescan them again and
+    again, which can take longer than the loading itself."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+# === IR ===
+
+def dump_compact_ir(code: CompactIR) -> bytes:
+    writer = _Writer(_IR_MAGIC)
+    for column in (code.opcodes, code.a, code.b, code.c, code.lists, code.rows, code.columns):
+        writer.array(column)
+    writer.strings(code.variables)
+    writer.strings(code.names)
+    return writer.getvalue()
+
+
+def load_compact_ir(data: bytes) -> CompactIR:
+    reader = _Reader(data, _IR_MAGIC, 'IR')
+    code = CompactIR()
+    code.opcodes = reader.array('B')
+    code.a = reader.array('q')
+    code.b = reader.array('q')
+    code.c = reader.array('q')
+    code.lists = reader.array('q')
+    code.rows = reader.array('i')
+    code.columns = reader.array('i')
+    code.variables = reader.strings()
+    code.names = reader.strings()
+    code.drop_indexes()
+    return code
+
+
+def dump_ir(instructions: list[Instruction]) -> bytes:
+    """Serializes an instruction list. Its columns are those of 'CompactIR'."""
+    return dump_compact_ir(to_compact(instructions))
+
+
+def load_ir(data: bytes) -> list[Instruction]:
+    with _gc_paused():
+        return from_compact(load_compact_ir(data))
+
+
+# === Typed AST ===
+#
+# Nodes are written in postorder: every node comes right after its
+# children, so loading is a single loop over a stack of finished nodes.
+# A node is a run of integers in one array: its kind, row, column and
+# type, then the fields listed for its kind below. Names and operators
+# are indexes into a string table, and types are indexes into a type
+# table whose function types refer to earlier entries.
+
+_node_kinds: list[type[ast.Expression]] = [
+    ast.Expression, ast.Literal, ast.Identifier, ast.BinaryOp, ast.IfStatement,
+    ast.FunctionCall, ast.UnaryOperator, ast.Block, ast.VariableDeclaration,
+    ast.WhileStatement, ast.EmptyInput, ast.Break, ast.Continue,
+    ast.FunctionDefinition, ast.Return,
+]
+_kind_codes = {kind: code for code, kind in enumerate(_node_kinds)}
+
+# Literal values: the tag is followed by the value,
+# or by a string index for integers that don't fit in 64 bits
+_LITERAL_NONE, _LITERAL_BOOL, _LITERAL_INT, _LITERAL_BIG_INT = range(4)
+
+# Type table entries
+_TYPE_INT, _TYPE_BOOL, _TYPE_UNIT, _TYPE_FUN = range(4)
+
+_keywords = {node.name: node for node in (ast.KEYWORD_IF, ast.KEYWORD_THEN, ast.KEYWORD_ELSE, ast.KEYWORD_WHILE, ast.KEYWORD_DO)}
+
+
+def _children(node: ast.Expression) -> list[ast.Expression]:
+    match node:
+        case ast.BinaryOp():
+            return [node.left, node.right]
+        case ast.IfStatement():
+            children = [node.the_if, node.first_expr, node.the_then, node.second_expr]
+            if node.the_else is not None:
+                children.append(node.the_else)
+            if node.third_expr is not None:
+                children.append(node.third_expr)
+            return children
+        case ast.FunctionCall():
+            return [node.function_name, *node.arguments]
+        case ast.UnaryOperator():
+            return [node.right]
+        case ast.Block():
+            if node.expressions and node.result_expression is node.expressions[-1]:
+                return list(node.expressions)
+            return [*node.expressions, node.result_expression]
+        case ast.VariableDeclaration():
+            return [node.ID, node.expression]
+        case ast.WhileStatement():
+            return [node.the_while, node.condition_expr, node.the_do, node.body_expr]
+        case ast.FunctionDefinition():
+            return [node.name, *(param for param, _ in node.params), node.body]
+        case ast.Return():
+            return [node.value]
+        case _:
+            return []
+
+
+def _postorder(root: ast.Expression) -> Iterator[ast.Expression]:
+    stack: list[tuple[ast.Expression, bool]] = [(root, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if children_done:
+            yield node
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(_children(node)))
+
+
+def dump_ast(root: ast.Expression) -> bytes:
+    """Serializes a (typed) AST."""
+    words = array('q')
+    strings: list[str] = []
+    string_ids: dict[str, int] = {}
+    types = array('q')
+    type_ids: dict[Type, int] = {}
+
+    def string(s: str) -> int:
+        if s not in string_ids:
+            string_ids[s] = len(strings)
+            strings.append(s)
+        return string_ids[s]
+
+    def type_id(t: Type | None) -> int:
+        if t is None:
+            return -1
+        if t not in type_ids:
+            match t:
+                case FunType():
+                    params = [type_id(param) for param in t.params]
+                    return_type = type_id(t.return_type)
+                    types.extend([_TYPE_FUN, len(params), *params, return_type])
+                case Int():
+                    types.append(_TYPE_INT)
+                case Bool():
+                    types.append(_TYPE_BOOL)
+                case Unit():
+                    types.append(_TYPE_UNIT)
+                case _:
+                    raise Exception(f'cannot serialize type {t}')
+            type_ids[t] = len(type_ids)
+        return type_ids[t]
+
+    for node in _postorder(root):
+        kind = _kind_codes.get(type(node))
+        if kind is None:
+            raise Exception(f'{node.location}: cannot serialize {type(node).__name__}')
+        words.extend((kind, node.location.row, node.location.col, type_id(node.type)))
+        match node:
+            case ast.Literal():
+                if node.value is None:
+                    words.extend((_LITERAL_NONE, 0))
+                elif isinstance(node.value, bool):
+                    words.extend((_LITERAL_BOOL, int(node.value)))
+                elif -2**63 <= node.value < 2**63:
+                    words.extend((_LITERAL_INT, node.value))
+                else:
+                    words.extend((_LITERAL_BIG_INT, string(str(node.value))))
+            case ast.Identifier():
+                words.append(string(node.name))
+            case ast.BinaryOp() | ast.UnaryOperator():
+                words.append(string(node.op))
+            case ast.IfStatement():
+                words.append((node.the_else is not None) | (node.third_expr is not None) << 1)
+            case ast.FunctionCall():
+                words.append(len(node.arguments))
+            case ast.Block():
+                result_is_last = bool(node.expressions) and node.result_expression is node.expressions[-1]
+                words.extend((len(node.expressions), node.has_semicolon, result_is_last))
+            case ast.VariableDeclaration():
+                words.append(type_id(node.var_type))
+            case ast.FunctionDefinition():
+                words.append(len(node.params))
+                words.extend(type_id(param_type) for _, param_type in node.params)
+                words.append(type_id(node.return_type))
+
+    writer = _Writer(_AST_MAGIC)
+    writer.strings(strings)
+    writer.array(types)
+    writer.array(words)
+    return writer.getvalue()
+
+
+def load_ast(data: bytes) -> ast.Expression:
+    with _gc_paused():
+        return _load_ast(data)
+
+
+def _load_ast(data: bytes) -> ast.Expression:
+    reader = _Reader(data, _AST_MAGIC, 'AST')
+    strings = reader.strings()
+    type_words = reader.array('q')
+    # Indexing a list is faster than an array
+    words = reader.array('q').tolist()
+
+    types: list[Type] = []
+    i = 0
+    while i < len(type_words):
+        code = type_words[i]
+        if code == _TYPE_INT:
+            types.append(Int())
+        elif code == _TYPE_BOOL:
+            types.append(Bool())
+        elif code == _TYPE_UNIT:
+            types.append(Unit())
+        elif code == _TYPE_FUN:
+            count = type_words[i + 1]
+            fun_params = [types[t] for t in type_words[i + 2:i + 2 + count]]
+            i += 1 + count
+            types.append(FunType(fun_params, types[type_words[i + 1]]))
+        else:
+            raise Exception(f'unknown type code {code}')
+        i += 1
+
+    def optional_type(t: int) -> Type | None:
+        return None if t < 0 else types[t]
+
+    def keyword(node: ast.Expression) -> ast.Identifier:
+        # The parser shares keyword nodes, and so does loading
+        assert isinstance(node, ast.Identifier)
+        shared = _keywords.get(node.name)
+        if shared is not None and node.location.row == -1 and node.location.col == -1:
+            return shared
+        return node
+
+    stack: list[ast.Expression] = []
+
+    def pop(count: int) -> list[ast.Expression]:
+        if count == 0:
+            return []
+        children = stack[-count:]
+        del stack[-count:]
+        return children
+
+    i = 0
+    n = len(words)
+    while i < n:
+        kind = _node_kinds[words[i]]
+        loc = TokenLocation(words[i + 1], words[i + 2])
+        node_type = types[words[i + 3]]
+        i += 4
+        node: ast.Expression
+        if kind is ast.Literal:
+            tag, value = words[i], words[i + 1]
+            i += 2
+            literal: int | bool | None = None
+            if tag == _LITERAL_BOOL:
+                literal = bool(value)
+            elif tag == _LITERAL_INT:
+                literal = value
+            elif tag == _LITERAL_BIG_INT:
+                literal = int(strings[value])
+            node = ast.Literal(location=loc, type=node_type, value=literal)
+        elif kind is ast.Identifier:
+            node = ast.Identifier(location=loc, type=node_type, name=strings[words[i]])
+            i += 1
+        elif kind is ast.BinaryOp:
+            left, right = pop(2)
+            node = ast.BinaryOp(location=loc, type=node_type, left=left, op=strings[words[i]], right=right)
+            i += 1
+        elif kind is ast.UnaryOperator:
+            right, = pop(1)
+            node = ast.UnaryOperator(location=loc, type=node_type, op=strings[words[i]], right=right)
+            i += 1
+        elif kind is ast.IfStatement:
+            flags = words[i]
+            i += 1
+            third_expr = stack.pop() if flags & 2 else None
+            the_else = keyword(stack.pop()) if flags & 1 else None
+            the_if, first_expr, the_then, second_expr = pop(4)
+            node = ast.IfStatement(
+                location=loc, type=node_type,
+                the_if=keyword(the_if), first_expr=first_expr,
+                the_then=keyword(the_then), second_expr=second_expr,
+                the_else=the_else, third_expr=third_expr,
+            )
+        elif kind is ast.FunctionCall:
+            arguments = pop(words[i])
+            i += 1
+            function_name = stack.pop()
+            assert isinstance(function_name, ast.Identifier)
+            node = ast.FunctionCall(location=loc, type=node_type, function_name=function_name, arguments=arguments)
+        elif kind is ast.Block:
+            count, has_semicolon, result_is_last = words[i], words[i + 1], words[i + 2]
+            i += 3
+            result_expression = None if result_is_last else stack.pop()
+            expressions = pop(count)
+            if result_expression is None:
+                result_expression = expressions[-1]
+            node = ast.Block(location=loc, type=node_type, expressions=expressions, has_semicolon=bool(has_semicolon), result_expression=result_expression)
+        elif kind is ast.VariableDeclaration:
+            ID, expression = pop(2)
+            assert isinstance(ID, ast.Identifier)
+            node = ast.VariableDeclaration(location=loc, type=node_type, ID=ID, expression=expression, var_type=optional_type(words[i]))
+            i += 1
+        elif kind is ast.WhileStatement:
+            the_while, condition_expr, the_do, body_expr = pop(4)
+            node = ast.WhileStatement(
+                location=loc, type=node_type,
+                the_while=keyword(the_while), condition_expr=condition_expr,
+                the_do=keyword(the_do), body_expr=body_expr,
+            )
+        elif kind is ast.FunctionDefinition:
+            count = words[i]
+            param_types = [types[t] for t in words[i + 1:i + 1 + count]]
+            return_type = types[words[i + 1 + count]]
+            i += 2 + count
+            body = stack.pop()
+            param_names = pop(count)
+            name = stack.pop()
+            assert isinstance(name, ast.Identifier)
+            params: list[tuple[ast.Identifier, Type]] = []
+            for param_name, param_type in zip(param_names, param_types):
+                assert isinstance(param_name, ast.Identifier)
+                params.append((param_name, param_type))
+            node = ast.FunctionDefinition(location=loc, type=node_type, name=name, params=params, return_type=return_type, body=body)
+        elif kind is ast.Return:
+            return_value, = pop(1)
+            node = ast.Return(location=loc, type=node_type, value=return_value)
+        else:
+            # Expression, EmptyInput, Break and Continue have no other fields
+            node = kind(location=loc, type=node_type)
+        stack.append(node)
+
+    if len(stack) != 1:
+        raise Exception(f'corrupt AST: {len(stack)} root nodes')
+    return stack[0]
+
+
+# === IR text ===
+
+_instruction_regex = re.compile(r'\s*(\w+)\((.*)\)\s*')
+
+
+def _split_arguments(text: str) -> list[str]:
+    """Splits on the commas that are not inside brackets or parentheses."""
+    parts: list[str] = []
+    depth = 0
+    start = 0
+    for i, char in enumerate(text):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(text[start:i].strip())
+            start = i + 1
+    last = text[start:].strip()
+    if last or parts:
+        parts.append(last)
+    return parts
+
+
+def parse_instruction(text: str, location: TokenLocation = L) -> Instruction:
+    """Parses the 'str()' form of an instruction, e.g. 'Call(+, [x1, x2], x3)'.
+
+    Locations are not part of that form, so all of them get 'location'.
+    """
+    m = _instruction_regex.fullmatch(text)
+    if m is None:
+        raise Exception(f'not an IR instruction: {text!r}')
+    name, args = m[1], _split_arguments(m[2])
+
+    def var_list(s: str) -> list[IRVar]:
+        if not (s.startswith('[') and s.endswith(']')):
+            raise Exception(f'expected a list of variables but got {s!r}')
+        return [IRVar(v) for v in _split_arguments(s[1:-1])]
+
+    def label(s: str) -> ir.Label:
+        inner = _instruction_regex.fullmatch(s)
+        if inner is None or inner[1] != 'Label':
+            raise Exception(f'expected a label but got {s!r}')
+        return ir.Label(location, inner[2])
+
+    def bool_value(s: str) -> bool:
+        if s not in ('True', 'False'):
+            raise Exception(f'expected True or False but got {s!r}')
+        return s == 'True'
+
+    match name, args:
+        case 'Label', [label_name]:
+            return ir.Label(location, label_name)
+        case 'LoadBoolConst', [value, dest]:
+            return ir.LoadBoolConst(location, bool_value(value), IRVar(dest))
+        case 'LoadIntConst', [value, dest]:
+            return ir.LoadIntConst(location, int(value), IRVar(dest))
+        case 'Copy', [source, dest]:
+            return ir.Copy(location, IRVar(source), IRVar(dest))
+        case 'Call', [fun, call_args, dest]:
+            return ir.Call(location, IRVar(fun), var_list(call_args), IRVar(dest))
+        case 'Jump', [target]:
+            return ir.Jump(location, label(target))
+        case 'CondJump', [cond, then_label, else_label]:
+            return ir.CondJump(location, IRVar(cond), label(then_label), label(else_label))
+        case 'FunctionStart', [function_name, params]:
+            return ir.FunctionStart(location, function_name, var_list(params))
+        case 'FunctionEnd', [function_name]:
+            return ir.FunctionEnd(location, function_name)
+        case 'Return', [value]:
+            return ir.Return(location, IRVar(value))
+        case _:
+            raise Exception(f'not a valid IR instruction: {text!r}')
+
+
+def parse_instructions(text: str) -> list[Instruction]:
+    """Parses instructions in their 'str()' form, one per line.
+
+    Jumps to the same label share the 'Label' object, as the IR generator
+    output does. Blank lines are skipped.
+    """
+    instructions = [parse_instruction(line) for line in text.splitlines() if line.strip()]
+    labels: dict[str, ir.Label] = {}
+    for insn in instructions:
+        if isinstance(insn, ir.Label):
+            labels.setdefault(insn.name, insn)
+
+    def shared(label: ir.Label) -> ir.Label:
+        return labels.setdefault(label.name, label)
+
+    for i, insn in enumerate(instructions):
+        if isinstance(insn, ir.Jump):
+            instructions[i] = ir.Jump(insn.location, shared(insn.label))
+        elif isinstance(insn, ir.CondJump):
+            instructions[i] = ir.CondJump(insn.location, insn.cond, shared(insn.then_label), shared(insn.else_label))
+    return instructions
@@ -0,0 +1,195 @@
+"""Static single assignment numbering of the values in a control-flow graph.
+
+The instructions are not changed. Instead, every definition, every
+parameter and every phi (a join of values where control-flow paths
+meet) gets a value number, and every operand is mapped to the number
+of the value it reads. Sparse analyses can then follow values from
+definitions to uses directly.
+"""
+from dataclasses import dataclass
+
+from compiler import ir
+from compiler.cfg import ControlFlowGraph
+from compiler.dataflow import Variables, definition, reverse_postorder, uses
+
+# Operand value numbers that are not real values:
+# a variable read where none of its definitions dominates,
+UNDEFINED = -1
+# and a name that is not a variable, like a function or a built-in
+NOT_A_VARIABLE = -2
+
+
+def dominators(graph: ControlFlowGraph) -> list[int]:
+    """The immediate dominator of every block: the last block that every
+    path from the entry goes through before reaching it. The entry is
+    its own, and unreachable blocks have -1."""
+    order = reverse_postorder(graph)
+    position = [0] * len(graph.blocks)
+    for i, block in enumerate(order):
+        position[block] = i
+    idom = [-1] * len(graph.blocks)
+    idom[0] = 0
+
+    def intersect(a: int, b: int) -> int:
+        while a != b:
+            while position[a] > position[b]:
+                a = idom[a]
+            while position[b] > position[a]:
+                b = idom[b]
+        return a
+
+    # Cooper, Harvey and Kennedy: "A Simple, Fast Dominance Algorithm"
+    changed = True
+    while changed:
+        changed = False
+        for block in order[1:]:
+            new_idom = -1
+            for predecessor in graph.blocks[block].predecessors:
+                if idom[predecessor] != -1:
+                    new_idom = predecessor if new_idom == -1 else intersect(predecessor, new_idom)
+            if new_idom != -1 and idom[block] != new_idom:
+                idom[block] = new_idom
+                changed = True
+    return idom
+
+
+def dominance_frontiers(graph: ControlFlowGraph, idom: list[int]) -> list[set[int]]:
+    """For every block, the blocks where its dominance ends: those it
+    doesn't strictly dominate but dominates a predecessor of."""
+    frontiers: list[set[int]] = [set() for _ in graph.blocks]
+    for block, node in enumerate(graph.blocks):
+        predecessors = [p for p in node.predecessors if idom[p] != -1]
+        if idom[block] == -1 or len(predecessors) < 2:
+            continue
+        for predecessor in predecessors:
+            runner = predecessor
+            while runner != idom[block]:
+                frontiers[runner].add(block)
+                runner = idom[runner]
+    return frontiers
+
+
+@dataclass
+class Phi:
+    """The value of 'var' at the start of a block where paths join.
+    'args' are the values flowing in from each predecessor, in the
+    order of the block's 'predecessors'."""
+    var: ir.IRVar
+    value: int
+    args: list[int]
+
+
+class SSAForm:
+    """Value numbers for the variables of 'graph'.
+
+    'operands[block][i]' are the values that the i'th instruction of the
+    block reads, in the order 'dataflow.uses' gives its operands, and
+    'results[block][i]' is the value it defines or UNDEFINED. 'phis'
+    are the phis at the start of each block, and 'params' the values
+    of the function's parameters.
+
+    Only variables with more than one definition get phis. Blocks that
+    can't be reached from the entry have no values.
+    """
+
+    def __init__(self, graph: ControlFlowGraph) -> None:
+        self.graph = graph
+        self.value_count = 0
+        self.operands: list[list[list[int]]] = [[] for _ in graph.blocks]
+        self.results: list[list[int]] = [[] for _ in graph.blocks]
+        self.phis: list[list[Phi]] = [[] for _ in graph.blocks]
+        self.params: list[int] = []
+        self.idom = dominators(graph)
+        self._place_phis()
+        self._rename()
+
+    def _new_value(self) -> int:
+        self.value_count += 1
+        return self.value_count - 1
+
+    def _place_phis(self) -> None:
+        graph = self.graph
+        self.variables = Variables(graph)
+        # Blocks with definitions of each variable, by name
+        definition_blocks: dict[str, set[int]] = {}
+        counts: dict[str, int] = {}
+        if graph.start is not None:
+            for param in graph.start.params:
+                definition_blocks.setdefault(param.name, set()).add(0)
+                counts[param.name] = counts.get(param.name, 0) + 1
+        for block, node in enumerate(graph.blocks):
+            if self.idom[block] == -1:
+                continue
+            for insn in node.instructions:
+                if (dest := definition(insn)) is not None:
+                    definition_blocks.setdefault(dest.name, set()).add(block)
+                    counts[dest.name] = counts.get(dest.name, 0) + 1
+
+        frontiers = dominance_frontiers(graph, self.idom)
+        for var in self.variables.variables:
+            if counts.get(var.name, 0) < 2:
+                continue
+            # Phis go in the iterated dominance frontier of the definitions
+            has_phi: set[int] = set()
+            worklist = list(definition_blocks[var.name])
+            while worklist:
+                for frontier in frontiers[worklist.pop()]:
+                    if frontier not in has_phi:
+                        has_phi.add(frontier)
+                        self.phis[frontier].append(Phi(var, self._new_value(), [UNDEFINED] * len(graph.blocks[frontier].predecessors)))
+                        worklist.append(frontier)
+
+    def _rename(self) -> None:
+        graph = self.graph
+        children: list[list[int]] = [[] for _ in graph.blocks]
+        for block, parent in enumerate(self.idom):
+            if parent != -1 and block != 0:
+                children[parent].append(block)
+        tracked = self.variables
+        # The current value of each variable, by name
+        stacks: dict[str, list[int]] = {var.name: [] for var in tracked.variables}
+        if graph.start is not None:
+            for param in graph.start.params:
+                value = self._new_value()
+                self.params.append(value)
+                stacks[param.name].append(value)
+
+        def current(var: ir.IRVar) -> int:
+            stack = stacks.get(var.name)
+            if stack is None:
+                return NOT_A_VARIABLE
+            return stack[-1] if stack else UNDEFINED
+
+        # Walk the dominator tree, undoing each block's definitions
+        # after its subtree
+        work: list[tuple[int, list[str] | None]] = [(0, None)]
+        while work:
+            block, pushed = work.pop()
+            if pushed is not None:
+                for name in pushed:
+                    stacks[name].pop()
+                continue
+            pushed = []
+            for phi in self.phis[block]:
+                stacks[phi.var.name].append(phi.value)
+                pushed.append(phi.var.name)
+            operands: list[list[int]] = []
+            results: list[int] = []
+            for insn in graph.blocks[block].instructions:
+                operands.append([current(var) for var in uses(insn)])
+                if (dest := definition(insn)) is not None:
+                    value = self._new_value()
+                    stacks[dest.name].append(value)
+                    pushed.append(dest.name)
+                    results.append(value)
+                else:
+                    results.append(UNDEFINED)
+            self.operands[block] = operands
+            self.results[block] = results
+            for successor in graph.blocks[block].successors:
+                position = graph.blocks[successor].predecessors.index(block)
+                for phi in self.phis[successor]:
+                    phi.args[position] = current(phi.var)
+            work.append((block, pushed))
+            for child in children[block]:
+                work.append((child, None))
@@ -1,14 +1,29 @@
-import re 
+import re
+from array import array
+from bisect import bisect_right
+from collections import deque
 from dataclasses import dataclass
+from mmap import mmap
+from typing import Any, Iterable, Iterator
 
-@dataclass
+@dataclass(slots=True)
 class TokenLocation:
+    """1-based row and column of a token in the source code."""
     row: int
     col: int
 
+    def __eq__(self, other: object) -> bool:
+        # The unknown location (-1, -1), i.e. 'L', matches any location
+        # so tests don't have to spell out where every node came from.
+        if isinstance(other, TokenLocation):
+            if self.row == -1 == self.col or other.row == -1 == other.col:
+                return True
+            return self.row == other.row and self.col == other.col
+        return False
+
 L = TokenLocation(-1, -1)
 
-@dataclass
+@dataclass(slots=True)
 class Token:
     text: str
     type: str
@@ -20,57 +35,201 @@ class Token:
         return False
 
 
+# One alternation over every token class, tried left to right at each position.
+# Comments must come before operators so that '//' isn't lexed as two '/'.
+_token_regex = re.compile(r"""
+    (?P<whitespace>[ \t\r\n]+)
+  | (?P<comment>(?:\#|//)[^\n]*)
+  | (?P<identifier>[a-zA-Z_][a-zA-Z0-9_]*)
+  | (?P<int_literal>[0-9]+)
+  | (?P<operator>!=|==|>=|<=|[<>+\-*/%=])
+  | (?P<punctuation>[{}():;,])
+  | (?P<error>.)
+""", re.VERBOSE | re.DOTALL)
+
+
+# The same scanner over raw bytes, for lexing memory-mapped files.
+_token_regex_bytes = re.compile(_token_regex.pattern.encode(), _token_regex.flags & ~re.UNICODE)
+
+# Raw source code that hasn't been decoded into a 'str'.
+SourceBytes = bytes | bytearray | mmap
+
+
+def line_starts(source_code: str | SourceBytes) -> 'array[int]':
+    """Returns the offset of the first character of every line."""
+    newline: Any = '\n' if isinstance(source_code, str) else b'\n'
+    starts = array('i', [0])
+    pos = source_code.find(newline)
+    while pos != -1:
+        starts.append(pos + 1)
+        pos = source_code.find(newline, pos + 1)
+    return starts
+
+
+def location_of(starts: 'array[int]', offset: int) -> TokenLocation:
+    """Converts a source offset into a row/col using the table from `line_starts`."""
+    row = bisect_right(starts, offset)
+    return TokenLocation(row, offset - starts[row - 1] + 1)
+
+
+def _decode(raw: bytes | bytearray) -> str:
+    # Tokens are ASCII. Anything else is a stray byte we only report.
+    return raw.decode('ascii', errors='replace')
+
+
+def iter_tokens(source_code: str | SourceBytes) -> Iterator[Token]:
+    """Lazily yields the tokens of `source_code` in order.
+
+    The source may also be raw bytes such as a memory-mapped file.
+    Then only the text of each token is decoded, never the whole file.
+    """
+    starts = line_starts(source_code)
+    matches: Iterator[re.Match[Any]]
+    if isinstance(source_code, str):
+        matches = _token_regex.finditer(source_code)
+    else:
+        matches = _token_regex_bytes.finditer(source_code)
+    # Tokens come out in source order, so the current line only ever moves forward.
+    row = 0
+    for m in matches:
+        kind = m.lastgroup
+        if kind == 'whitespace' or kind == 'comment':
+            continue
+        start = m.start()
+        while row + 1 < len(starts) and starts[row + 1] <= start:
+            row += 1
+        loc = TokenLocation(row + 1, start - starts[row] + 1)
+        text = m.group()
+        if not isinstance(text, str):
+            text = _decode(text)
+        if kind == 'error':
+            raise Exception(f'{loc}: unexpected character {text!r}')
+        assert kind is not None
+        yield Token(text, kind, loc)
+
+
 def tokenize(source_code: str) -> list[Token]:
-    pos = 0
-    result = []
-    while pos < len(source_code):
-        whitespace = re.compile("( )|(\t)|(\n)|(\r)")
-        whitespaces = whitespace.match(source_code, pos)
-        if whitespaces is not None:
-            pos+=1
-        
-        comment = re.compile(r"(#|//)[^\n]*")
-        comments = comment.match(source_code, pos)
-        if comments is not None:
-            length = comments.span()[1] - comments.span()[0]
-            pos+=length
-
-        identifier = re.compile("([a-zA-Z_])([a-zA-Z0-9_]*)")
-        identifiers = identifier.match(source_code, pos)
-        if identifiers is not None:
-            start = identifiers.span()[0]
-            end = identifiers.span()[1]
-            length = end - start
-            #result.append(source_code[start:end])
-            result.append(Token(source_code[start:end], "identifier", L))
-            pos+=length
-            
-
-        int_literals = re.compile("[0-9]+")
-        int_lits = int_literals.match(source_code, pos)
-        if int_lits is not None:
-            end = int_lits.span()[1]
-            start = int_lits.span()[0]
-            length = end - start
-            result.append(Token(source_code[start:end], "int_literal", L))
-            pos += length
-            
-        operator = re.compile("!=|==|>=|<=|[<>+-/*%=]")
-        operators = operator.match(source_code, pos)
-        if operators is not None:
-            end = operators.span()[1]
-            start = operators.span()[0]
-            length = end - start
-            result.append(Token(source_code[start:end], "operator", L))
-            pos += length
-
-        punctuation = re.compile("[{}():;,]")
-        punctuations = punctuation.match(source_code, pos)
-        if punctuations is not None:
-            end = punctuations.span()[1]
-            start = punctuations.span()[0]
-            length = end - start
-            result.append(Token(source_code[start:end], "punctuation", L))
-            pos += length
-
-    return result
\ No newline at end of file
+    return list(iter_tokens(source_code))
+
+
+class TokenStream:
+    """Cursor over a token iterator with a bounded lookahead buffer.
+
+    Tokens are pulled from the iterator only as the cursor reaches them,
+    so at most `lookahead` tokens are held in memory at once.
+    `current` is the token under the cursor, or a special 'end' token
+    once the input runs out.
+    """
+
+    def __init__(self, tokens: Iterable[Token], lookahead: int = 2) -> None:
+        self._tokens = iter(tokens)
+        # Tokens after 'current' that have been peeked at
+        self._buffer: deque[Token] = deque()
+        self._lookahead = lookahead
+        self._end: Token | None = None
+        self._last_loc = TokenLocation(0, 0)
+        self.previous: Token | None = None
+        self.current = self._pull()
+
+    def _pull(self) -> Token:
+        if self._end is not None:
+            return self._end
+        token = next(self._tokens, None)
+        if token is None:
+            self._end = Token(text="", type="end", loc=self._last_loc)
+            return self._end
+        self._last_loc = token.loc
+        return token
+
+    def peek(self, offset: int = 0) -> Token:
+        """Returns the token `offset` places ahead without consuming it."""
+        if offset == 0:
+            return self.current
+        if offset >= self._lookahead:
+            raise ValueError(f'lookahead is limited to {self._lookahead} tokens')
+        while len(self._buffer) < offset:
+            self._buffer.append(self._pull())
+        return self._buffer[offset - 1]
+
+    def consume(self) -> Token:
+        """Returns the current token and moves past it."""
+        token = self.current
+        self.previous = token
+        self.current = self._buffer.popleft() if self._buffer else self._pull()
+        return token
+
+
+# Token types in the order of their kind codes in a 'TokenBuffer'.
+TOKEN_KINDS = ('identifier', 'int_literal', 'operator', 'punctuation')
+_kind_codes = {kind: code for code, kind in enumerate(TOKEN_KINDS)}
+
+
+class TokenBuffer:
+    """Compact struct-of-arrays storage for all the tokens of a source file.
+
+    Each token takes three machine integers: its kind code (an index into
+    `TOKEN_KINDS`) and its start and end offsets in `source`.
+    Token text and locations are only materialized when asked for,
+    and iterating yields short-lived 'Token's that 'parse()' accepts.
+
+    The source may also be raw bytes such as a memory-mapped file,
+    in which case token text is decoded only when it is read.
+    Tokens are always ASCII, so byte offsets and character offsets
+    agree on every line that has a token.
+    """
+
+    def __init__(self, source_code: str | SourceBytes) -> None:
+        self.source = source_code
+        self.kinds = array('i')
+        self.starts = array('i')
+        self.ends = array('i')
+        self._line_starts = line_starts(source_code)
+        kinds, starts, ends = self.kinds, self.starts, self.ends
+        matches: Iterator[re.Match[Any]]
+        if isinstance(source_code, str):
+            matches = _token_regex.finditer(source_code)
+        else:
+            matches = _token_regex_bytes.finditer(source_code)
+        for m in matches:
+            kind = m.lastgroup
+            if kind == 'whitespace' or kind == 'comment':
+                continue
+            if kind == 'error':
+                raise Exception(f'{self._loc_at(m.start())}: unexpected character {self._decode(m.start(), m.end())!r}')
+            assert kind is not None
+            kinds.append(_kind_codes[kind])
+            starts.append(m.start())
+            ends.append(m.end())
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def _loc_at(self, offset: int) -> TokenLocation:
+        return location_of(self._line_starts, offset)
+
+    def _decode(self, start: int, end: int) -> str:
+        if isinstance(self.source, str):
+            return self.source[start:end]
+        return _decode(self.source[start:end])
+
+    def text(self, i: int) -> str:
+        return self._decode(self.starts[i], self.ends[i])
+
+    def type(self, i: int) -> str:
+        return TOKEN_KINDS[self.kinds[i]]
+
+    def loc(self, i: int) -> TokenLocation:
+        return self._loc_at(self.starts[i])
+
+    def token(self, i: int) -> Token:
+        return Token(self.text(i), self.type(i), self.loc(i))
+
+    def __iter__(self) -> Iterator[Token]:
+        decode, kinds, starts, ends = self._decode, self.kinds, self.starts, self.ends
+        lines = self._line_starts
+        row = 0
+        for i in range(len(kinds)):
+            start = starts[i]
+            while row + 1 < len(lines) and lines[row + 1] <= start:
+                row += 1
+            yield Token(decode(start, ends[i]), TOKEN_KINDS[kinds[i]], TokenLocation(row + 1, start - lines[row] + 1))
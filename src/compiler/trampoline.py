@@ -0,0 +1,52 @@
+from types import GeneratorType
+from typing import Any, Generator, TypeVar
+
+T = TypeVar('T')
+
+# A suspended step of a recursive computation.
+# It yields the sub-computations it needs (other steps, or plain values
+# that are already known) and is sent back their results.
+Step = Generator[Any, Any, T]
+
+
+def run(step: Step[T]) -> T:
+    """Runs a recursive computation written as nested steps.
+
+    Instead of calling each other, steps yield their sub-steps and
+    this loop keeps the chain of suspended steps on an explicit stack.
+    Nesting depth is then limited only by memory, not by Python's
+    recursion limit or the C stack.
+
+    Exceptions propagate from a step to the step that yielded it,
+    exactly like they would through ordinary calls.
+    """
+    stack: list[Step[Any]] = [step]
+    value: Any = None
+    error: Exception | None = None
+    while True:
+        top = stack[-1]
+        try:
+            if error is None:
+                child = top.send(value)
+            else:
+                # Cleared first: the step may catch it and return at once
+                pending, error = error, None
+                child = top.throw(pending)
+        except StopIteration as stop:
+            stack.pop()
+            if not stack:
+                return stop.value  # type: ignore[no-any-return]
+            value = stop.value
+            continue
+        except Exception as e:
+            stack.pop()
+            if not stack:
+                raise
+            error = e
+            continue
+        if type(child) is GeneratorType:
+            stack.append(child)
+            value = None
+        else:
+            # Already a result, e.g. a leaf node that needed no sub-steps
+            value = child
@@ -3,22 +3,53 @@ from compiler.types import Int, Type, Bool, Unit, FunType
 from compiler.ast import *
 from dataclasses import field
 from typing import Generic, TypeVar
+from compiler.trampoline import Step, run
 
 T = TypeVar('T')
 
 @dataclass
 class SymTab(Generic[T]):
-    """This is supposed to map variable names to types"""
+    """This is supposed to map variable names to types
+
+    Scopes are chained through 'parent': 'mapping' only holds the names
+    declared in this scope and lookups continue in the enclosing ones,
+    so entering a block is O(1) instead of copying every visible name.
+    """
     mapping: dict[str, T]
     current_return_type: Type | None = None
     locals: set[str] = field(default_factory=set)
+    parent: 'SymTab[T] | None' = None
+
+    def child(self) -> 'SymTab[T]':
+        """A new, empty scope nested inside this one."""
+        return SymTab(mapping={}, current_return_type=self.current_return_type, parent=self)
+
+    def scope_of(self, variable_name: str) -> 'SymTab[T] | None':
+        """The innermost scope that defines 'variable_name', if any."""
+        scope: SymTab[T] | None = self
+        while scope is not None and variable_name not in scope.mapping:
+            scope = scope.parent
+        return scope
+
+    def __contains__(self, variable_name: str) -> bool:
+        return self.scope_of(variable_name) is not None
 
     def map(self, variable_name: str) -> T:
-        return self.mapping[variable_name]
+        scope = self.scope_of(variable_name)
+        if scope is None:
+            raise KeyError(variable_name)
+        return scope.mapping[variable_name]
     
     def add_local(self, variable_name: str, variable: T) -> None:
         self.mapping[variable_name] = variable
 
+    def assign(self, variable_name: str, variable: T) -> None:
+        """Updates 'variable_name' in the scope where it is defined."""
+        scope = self.scope_of(variable_name)
+        if scope is None:
+            raise KeyError(variable_name)
+        scope.mapping[variable_name] = variable
+
 
 # Missing currently: ==, != and = (handled as special cases)
 type_mappings = {'+': FunType([Int(), Int()], Int()),
@@ -42,12 +73,18 @@ type_mappings = {'+': FunType([Int(), Int()], Int()),
                 }
 
 def typecheck_node(node: ast.Expression, symtab: SymTab) -> Type:
+    return run(typecheck_step(node, symtab))
+
+
+def typecheck_step(node: ast.Expression, symtab: SymTab) -> Step[Type]:
+    """Type checks 'node' as a step for 'trampoline.run',
+    yielding the checks of its children instead of recursing."""
 
     match node:
         case ast.BinaryOp() if node.op not in ['==', '!=', '=']:
-            t1 = typecheck_node(node.left, symtab)
-            t2 = typecheck_node(node.right, symtab)
-            if node.op not in symtab.mapping: raise Exception(f'Got an unexpected operator {node.op}')
+            t1 = yield typecheck_step(node.left, symtab)
+            t2 = yield typecheck_step(node.right, symtab)
+            if node.op not in symtab: raise Exception(f'Got an unexpected operator {node.op}')
             
             func_type = symtab.map(node.op)
             if not isinstance(func_type, FunType): raise Exception(f'Got {func_type}, not FunType in type checking a BinaryOp')
@@ -57,35 +94,35 @@ def typecheck_node(node: ast.Expression, symtab: SymTab) -> Type:
             node.type = func_type.return_type
             return func_type.return_type
         case ast.BinaryOp() if node.op in ['==', '!=', 'or', 'and']:
-            t1 = typecheck_node(node.left, symtab)
-            t2 = typecheck_node(node.right, symtab)
+            t1 = yield typecheck_step(node.left, symtab)
+            t2 = yield typecheck_step(node.right, symtab)
 
             if type(t1) != type(t2): raise Exception(f'Expected two of the same type, got {t1} and {t2}')
             node.type = Bool()
             return Bool()
         
         case ast.BinaryOp() if node.op == '=':
-            t1 = typecheck_node(node.left, symtab)
-            typecheck_node(node.right, symtab)
+            t1 = yield typecheck_step(node.left, symtab)
+            yield typecheck_step(node.right, symtab)
             # For chained assignment (a = b = c), find the innermost assigned value's type
             rhs = node.right
             while isinstance(rhs, ast.BinaryOp) and rhs.op == '=':
                 rhs = rhs.right
             t_value = rhs.type
             if isinstance(node.left, Identifier):
-                symtab.mapping[node.left.name] = t_value
+                symtab.assign(node.left.name, t_value)
 
             if t1 != t_value: raise Exception(f'Assignment requires both sides to have the same types, got {t1} and {t_value}')
             
             node.type = Unit()
             return Unit()
         case ast.IfStatement():
-            t1 = typecheck_node(node.first_expr, symtab)
+            t1 = yield typecheck_step(node.first_expr, symtab)
             if t1 != Bool():
                 raise Exception(f"Was expecting the condition to be type Bool but got {t1}")
-            t2 = typecheck_node(node.second_expr, symtab)
+            t2 = yield typecheck_step(node.second_expr, symtab)
             if node.the_else is not None and node.third_expr is not None:
-                t3 = typecheck_node(node.third_expr, symtab)
+                t3 = yield typecheck_step(node.third_expr, symtab)
                 if t2 != t3:
                     raise Exception(f"Was expecting the 2nd and 3rd expressions to have same types but got {t2} and {t3}")
             return t2
@@ -102,7 +139,7 @@ def typecheck_node(node: ast.Expression, symtab: SymTab) -> Type:
             node.type = result
             return result
         case ast.VariableDeclaration():
-            tExpr = typecheck_node(node.expression, symtab)
+            tExpr = yield typecheck_step(node.expression, symtab)
             if node.ID.name in symtab.locals:
                 raise Exception(f'Variable {node.ID.name} already declared in this scope')
             symtab.locals.add(node.ID.name)
@@ -111,7 +148,7 @@ def typecheck_node(node: ast.Expression, symtab: SymTab) -> Type:
                 raise Exception(f'Variable declaration type mismatch: declared {node.var_type}, got {tExpr}')
             return Unit()
         case ast.UnaryOperator():
-            tRight = typecheck_node(node.right, symtab)
+            tRight = yield typecheck_step(node.right, symtab)
             
             if node.op == '-' and not isinstance(tRight, Int): raise Exception(f'- expects an Int, got {tRight}')
             if node.op == 'not' and not isinstance(tRight, Bool): raise Exception(f'not expects a Bool, got {tRight}')
@@ -127,7 +164,7 @@ def typecheck_node(node: ast.Expression, symtab: SymTab) -> Type:
                 
             for i, (node_param, func_param) in enumerate(zip(node.arguments, function_type.params)):
                 # typecheck(node.arg) has to match function_type.params
-                param_type: Type = typecheck_node(node_param, symtab)
+                param_type: Type = yield typecheck_step(node_param, symtab)
 
                 if param_type != func_param: raise Exception(f'Parameter {i} of function {function_name.name} expects {func_param}, got {param_type}')
 
@@ -135,17 +172,17 @@ def typecheck_node(node: ast.Expression, symtab: SymTab) -> Type:
             return function_type.return_type
         
         case ast.WhileStatement():
-            tCond = typecheck_node(node.condition_expr, symtab)
+            tCond = yield typecheck_step(node.condition_expr, symtab)
             if not isinstance(tCond, Bool): raise Exception(f'While condition expects Bool, got {tCond}')
             return Unit()
         case ast.Identifier():
-            if node.name not in symtab.mapping:
+            if node.name not in symtab:
                 raise Exception(f'Undefined identifier {node.name}')
             node.type = symtab.map(node.name)
             return node.type
         case ast.Block():
             # Create a new scope for the block
-            block_symtab = SymTab(mapping=symtab.mapping.copy(), current_return_type=symtab.current_return_type)
+            block_symtab = symtab.child()
 
             for expr in node.expressions:
                 if isinstance(expr, ast.FunctionDefinition):
@@ -154,12 +191,16 @@ def typecheck_node(node: ast.Expression, symtab: SymTab) -> Type:
                     block_symtab.mapping[expr.name.name] = func_type
 
 
+            result_type: Type = Unit()
             for expr in node.expressions:
-                typecheck_node(expr, block_symtab)
-                
-            if node.result_expression is not None:
-                result_type = typecheck_node(node.result_expression, block_symtab)
-            else:
+                result_type = yield typecheck_step(expr, block_symtab)
+
+            # Without a trailing semicolon the result expression is the
+            # last expression, which must not be checked twice: for nested
+            # blocks that would double the work at every level.
+            if node.result_expression is not None and (not node.expressions or node.result_expression is not node.expressions[-1]):
+                result_type = yield typecheck_step(node.result_expression, block_symtab)
+            elif node.result_expression is None:
                 result_type = Unit()
             node.type = result_type
             return result_type
@@ -182,18 +223,19 @@ def typecheck_node(node: ast.Expression, symtab: SymTab) -> Type:
 
             symtab.mapping[node.name.name] = func_type
             
-            func_symtab = SymTab(mapping=symtab.mapping.copy(), current_return_type=node.return_type)
+            func_symtab = symtab.child()
+            func_symtab.current_return_type = node.return_type
             
             for param_name, param_type in node.params:
                 func_symtab.mapping[param_name.name] = param_type
             
-            typecheck_node(node.body, func_symtab)
+            yield typecheck_step(node.body, func_symtab)
             
             node.type = Unit()
             return Unit()
         
         case ast.Return():
-            value_type = typecheck_node(node.value, symtab)
+            value_type = yield typecheck_step(node.value, symtab)
             if symtab.current_return_type is None:
                 raise Exception(f'Return statement outside of function')
             if value_type != symtab.current_return_type:
@@ -207,7 +249,8 @@ def typecheck_node(node: ast.Expression, symtab: SymTab) -> Type:
 
 def typecheck(node: ast.Expression, symtab: SymTab | None = None) -> Type:
     if symtab is None:
-        symtab = SymTab(mapping=type_mappings)
+        # A copy, so that compilations never see each other's names
+        symtab = SymTab(mapping=dict(type_mappings))
 
     node_type = typecheck_node(node, symtab)
     node.type = node_type
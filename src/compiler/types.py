@@ -1,26 +1,73 @@
-from dataclasses import dataclass
+from typing import Any, ClassVar, Iterable
 
 
-
-@dataclass
 class Type:
-    """Base Type Class"""
+    """Base Type Class
+
+    Types are interned: constructing the same type twice returns the
+    same object. Equality is therefore identity, and types can be
+    used as dict keys. Types are immutable so they can be shared.
+    """
+    __slots__ = ()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}()'
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # Unpickling goes through the constructor so it stays interned
+        return (type(self), ())
+
+
+class _PrimitiveType(Type):
+    """A type without parameters, with exactly one instance per class."""
+    __slots__ = ()
+    _instance: ClassVar[Type]
+
+    def __init_subclass__(cls) -> None:
+        super().__init_subclass__()
+        cls._instance = object.__new__(cls)
+
+    def __new__(cls) -> Any:
+        return cls._instance
 
-@dataclass
-class Int(Type):
-    #value: int
-    pass
 
-@dataclass
-class Bool(Type):
-    #value: bool
-    pass
+class Int(_PrimitiveType):
+    __slots__ = ()
+
+
+class Bool(_PrimitiveType):
+    __slots__ = ()
+
+
+class Unit(_PrimitiveType):
+    __slots__ = ()
+
 
-@dataclass
 class FunType(Type):
-    params: list[Type]
+    """Function type, hash-consed on its parameter and return types."""
+    __slots__ = ('params', 'return_type')
+    params: tuple[Type, ...]
     return_type: Type
 
-@dataclass
-class Unit(Type):
-    pass
\ No newline at end of file
+    _instances: ClassVar[dict[tuple[tuple[Type, ...], Type], 'FunType']] = {}
+
+    def __new__(cls, params: Iterable[Type], return_type: Type) -> 'FunType':
+        # Parameter and return types are interned already,
+        # so this key hashes and compares by identity.
+        key = (tuple(params), return_type)
+        instance = cls._instances.get(key)
+        if instance is None:
+            instance = object.__new__(cls)
+            object.__setattr__(instance, 'params', key[0])
+            object.__setattr__(instance, 'return_type', return_type)
+            instance = cls._instances.setdefault(key, instance)
+        return instance
+
+    def __repr__(self) -> str:
+        return f'FunType(params={list(self.params)!r}, return_type={self.return_type!r})'
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (FunType, (self.params, self.return_type))
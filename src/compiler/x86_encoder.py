@@ -0,0 +1,483 @@
+"""Encodes Assembly code to x86-64 machine code without running 'as'.
+
+Only the subset of AT&T syntax that 'assembly_generator', 'intrinsics'
+and the standard library in 'assembler' use is supported: 64-bit
+integer instructions on registers, immediates and simple memory
+operands, 8-bit moves and 'set<cc>', jumps and calls, '.ascii' strings
+and symbol assignments like 'x_len = . - x'.
+
+The result is an 'ObjectCode' with unresolved references to symbols,
+which 'elf.link' turns into an executable. Jumps and calls always use
+32-bit displacements, so every instruction's size is known without
+knowing where labels end up and one pass is enough.
+"""
+import re
+import struct
+from dataclasses import dataclass, field
+
+registers_64 = {
+    'rax': 0, 'rcx': 1, 'rdx': 2, 'rbx': 3, 'rsp': 4, 'rbp': 5, 'rsi': 6, 'rdi': 7,
+    'r8': 8, 'r9': 9, 'r10': 10, 'r11': 11, 'r12': 12, 'r13': 13, 'r14': 14, 'r15': 15,
+}
+registers_8 = {
+    'al': 0, 'cl': 1, 'dl': 2, 'bl': 3, 'spl': 4, 'bpl': 5, 'sil': 6, 'dil': 7,
+    **{f'r{n}b': n for n in range(8, 16)},
+}
+
+condition_codes = {
+    'o': 0, 'no': 1, 'b': 2, 'nae': 2, 'ae': 3, 'nb': 3, 'e': 4, 'z': 4, 'ne': 5, 'nz': 5,
+    'be': 6, 'na': 6, 'a': 7, 'nbe': 7, 's': 8, 'ns': 9, 'p': 10, 'np': 11,
+    'l': 12, 'nge': 12, 'ge': 13, 'nl': 13, 'le': 14, 'ng': 14, 'g': 15, 'nle': 15,
+}
+
+# Opcodes of two-operand arithmetic: (r/m <- reg, reg <- r/m, /digit of the immediate forms)
+arithmetic_opcodes = {
+    'add': (0x01, 0x03, 0),
+    'sub': (0x29, 0x2B, 5),
+    'xor': (0x31, 0x33, 6),
+    'cmp': (0x39, 0x3B, 7),
+}
+# Opcodes of one-operand instructions: (opcode, /digit)
+unary_opcodes = {
+    'neg': (0xF7, 3),
+    'idiv': (0xF7, 7),
+    'inc': (0xFF, 0),
+    'dec': (0xFF, 1),
+}
+
+_conditional_jumps = {f'j{cc}': code for cc, code in condition_codes.items()}
+_conditional_sets = {f'set{cc}{suffix}': code for cc, code in condition_codes.items() for suffix in ['', 'b']}
+# Instructions on 64-bit operands, with and without the 'q' suffix
+_quad_mnemonics = {
+    f'{name}{suffix}': name
+    for name in ['mov', 'lea', 'imul', 'push', 'pop', *arithmetic_opcodes, *unary_opcodes]
+    for suffix in ['', 'q']
+}
+
+
+@dataclass(frozen=True)
+class Reg:
+    number: int
+    size: int
+
+
+@dataclass(frozen=True)
+class Imm:
+    value: int
+    symbol: str | None = None
+
+
+@dataclass(frozen=True)
+class Mem:
+    # 'base' is None for '%rip'-relative operands
+    base: int | None
+    disp: int
+    symbol: str | None = None
+
+
+@dataclass(frozen=True)
+class Sym:
+    name: str
+
+
+@dataclass(frozen=True)
+class Indirect:
+    target: Reg | Mem
+
+
+Operand = Reg | Imm | Mem | Sym | Indirect
+
+
+@dataclass
+class Fixup:
+    """A reference to 'symbol' that is filled in at link time.
+
+    'size' bytes at 'offset' get the symbol's address plus 'addend',
+    minus the address of 'end' if 'pc_relative' is set.
+    """
+    offset: int
+    symbol: str
+    size: int
+    pc_relative: bool
+    end: int
+    addend: int = 0
+
+
+@dataclass
+class ObjectCode:
+    """Machine code of one Assembly file, like an object file from 'as'."""
+    code: bytearray = field(default_factory=bytearray)
+    # Offsets of labels in 'code'
+    labels: dict[str, int] = field(default_factory=dict)
+    # Symbols assigned with 'name = ...'
+    constants: dict[str, int] = field(default_factory=dict)
+    global_names: set[str] = field(default_factory=set)
+    fixups: list[Fixup] = field(default_factory=list)
+
+
+def parse_operand(text: str) -> Operand:
+    text = text.strip()
+    if text.startswith('*'):
+        target = parse_operand(text[1:])
+        if not isinstance(target, (Reg, Mem)):
+            raise Exception(f'bad indirect operand {text}')
+        return Indirect(target)
+    if text.startswith('%'):
+        name = text[1:]
+        if name in registers_64:
+            return Reg(registers_64[name], 64)
+        if name in registers_8:
+            return Reg(registers_8[name], 8)
+        raise Exception(f'unsupported register {text}')
+    if text.startswith('$'):
+        value = text[1:].strip()
+        if re.fullmatch(r'-?(0x[0-9a-fA-F]+|\d+)', value):
+            return Imm(int(value, 0))
+        if re.fullmatch(r'[A-Za-z_.][\w.$]*', value):
+            return Imm(0, value)
+        raise Exception(f'unsupported immediate {text}')
+    if (m := re.fullmatch(r'(.*)\(\s*%(\w+)\s*\)', text)) is not None:
+        disp_text, base = m[1].strip(), m[2]
+        if base == 'rip':
+            if re.fullmatch(r'[A-Za-z_.][\w.$]*', disp_text):
+                return Mem(None, 0, disp_text)
+        elif base in registers_64 and re.fullmatch(r'-?(0x[0-9a-fA-F]+|\d+)?', disp_text):
+            return Mem(registers_64[base], int(disp_text, 0) if disp_text else 0)
+        raise Exception(f'unsupported memory operand {text}')
+    if re.fullmatch(r'[A-Za-z_.][\w.$]*', text):
+        return Sym(text)
+    raise Exception(f'unsupported operand {text}')
+
+
+def split_operands(text: str) -> list[str]:
+    # None of the supported operands contain commas
+    return [op.strip() for op in text.split(',')] if text.strip() else []
+
+
+def strip_comment(line: str) -> str:
+    in_string = False
+    escaped = False
+    for i, c in enumerate(line):
+        if escaped:
+            escaped = False
+        elif c == '\\':
+            escaped = in_string
+        elif c == '"':
+            in_string = not in_string
+        elif c == '#' and not in_string:
+            return line[:i]
+    return line
+
+
+def parse_string(text: str) -> bytes:
+    """The bytes of a double-quoted string literal, with backslash escapes."""
+    if not (m := re.fullmatch(r'"((?:[^"\\]|\\.)*)"', text.strip())):
+        raise Exception(f'expected a string literal but got {text}')
+    escapes = {'n': 10, 't': 9, 'r': 13, 'b': 8, 'f': 12, '\\': 92, '"': 34}
+    result = bytearray()
+    body = m[1]
+    i = 0
+    while i < len(body):
+        c = body[i]
+        if c != '\\':
+            result += c.encode()
+            i += 1
+        elif (octal := re.match(r'[0-7]{1,3}', body[i + 1:])) is not None:
+            result.append(int(octal[0], 8) & 0xFF)
+            i += 1 + len(octal[0])
+        elif body[i + 1] in escapes:
+            result.append(escapes[body[i + 1]])
+            i += 2
+        else:
+            raise Exception(f'unsupported escape \\{body[i + 1]}')
+    return bytes(result)
+
+
+class _Encoder:
+    def __init__(self) -> None:
+        self.obj = ObjectCode()
+
+    def constant(self, name: str, expression: str) -> None:
+        """Evaluates 'expression', a sum of numbers, '.' and earlier symbols."""
+        value = 0
+        # Label addresses are only known at link time, but their differences aren't
+        labels = 0
+        for sign, term in re.findall(r'([+-]?)\s*([^\s+-]+)', expression):
+            if term == '.' or term in self.obj.labels:
+                term_value = len(self.obj.code) if term == '.' else self.obj.labels[term]
+                labels += -1 if sign == '-' else 1
+            elif term in self.obj.constants:
+                term_value = self.obj.constants[term]
+            elif re.fullmatch(r'0x[0-9a-fA-F]+|\d+', term):
+                term_value = int(term, 0)
+            else:
+                raise Exception(f'cannot evaluate {term} in {expression}')
+            value += -term_value if sign == '-' else term_value
+        if labels != 0:
+            raise Exception(f'only differences of labels are supported: {expression}')
+        self.obj.constants[name] = value
+
+    def emit(self, data: bytes) -> None:
+        self.obj.code += data
+
+    def rel32(self, opcode: bytes, target: str) -> None:
+        self.emit(opcode)
+        offset = len(self.obj.code)
+        self.emit(bytes(4))
+        self.obj.fixups.append(Fixup(offset, target, 4, True, offset + 4))
+
+    def modrm(
+        self,
+        opcode: bytes,
+        reg: int,
+        rm: Reg | Mem,
+        wide: bool = True,
+        imm: Imm | None = None,
+        imm_size: int = 0,
+        byte_registers: tuple[Reg, ...] = (),
+    ) -> None:
+        """Emits an instruction with a ModRM byte, 'reg' in its reg field
+        and 'rm' as the register or memory operand."""
+        rex = 0x48 if wide else 0x40
+        if reg >= 8:
+            rex |= 0x04
+        tail = bytearray()
+        rip_fixup: str | None = None
+        if isinstance(rm, Reg):
+            if rm.number >= 8:
+                rex |= 0x01
+            tail.append(0xC0 | (reg & 7) << 3 | rm.number & 7)
+        elif rm.base is None:
+            # disp32(%rip)
+            tail.append((reg & 7) << 3 | 0b101)
+            rip_fixup = rm.symbol
+            tail += bytes(4)
+        else:
+            if rm.base >= 8:
+                rex |= 0x01
+            base = rm.base & 7
+            if rm.disp == 0 and base != 0b101:
+                mod = 0b00
+            elif -128 <= rm.disp < 128:
+                mod = 0b01
+            else:
+                mod = 0b10
+            tail.append(mod << 6 | (reg & 7) << 3 | base)
+            if base == 0b100:
+                # %rsp and %r12 as a base need a SIB byte
+                tail.append(0x24)
+            if mod == 0b01:
+                tail += struct.pack('<b', rm.disp)
+            elif mod == 0b10:
+                tail += struct.pack('<i', rm.disp)
+        # %spl, %bpl, %sil and %dil only exist with a REX prefix
+        needs_rex = rex != 0x40 or any(4 <= r.number < 8 for r in byte_registers)
+        start = len(self.obj.code)
+        self.emit((bytes([rex]) if needs_rex else b'') + opcode + tail)
+        if imm is not None:
+            self.immediate(imm, imm_size)
+        if rip_fixup is not None:
+            disp_offset = start + (1 if needs_rex else 0) + len(opcode) + 1
+            self.obj.fixups.append(Fixup(disp_offset, rip_fixup, 4, True, len(self.obj.code)))
+
+    def immediate(self, imm: Imm, size: int) -> None:
+        if imm.symbol is not None:
+            self.obj.fixups.append(Fixup(len(self.obj.code), imm.symbol, size, False, 0, imm.value))
+            self.emit(bytes(size))
+            return
+        formats = {1: '<b', 4: '<i', 8: '<q'}
+        if size == 1 and 128 <= imm.value < 256:
+            self.emit(bytes([imm.value]))
+        elif size == 4 and not -2**31 <= imm.value < 2**31:
+            raise Exception(f'immediate {imm.value} does not fit in 32 bits, use movabsq')
+        else:
+            self.emit(struct.pack(formats[size], imm.value))
+
+    def instruction(self, mnemonic: str, operands: list[Operand]) -> None:
+        if mnemonic in _quad_mnemonics:
+            self.quad_instruction(_quad_mnemonics[mnemonic], operands)
+        elif mnemonic in ('ret', 'retq') and not operands:
+            self.emit(b'\xC3')
+        elif mnemonic in ('cqto', 'cqo') and not operands:
+            self.emit(b'\x48\x99')
+        elif mnemonic == 'syscall' and not operands:
+            self.emit(b'\x0F\x05')
+        elif mnemonic in ('call', 'callq', 'jmp', 'jmpq'):
+            match operands:
+                case [Sym(name)]:
+                    self.rel32(b'\xE8' if mnemonic.startswith('call') else b'\xE9', name)
+                case [Indirect(target)]:
+                    self.modrm(b'\xFF', 2 if mnemonic.startswith('call') else 4, target, wide=False)
+                case _:
+                    raise Exception('bad operands')
+        elif mnemonic in _conditional_jumps:
+            match operands:
+                case [Sym(name)]:
+                    self.rel32(bytes([0x0F, 0x80 | _conditional_jumps[mnemonic]]), name)
+                case _:
+                    raise Exception('bad operands')
+        elif mnemonic in _conditional_sets:
+            match operands:
+                case [Reg(_, 8) as r]:
+                    self.modrm(bytes([0x0F, 0x90 | _conditional_sets[mnemonic]]), 0, r, wide=False, byte_registers=(r,))
+                case [Mem() as mem]:
+                    self.modrm(bytes([0x0F, 0x90 | _conditional_sets[mnemonic]]), 0, mem, wide=False)
+                case _:
+                    raise Exception('bad operands')
+        elif mnemonic == 'movabsq' or mnemonic == 'movabs':
+            match operands:
+                case [Imm() as imm, Reg(number, 64)]:
+                    self.emit(bytes([0x49 if number >= 8 else 0x48, 0xB8 | number & 7]))
+                    self.immediate(imm, 8)
+                case _:
+                    raise Exception('bad operands')
+        elif mnemonic == 'movb':
+            match operands:
+                case [Imm() as imm, Reg(_, 8) | Mem() as dest]:
+                    self.modrm(b'\xC6', 0, dest, wide=False, imm=imm, imm_size=1, byte_registers=_regs(dest))
+                case [Reg(source, 8) as r, Reg(_, 8) | Mem() as dest]:
+                    self.modrm(b'\x88', source, dest, wide=False, byte_registers=(r, *_regs(dest)))
+                case [Mem() as mem, Reg(dest, 8) as r]:
+                    self.modrm(b'\x8A', dest, mem, wide=False, byte_registers=(r,))
+                case _:
+                    raise Exception('bad operands')
+        else:
+            raise Exception('unsupported instruction')
+
+    def quad_instruction(self, name: str, operands: list[Operand]) -> None:
+        for op in operands:
+            if isinstance(op, Reg) and op.size != 64:
+                raise Exception(f'expected a 64-bit register')
+        if name == 'mov':
+            match operands:
+                case [Reg(source), Reg() | Mem() as dest]:
+                    self.modrm(b'\x89', source, dest)
+                case [Mem() as source, Reg(dest)]:
+                    self.modrm(b'\x8B', dest, source)
+                case [Imm() as imm, Reg() | Mem() as dest]:
+                    self.modrm(b'\xC7', 0, dest, imm=imm, imm_size=4)
+                case _:
+                    raise Exception('bad operands')
+        elif name == 'lea':
+            match operands:
+                case [Mem() as source, Reg(dest)]:
+                    self.modrm(b'\x8D', dest, source)
+                case _:
+                    raise Exception('bad operands')
+        elif name in arithmetic_opcodes:
+            to_rm, to_reg, digit = arithmetic_opcodes[name]
+            match operands:
+                case [Reg(source), Reg() | Mem() as dest]:
+                    self.modrm(bytes([to_rm]), source, dest)
+                case [Mem() as source, Reg(dest)]:
+                    self.modrm(bytes([to_reg]), dest, source)
+                case [Imm(value, None) as imm, Reg() | Mem() as dest] if -128 <= value < 128:
+                    self.modrm(b'\x83', digit, dest, imm=imm, imm_size=1)
+                case [Imm() as imm, Reg() | Mem() as dest]:
+                    self.modrm(b'\x81', digit, dest, imm=imm, imm_size=4)
+                case _:
+                    raise Exception('bad operands')
+        elif name == 'imul':
+            match operands:
+                case [Reg() | Mem() as factor, Reg(dest)]:
+                    self.modrm(b'\x0F\xAF', dest, factor)
+                case [Imm() as imm, Reg(dest) as r] | [Imm() as imm, Reg() as r, Reg(dest)]:
+                    if imm.symbol is None and -128 <= imm.value < 128:
+                        self.modrm(b'\x6B', dest, r, imm=imm, imm_size=1)
+                    else:
+                        self.modrm(b'\x69', dest, r, imm=imm, imm_size=4)
+                case _:
+                    raise Exception('bad operands')
+        elif name in unary_opcodes:
+            opcode, digit = unary_opcodes[name]
+            match operands:
+                case [Reg() | Mem() as target]:
+                    self.modrm(bytes([opcode]), digit, target)
+                case _:
+                    raise Exception('bad operands')
+        elif name == 'push':
+            match operands:
+                case [Reg(number)]:
+                    self.emit((b'\x41' if number >= 8 else b'') + bytes([0x50 | number & 7]))
+                case [Imm(value, None) as imm] if -128 <= value < 128:
+                    self.emit(b'\x6A')
+                    self.immediate(imm, 1)
+                case [Imm() as imm]:
+                    self.emit(b'\x68')
+                    self.immediate(imm, 4)
+                case _:
+                    raise Exception('bad operands')
+        elif name == 'pop':
+            match operands:
+                case [Reg(number)]:
+                    self.emit((b'\x41' if number >= 8 else b'') + bytes([0x58 | number & 7]))
+                case _:
+                    raise Exception('bad operands')
+
+
+def _regs(operand: Operand) -> tuple[Reg, ...]:
+    return (operand,) if isinstance(operand, Reg) else ()
+
+
+_label_re = re.compile(r'([A-Za-z_.][\w.$]*):')
+_assignment_re = re.compile(r'([A-Za-z_.][\w.$]*)\s*=\s*(.+)')
+_string_re = re.compile(r'"(?:[^"\\]|\\.)*"')
+
+
+def encode(assembly_code: str) -> ObjectCode:
+    """Encodes one file of Assembly code."""
+    encoder = _Encoder()
+    obj = encoder.obj
+    # Generated code repeats the same few instructions on the same
+    # stack slots a lot. Those that don't refer to symbols encode to
+    # the same bytes every time.
+    encoded: dict[str, bytes] = {}
+    operands: dict[str, Operand] = {}
+
+    def operand(text: str) -> Operand:
+        op = operands.get(text)
+        if op is None:
+            op = operands[text] = parse_operand(text)
+        return op
+
+    for line_number, raw_line in enumerate(assembly_code.split('\n'), start=1):
+        line = (strip_comment(raw_line) if '"' in raw_line else raw_line.partition('#')[0]).strip()
+        if not line:
+            continue
+        cached = encoded.get(line)
+        if cached is not None:
+            obj.code += cached
+            continue
+        try:
+            while ':' in line and (m := _label_re.match(line)) is not None:
+                if m[1] in obj.labels:
+                    raise Exception(f'symbol {m[1]} is already defined')
+                obj.labels[m[1]] = len(obj.code)
+                line = line[m.end():].strip()
+            if not line:
+                continue
+            if '=' in line and (m := _assignment_re.fullmatch(line)) is not None:
+                encoder.constant(m[1], m[2])
+                continue
+            mnemonic, _, rest = line.partition(' ')
+            if mnemonic in ('.global', '.globl'):
+                obj.global_names.update(split_operands(rest))
+            elif mnemonic in ('.extern', '.type', '.size', '.text'):
+                pass
+            elif mnemonic == '.section':
+                if split_operands(rest)[0] != '.text':
+                    raise Exception(f'only .text is supported')
+            elif mnemonic in ('.ascii', '.asciz', '.string'):
+                for string in _string_re.findall(rest):
+                    encoder.emit(parse_string(string) + (b'\0' if mnemonic != '.ascii' else b''))
+            elif mnemonic.startswith('.'):
+                raise Exception(f'unsupported directive {mnemonic}')
+            else:
+                start = len(obj.code)
+                fixups = len(obj.fixups)
+                encoder.instruction(mnemonic, [operand(op) for op in split_operands(rest)])
+                if len(obj.fixups) == fixups:
+                    encoded[line] = bytes(obj.code[start:])
+        except Exception as e:
+            raise Exception(f'{line_number}: {e}: {raw_line.strip()}') from e
+    return obj
@@ -0,0 +1,13 @@
+import os
+
+from compiler.assembler import stdlib_object
+
+
+def test_stdlib_object_is_reused() -> None:
+    with_start = stdlib_object(link_with_c=False)
+    without_start = stdlib_object(link_with_c=True)
+    assert with_start != without_start
+    assert os.path.exists(with_start) and os.path.exists(without_start)
+    mtime = os.stat(with_start).st_mtime_ns
+    assert stdlib_object(link_with_c=False) == with_start
+    assert os.stat(with_start).st_mtime_ns == mtime
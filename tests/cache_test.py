@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+from compiler.__main__ import call_compiler
+from compiler.cache import ExecutableCache
+
+
+def test_cache_keys() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ExecutableCache(directory)
+        key = cache.key('print_int(1)')
+        assert key == cache.key(b'print_int(1)')
+        assert key != cache.key('print_int(2)')
+        assert key != cache.key('print_int(1)', {'backend': 'native'})
+
+
+def test_cache_hits_and_misses() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ExecutableCache(directory)
+        executable = call_compiler('print_int(1)', cache)
+        assert (cache.hits, cache.misses) == (0, 1)
+        assert call_compiler('print_int(1)', cache) == executable
+        assert (cache.hits, cache.misses) == (1, 1)
+        # Compile errors are not cached
+        for _ in range(2):
+            try:
+                call_compiler('1 +', cache)
+            except Exception as e:
+                assert 'expected "("' in str(e)
+            else:
+                assert False, "Should have raised an exception"
+        assert (cache.hits, cache.misses) == (1, 3)
+        assert [name for name in os.listdir(directory)] == [f'{cache.key("print_int(1)", {"backend": "binutils"})}.out']
+
+
+def test_cache_eviction() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ExecutableCache(directory, max_bytes=250)
+        for i, key in enumerate(['a', 'b', 'c']):
+            cache.put(key, bytes(100))
+            os.utime(os.path.join(directory, f'{key}.out'), (i, i))
+        # The least recently used entry goes first
+        assert cache.get('a') is None
+        assert cache.get('b') is not None
+        os.utime(os.path.join(directory, 'b.out'), (3, 3))
+        cache.put('d', bytes(100))
+        assert sorted(os.listdir(directory)) == ['b.out', 'd.out']
+        assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,72 @@
+from compiler import ir
+from compiler.cfg import build_cfgs, linearize
+from compiler.ir import IRVar
+from compiler.tokenizer import L
+from tests.helpers import generate
+
+
+def test_build_cfgs() -> None:
+    instructions = generate('''
+        fun f(a: Int): Int { if a > 0 then return a; return -a; }
+        var x = 10;
+        while x > 0 do { x = x - 1; if x == 3 then break; }
+        f(x)
+    ''')
+    graphs = build_cfgs(instructions)
+    assert linearize(graphs) == instructions
+    assert [graph.name for graph in graphs] == ['main', 'f']
+    main, f = graphs
+    assert main.start is None and f.start is not None and f.start.name == 'f'
+
+    for graph in graphs:
+        for index, block in enumerate(graph.blocks):
+            for successor in block.successors:
+                assert index in graph.blocks[successor].predecessors
+            for predecessor in block.predecessors:
+                assert index in graph.blocks[predecessor].successors
+            # Labels only start blocks and control flow only ends them
+            for insn in block.instructions[1:]:
+                assert not isinstance(insn, ir.Label)
+            for insn in block.instructions[:-1]:
+                assert not isinstance(insn, (ir.Jump, ir.CondJump, ir.Return))
+
+    # The loop: the condition block is entered from before the loop and from the back edge
+    [loop_start] = [i for i, block in enumerate(main.blocks) if block.label and block.label.name.startswith('while_start')]
+    assert len(main.blocks[loop_start].predecessors) == 2
+    assert len(main.blocks[loop_start].successors) == 2
+    # The main program ends by falling out of its last block
+    assert main.blocks[-1].terminator is None and main.blocks[-1].successors == []
+    # Both returns leave the function
+    returns = [block for block in f.blocks if isinstance(block.terminator, ir.Return)]
+    assert len(returns) == 2 and all(block.successors == [] for block in returns)
+
+
+def test_build_cfgs_edge_cases() -> None:
+    # An empty main program and an empty function
+    instructions: list[ir.Instruction] = [ir.FunctionStart(L, 'f', []), ir.FunctionEnd(L, 'f')]
+    graphs = build_cfgs(instructions)
+    assert [len(graph.blocks) for graph in graphs] == [1, 1]
+    assert graphs[0].blocks[0].instructions == [] and graphs[1].blocks[0].instructions == []
+    assert linearize(graphs) == instructions
+
+    # Both branches to the same label give one edge
+    label = ir.Label(L, 'same')
+    graphs = build_cfgs([ir.LoadBoolConst(L, True, IRVar('c')), ir.CondJump(L, IRVar('c'), label, label), label])
+    assert graphs[0].blocks[0].successors == [1]
+    assert graphs[0].blocks[1].predecessors == [0]
+
+    try:
+        build_cfgs([ir.Jump(L, ir.Label(L, 'nowhere'))])
+        assert False, "Should have raised an exception"
+    except Exception as e:
+        assert 'jump to nowhere outside of its function' in str(e)
+
+
+def test_entry_block_is_not_a_jump_target() -> None:
+    loop = ir.Label(L, 'loop')
+    instructions: list[ir.Instruction] = [ir.FunctionStart(L, 'f', []), loop, ir.Jump(L, loop), ir.FunctionEnd(L, 'f')]
+    graphs = build_cfgs(instructions)
+    assert [block.instructions for block in graphs[1].blocks] == [[], [loop, ir.Jump(L, loop)]]
+    assert graphs[1].blocks[0].successors == [1]
+    assert graphs[1].blocks[1].predecessors == [0, 1]
+    assert linearize(graphs) == instructions
@@ -0,0 +1,90 @@
+from compiler import ir
+from compiler.cfg import build_cfgs
+from compiler.dataflow import Definition, Variables, bits, definition, indices, liveness, reaching_definitions, uses
+from compiler.ir import IRVar
+from compiler.tokenizer import L
+from tests.helpers import body, c, counting_loop, end, generate, one, r, x, y
+
+
+def test_bits() -> None:
+    assert bits([0, 3, 70]) == 1 | 8 | 2**70
+    assert list(indices(bits([0, 3, 70]))) == [0, 3, 70]
+    assert list(indices(0)) == []
+
+
+def test_liveness() -> None:
+    [graph] = build_cfgs(counting_loop)
+    result = liveness(graph)
+    variables = result.variables
+    # Operators and built-ins are not variables
+    assert variables.variables == [x, y, c, one, r]
+    assert variables.bit(IRVar('+')) == 0
+
+    def live(bitset: int) -> set[IRVar]:
+        return set(variables.decode(bitset))
+
+    assert [live(bitset) for bitset in result.live_in] == [set(), {x, y}, {x, y}, {x}]
+    assert [live(bitset) for bitset in result.live_out] == [{x, y}, {x, y}, {x, y}, set()]
+    assert [live(bitset) for bitset in result.live_after(graph, 2)] == [{x, y}, {x, y, one}, {x, y}, {x, y}]
+
+
+def test_reaching_definitions() -> None:
+    [graph] = build_cfgs(counting_loop)
+    result = reaching_definitions(graph)
+    assert result.definitions[0] == Definition(x, 0, 0)
+    x_definitions = {Definition(x, 0, 0), Definition(x, 2, 2)}
+
+    def reaching(bitset: int) -> set[Definition]:
+        return {result.definitions[i] for i in indices(bitset)}
+
+    # Both definitions of 'x' reach the loop condition and the end
+    assert {d for d in reaching(result.reach_in[1]) if d.var == x} == x_definitions
+    assert {d for d in reaching(result.reach_in[3]) if d.var == x} == x_definitions
+    # Inside the loop body, the new value replaces both
+    before = result.reaching_before(graph, 2)
+    assert {d for d in reaching(before[2]) if d.var == x} == x_definitions
+    assert {d for d in reaching(result.reach_out[2]) if d.var == x} == {Definition(x, 2, 2)}
+
+    # Variables written only once are not tracked
+    assert not any(d.var == y for d in result.definitions)
+
+    # Parameters are defined on entry
+    start = ir.FunctionStart(L, 'f', [y, x])
+    graphs = build_cfgs([start, ir.CondJump(L, y, body, end), body, ir.LoadIntConst(L, 1, x), end, ir.Return(L, x), ir.FunctionEnd(L, 'f')])
+    result = reaching_definitions(graphs[1])
+    assert reaching(result.reach_in[0]) == {Definition(x, None, 1)}
+    assert reaching(result.reach_in[2]) == {Definition(x, None, 1), Definition(x, 1, 1)}
+
+
+def test_liveness_matches_sets() -> None:
+    instructions = generate('''
+        fun f(a: Int, b: Int): Int { var s = 0; while a > 0 do { s = s + b; a = a - 1; if s > 100 then return s; } s }
+        var i = 0;
+        var n = read_int();
+        while i < n do {
+            if i % 3 == 0 then { i = i + 2; continue; }
+            var j = i;
+            while j > 0 and not (j == 5) do { j = j - 1; if j == 7 then break; }
+            print_int(f(i, j));
+            i = i + 1;
+        }
+        n
+    ''')
+    for graph in build_cfgs(instructions):
+        result = liveness(graph)
+        tracked = set(Variables(graph).variables)
+        # The same analysis with Python sets, iterated until nothing changes
+        live_in: list[set[IRVar]] = [set() for _ in graph.blocks]
+        changed = True
+        while changed:
+            changed = False
+            for index in reversed(range(len(graph.blocks))):
+                live = set().union(*(live_in[s] for s in graph.blocks[index].successors))
+                for insn in reversed(graph.blocks[index].instructions):
+                    if (dest := definition(insn)) is not None:
+                        live.discard(dest)
+                    live |= tracked & set(uses(insn))
+                if live != live_in[index]:
+                    live_in[index] = live
+                    changed = True
+        assert [set(result.variables.decode(bitset)) for bitset in result.live_in] == live_in
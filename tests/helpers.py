@@ -0,0 +1,61 @@
+"""Programs and helpers shared by the tests."""
+import os
+import subprocess
+import tempfile
+
+from compiler import ir
+from compiler.ir import IRVar
+from compiler.ir_generator import generate_ir
+from compiler.parser import parse
+from compiler.tokenizer import L, tokenize
+from compiler.type_checker import type_mappings, typecheck
+
+x, y, c, one, r = IRVar('x'), IRVar('y'), IRVar('c'), IRVar('one'), IRVar('r')
+loop, body, end = ir.Label(L, 'loop'), ir.Label(L, 'body'), ir.Label(L, 'end')
+# var x = 0; var y = 5; while x < y do x = x + 1; print_int(x)
+counting_loop: list[ir.Instruction] = [
+    ir.LoadIntConst(L, 0, x),
+    ir.LoadIntConst(L, 5, y),
+    loop,
+    ir.Call(L, IRVar('<'), [x, y], c),
+    ir.CondJump(L, c, body, end),
+    body,
+    ir.LoadIntConst(L, 1, one),
+    ir.Call(L, IRVar('+'), [x, one], x),
+    ir.Jump(L, loop),
+    end,
+    ir.Call(L, IRVar('print_int'), [x], r),
+]
+
+# Whole programs for end-to-end tests, which read '13' if they read input.
+# The first one is the example program in the repository root.
+with open(os.path.join(os.path.dirname(__file__), '..', 'test')) as f:
+    corpus = [f.read()]
+corpus += [
+    'var i = 0; var s = 0; while i < 20 do { i = i + 1; if i % 3 == 0 then continue; if i > 15 then break; s = s + i; } s',
+    'var i = 0; var n = 0; while i < 5 do { i = i + 1; var j = 0; while true do { j = j + 1; if j > i or j == 3 then break; if j % 2 == 0 and i > 1 then continue; n = n + j; } } n',
+    'var x = read_int(); print_int(x * -3); print_bool(x / 2 >= 3 and not (x == 7)); print_int(x % 4); x - 9223372036854775807',
+    'fun apply(h: (Int) => Int, x: Int): Int { return h(x); } fun sq(x: Int): Int { return x * x; } apply(sq, 12)',
+    'fun g(x: Int): Int { if x < 1 then { return 0; } else { return x + g(x - 1); } } print_bool(g(4) <= 10 or false); g(100)',
+    'fun inc(x: Int): Int { x + 1 } fun show(x: Int): Unit { print_int(x); } fun twice(x: Int): Int { var y = x; y * 2 } show(inc(twice(read_int()))); { 1 + 2 } > 2',
+    'var a = 2 * 3; var b = if a > 5 then a - 1 else 0; var u = a + b; while b > 0 do { var t = b * b; b = b - 1; } print_int(a); print_bool(not false); u',
+    # Traps on division by zero
+    'var z = read_int() - 13; print_int(1); 7 / z',
+]
+
+
+def generate(source_code: str) -> list[ir.Instruction]:
+    """The IR of a source program, through the whole front end."""
+    tree = parse(tokenize(source_code))
+    typecheck(tree)
+    return generate_ir(set(type_mappings.keys()), tree)
+
+
+def run_executable(program: bytes, input: bytes = b'') -> subprocess.CompletedProcess[bytes]:
+    """Runs the executable 'program' with 'input' as its stdin."""
+    with tempfile.TemporaryDirectory() as directory:
+        executable = os.path.join(directory, 'a.out')
+        with open(executable, 'wb') as f:
+            f.write(program)
+        os.chmod(executable, 0o755)
+        return subprocess.run([executable], input=input, capture_output=True)
@@ -29,3 +29,41 @@ def test_ir_generator() -> None:
 
     #for instr in ir_list:
     #    print(instr)
+
+
+def test_ir_generator_deep_nesting() -> None:
+    # Each of these nests far deeper than Python's default recursion limit.
+    n = 5000
+    sources = [
+        ''.join(f'{i} + (' for i in range(n)) + '1' + ')' * n,
+        '{ var x = 1; ' * n + 'x' + ' }' * n,
+        'if true then ' * n + 'print_int(1)',
+        '{ var x = 0; ' + 'while x < 1 do ' * n + 'x = x + 1; x }',
+    ]
+    for source in sources:
+        root_expr = parse(tokenize(source))
+        typecheck(root_expr)
+        ir_list = generate_ir(reserved_names=set(type_mappings.keys()), root_expr=root_expr)
+        assert len(ir_list) >= n
+
+
+def test_ir_generator_break_continue() -> None:
+    root_expr = parse(tokenize('''
+        var i = 0;
+        while true do {
+            i = i + 1;
+            if i > 5 then { break; print_int(99); } else { continue; print_int(98) };
+            print_int(97)
+        }
+        i
+    '''))
+    typecheck(root_expr)
+    ir_list = generate_ir(reserved_names=set(type_mappings.keys()), root_expr=root_expr)
+    constants = [insn.value for insn in ir_list if isinstance(insn, ir.LoadIntConst)]
+    assert constants == [0, 1, 5]
+    # Code after a jump is dropped until a label that is jumped to
+    for insn, next_insn in zip(ir_list, ir_list[1:]):
+        if isinstance(insn, (ir.Jump, ir.CondJump)):
+            assert isinstance(next_insn, ir.Label)
+    labels = {insn.name for insn in ir_list if isinstance(insn, ir.Label)}
+    assert not any(name.startswith('if_end') for name in labels)
@@ -0,0 +1,29 @@
+from compiler.ir import IRVar, LoadIntConst, Opcode, from_compact, to_compact
+from compiler.tokenizer import L
+from tests.helpers import generate
+
+
+def test_compact_ir() -> None:
+    instructions = generate('''
+        fun f(a: Int, b: Bool): Int { if b then return a * 2; return -a; }
+        var x = 9223372036854775807;
+        while x > 0 and not false do { x = x / 2; if x == 3 then break; }
+        f(x, x < 5)
+    ''')
+    code = to_compact(instructions)
+
+    assert len(code) == len(instructions)
+    assert code.opcodes[0] == Opcode.LOAD_INT_CONST
+    assert from_compact(code) == instructions
+    assert [str(insn) for insn in from_compact(code)] == [str(insn) for insn in instructions]
+    # Variables are dense ids, and 'x1' is the first one
+    assert code.variables[code.b[0]] == 'x1'
+    assert len(set(code.variables)) == len(code.variables)
+    assert code.variable_id('x1') == code.b[0]
+    assert code.variable_id('new') == len(code.variables) - 1
+
+    try:
+        to_compact([LoadIntConst(L, 2**64, IRVar('x'))])
+        assert False, "Should have raised an exception"
+    except Exception as e:
+        assert 'does not fit in 64 bits' in str(e)
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import struct
+import tempfile
+import threading
+import zlib
+from base64 import b64decode
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import StreamRequestHandler
+
+from compiler.__main__ import AsyncServer, PreForkTCPServer, handle_request
+from compiler.assembly_generator import generate_assembly
+from compiler.cache import ExecutableCache
+from compiler.type_checker import type_mappings
+from tests.helpers import generate, run_executable
+
+
+def compile_to_assembly(source: str) -> str:
+    return generate_assembly(generate(source))
+
+
+def test_compiles_are_independent() -> None:
+    builtins = dict(type_mappings)
+    sources = [
+        'fun f(x: Int): Int { return x * 2; } var y = f(3); y',
+        'var f = true; while f do { f = false; } f',
+        'fun g(h: (Int) => Int): Int { return h(1); } fun f(x: Int): Int { return x; } g(f)',
+        'var x = 1; { var x = true; x = false }; x',
+    ] * 10
+    expected = [compile_to_assembly(source) for source in sources]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert list(executor.map(compile_to_assembly, sources)) == expected
+    # Names declared by programs don't leak into the builtins
+    assert type_mappings == builtins
+
+
+def test_handle_request() -> None:
+    assert json.loads(handle_request(b'{"command": "ping"}')) == {}
+    assert json.loads(handle_request(b'{"command": "jump"}')) == {"error": "Unknown command: jump"}
+    reply = json.loads(handle_request(json.dumps({"command": "compile", "code": "1 +"}).encode()))
+    assert 'expected "("' in reply["error"]
+
+
+def test_compile_batch() -> None:
+    codes = ["print_int(1)", "1 +", "print_int(2)", "print_int(1)"]
+    request = {"command": "compile_batch", "codes": codes}
+    results = json.loads(handle_request(json.dumps(request).encode(), batch_workers=2))["results"]
+    assert [run_executable(b64decode(results[i]["program"])).stdout for i in (0, 2, 3)] == [b'1\n', b'2\n', b'1\n']
+    assert 'expected "("' in results[1]["error"]
+
+    lines = handle_request(json.dumps({**request, "stream": True}).encode(), batch_workers=2).splitlines()
+    streamed = {reply["index"]: reply for reply in map(json.loads, lines)}
+    assert sorted(streamed) == [0, 1, 2, 3]
+    assert run_executable(b64decode(streamed[2]["program"])).stdout == b'2\n'
+    assert 'expected "("' in streamed[1]["error"]
+
+    reply = json.loads(handle_request(b'{"command": "compile_batch", "codes": "print_int(1)"}'))
+    assert 'must be a list of strings' in reply["error"]
+
+
+def test_binary_reply() -> None:
+    request = {"command": "compile", "code": "print_int(3)", "format": "binary"}
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ExecutableCache(directory)
+        executables = []
+        # The second reply is sent from the cache
+        for _ in range(2):
+            header, executable = handle_request(json.dumps(request).encode(), cache).split(b'\n', 1)
+            assert json.loads(header) == {"size": len(executable)}
+            executables.append(executable)
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert executables[0] == executables[1]
+        assert run_executable(executable).stdout == b'3\n'
+
+    header, compressed = handle_request(json.dumps({**request, "compression": "zlib"}).encode()).split(b'\n', 1)
+    assert json.loads(header) == {"size": len(compressed), "compression": "zlib"}
+    assert run_executable(zlib.decompress(compressed)).stdout == b'3\n'
+
+    reply = json.loads(handle_request(json.dumps({**request, "format": "json", "compression": "zlib"}).encode()))
+    assert reply["compression"] == "zlib"
+    assert run_executable(zlib.decompress(b64decode(reply["program"]))).stdout == b'3\n'
+
+    reply = json.loads(handle_request(json.dumps({**request, "compression": "rar"}).encode()))
+    assert 'Unknown compression: rar' in reply["error"]
+    reply = json.loads(handle_request(json.dumps({**request, "code": "1 +"}).encode()))
+    assert 'expected "("' in reply["error"]
+
+
+def test_prefork_server() -> None:
+    class Handler(StreamRequestHandler):
+        def handle(self) -> None:
+            self.request.sendall(str(os.getpid()).encode())
+
+    server = PreForkTCPServer(('127.0.0.1', 0), Handler, workers=2, max_requests=2)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            server.serve_forever()
+        finally:
+            os._exit(0)
+    server.socket.close()
+    try:
+        worker_pids = []
+        for _ in range(8):
+            with socket.create_connection(('127.0.0.1', server.server_address[1])) as connection:
+                worker_pids.append(int(connection.makefile('rb').read()))
+        # Workers are replaced after two requests
+        assert pid not in worker_pids
+        assert all(worker_pids.count(worker) <= 2 for worker in worker_pids)
+        assert len(set(worker_pids)) >= 4
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+
+def test_async_server() -> None:
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        server = asyncio.run_coroutine_threadsafe(AsyncServer(executor).start('127.0.0.1', 0), loop).result()
+        try:
+            port = server.sockets[0].getsockname()[1]
+            requests = [{"id": i, "command": "compile", "code": f"print_int({i})"} for i in range(20)]
+            requests += [{"id": "bad", "command": "compile", "code": "1 +"}, {"command": "ping"}]
+            requests += [{"id": "batch", "command": "compile_batch", "codes": ["print_int(7)", "1 +"], "stream": True}]
+            requests += [{"id": "binary", "command": "compile", "code": "print_int(8)", "format": "binary", "compression": "zlib"}]
+            with socket.create_connection(('127.0.0.1', port)) as connection:
+                # All requests are sent before reading any reply
+                for request in requests:
+                    payload = json.dumps(request).encode()
+                    connection.sendall(struct.pack('>I', len(payload)) + payload)
+                connection.shutdown(socket.SHUT_WR)
+                stream = connection.makefile('rb')
+                replies = []
+                while (header := stream.read(4)):
+                    reply = json.loads(stream.read(struct.unpack('>I', header)[0]))
+                    if "size" in reply:
+                        reply["data"] = stream.read(reply["size"])
+                    replies.append(reply)
+            # The streamed batch gets a reply per program
+            assert len(replies) == len(requests) + 1
+            by_id = {reply.get("id"): reply for reply in replies if "index" not in reply}
+            for i in range(20):
+                assert run_executable(b64decode(by_id[i]["program"])).stdout == f'{i}\n'.encode()
+            assert 'expected "("' in by_id["bad"]["error"]
+            batch = {reply["index"]: reply for reply in replies if reply.get("id") == "batch"}
+            assert run_executable(b64decode(batch[0]["program"])).stdout == b'7\n'
+            assert 'expected "("' in batch[1]["error"]
+            assert run_executable(zlib.decompress(by_id["binary"]["data"])).stdout == b'8\n'
+            assert by_id[None] == {}
+        finally:
+            server.close()
+            asyncio.run_coroutine_threadsafe(server.wait_closed(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
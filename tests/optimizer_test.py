@@ -0,0 +1,207 @@
+import signal
+import subprocess
+
+from compiler import ir
+from compiler.assembler import assemble_and_get_executable
+from compiler.assembly_generator import generate_assembly
+from compiler.cfg import build_cfgs, linearize
+from compiler.ir import IRVar
+from compiler.optimizer import coalesce_copies, eliminate_dead_code, optimize, propagate_copies, remove_unreachable_blocks, remove_unused_labels, wrap
+from compiler.tokenizer import L
+from tests.helpers import generate, run_executable
+
+
+def run(instructions: list[ir.Instruction], input: bytes = b'') -> subprocess.CompletedProcess[bytes]:
+    return run_executable(assemble_and_get_executable(assembly_code=generate_assembly(instructions), backend='native'), input)
+
+
+def calls(instructions: list[ir.Instruction]) -> list[str]:
+    return [insn.fun.name for insn in instructions if isinstance(insn, ir.Call)]
+
+
+def test_wrap() -> None:
+    assert wrap(2**63) == -2**63
+    assert wrap(-2**63 - 1) == 2**63 - 1
+    assert wrap(5) == 5
+
+
+def test_folding_matches_intrinsics() -> None:
+    # 'INT_MIN' has no literal, but folding computes it
+    numbers = ['0', '1', '-1', '7', '-7', '3', '-3', '9223372036854775807', '(-9223372036854775807 - 1)']
+    lines = []
+    for a in numbers:
+        for b in numbers:
+            for op in ['+', '-', '*', '<', '<=', '>', '>=', '==', '!=']:
+                lines.append(f'print_{"int" if op in "+-*" else "bool"}({a} {op} {b});')
+            if b != '0' and not (a.startswith('(-9') and b == '-1'):
+                lines.append(f'print_int({a} / {b}); print_int({a} % {b});')
+        lines.append(f'print_int(-{a}); print_bool(not ({a} < 0));')
+    instructions = generate('\n'.join(lines))
+    optimized = optimize(instructions)
+    assert set(calls(optimized)) == {'print_int', 'print_bool'}
+    result = run(optimized)
+    assert result.returncode == 0
+    assert result.stdout == run(instructions).stdout
+
+
+def test_traps_are_not_folded() -> None:
+    for source in ['print_int(1 / 0)', 'print_int(5 % (1 - 1))', 'print_int((-9223372036854775807 - 1) / -1)']:
+        optimized = optimize(generate(source))
+        assert calls(optimized)[0] in ('/', '%')
+        assert run(optimized).returncode == -signal.SIGFPE
+
+
+def test_branches_on_constants() -> None:
+    optimized = optimize(generate('var x = 1; if 2 > 3 then x = 5 else { x = x + 1; } while x > 10 do x = x - 1; print_int(x * 3)'))
+    # Only the else branch runs and the loop is never entered
+    load, call = optimized
+    assert isinstance(load, ir.LoadIntConst) and load.value == 6
+    assert isinstance(call, ir.Call) and call.fun == IRVar('print_int') and call.args == [load.dest]
+    assert run(optimized).stdout == b'6\n'
+
+
+def test_values_known_at_runtime() -> None:
+    source = '''
+        fun f(a: Int): Int { return a + 1; }
+        var i = 0;
+        var n = read_int();
+        while i < 3 do { i = i + 1; }
+        print_int(f(i) + n * 0);
+    '''
+    optimized = optimize(generate(source))
+    # Loop variables, parameters and calls are not constants
+    assert calls(optimized) == ['read_int', '<', '+', 'f', '*', '+', 'print_int', '+']
+    assert sum(isinstance(insn, ir.CondJump) for insn in optimized) == 1
+
+
+def test_propagate_copies() -> None:
+    x, y, z, f, r = IRVar('x'), IRVar('y'), IRVar('z'), IRVar('f'), IRVar('r')
+    [graph] = build_cfgs([
+        ir.Call(L, IRVar('read_int'), [], x),
+        ir.Copy(L, x, y),
+        ir.Copy(L, y, z),
+        ir.Call(L, IRVar('print_int'), [z], r),
+        ir.Copy(L, f, y),
+        ir.Call(L, y, [z], r),
+        ir.LoadIntConst(L, 1, x),
+        ir.Call(L, IRVar('print_int'), [z], r),
+    ])
+    assert propagate_copies(graph) == 3
+    assert graph.blocks[0].instructions[2:] == [
+        ir.Copy(L, x, z),
+        # Through both copies
+        ir.Call(L, IRVar('print_int'), [x], r),
+        # Functions are not propagated, and 'z' was copied from the old 'y'
+        ir.Copy(L, f, y),
+        ir.Call(L, y, [z], r),
+        ir.LoadIntConst(L, 1, x),
+        # 'x' has changed since it was copied
+        ir.Call(L, IRVar('print_int'), [z], r),
+    ]
+
+
+def test_coalesce_copies() -> None:
+    optimized = optimize(generate('''
+        fun f(a: Int): Int { var b = a; b = b * 2; return b; }
+        var x = read_int();
+        var y = if x > 0 then x else 0;
+        var z = y;
+        z = z + 1;
+        print_int(f(z) + y);
+    '''))
+    # 'b' becomes 'a', and 'x', 'y' and the result of the 'if' become one
+    [f_start] = [insn for insn in optimized if isinstance(insn, ir.FunctionStart)]
+    assert [insn for insn in optimized if isinstance(insn, ir.Call) and insn.fun.name == '*'][0].dest == f_start.params[0]
+    assert not any(isinstance(insn, ir.Copy) for insn in optimized)
+    assert run(optimized, b'5\n').stdout == b'17\n'
+    assert run(optimized, b'-5\n').stdout == b'2\n'
+
+
+def test_coalesce_returned_copy() -> None:
+    # Merging 'b' into 'a' removes the copy, but 'a' is still returned
+    graphs = build_cfgs(generate('fun f(a: Int): Int { var b = a; b } print_int(f(3))'))
+    assert sum(coalesce_copies(graph) for graph in graphs) == 1
+    coalesced = linearize(graphs)
+    assert not any(isinstance(insn, ir.Copy) for insn in coalesced)
+    assert run(coalesced).stdout == b'3\n'
+
+
+def test_eliminate_dead_code() -> None:
+    x, y, z, q, r, f = IRVar('x'), IRVar('y'), IRVar('z'), IRVar('q'), IRVar('r'), IRVar('f')
+    kept: list[ir.Instruction] = [
+        ir.Call(L, IRVar('read_int'), [], x),
+        ir.LoadIntConst(L, 0, y),
+        # Can trap
+        ir.Call(L, IRVar('/'), [x, y], q),
+        ir.Call(L, IRVar('g'), [x], r),
+        ir.Copy(L, IRVar('g'), f),
+        ir.Call(L, f, [x], r),
+    ]
+    [graph] = build_cfgs([
+        *kept[:2],
+        # Only read by the next one, which is dead too
+        ir.Call(L, IRVar('+'), [x, y], z),
+        ir.Call(L, IRVar('unary_-'), [z], z),
+        ir.Copy(L, IRVar('unit'), r),
+        *kept[2:],
+    ])
+    assert eliminate_dead_code(graph) == 3
+    assert graph.blocks[0].instructions == kept
+
+
+def test_returned_value_is_live() -> None:
+    # The sum is only read by the Return at the end of the body
+    graphs = build_cfgs(generate('fun f1(a: Int): Int { a + 1 } print_int(f1(3))'))
+    for graph in graphs:
+        eliminate_dead_code(graph)
+    assert calls(linearize(graphs)) == ['f1', 'print_int', '+']
+    assert run(linearize(graphs)).stdout == b'4\n'
+
+
+def test_remove_unreachable_code() -> None:
+    x = IRVar('x')
+    start, unused, end = ir.Label(L, 'start'), ir.Label(L, 'unused'), ir.Label(L, 'end')
+    [graph] = build_cfgs([
+        ir.LoadBoolConst(L, True, x),
+        ir.CondJump(L, x, start, end),
+        start,
+        ir.Jump(L, end),
+        ir.LoadIntConst(L, 1, x),
+        unused,
+        ir.Call(L, IRVar('print_int'), [x], x),
+        end,
+        ir.Call(L, IRVar('print_bool'), [x], x),
+    ])
+    # After a jump, and the block after it that nothing jumps to
+    assert remove_unreachable_blocks(graph) == 3
+    assert [block.successors for block in graph.blocks] == [[1, 2], [2], []]
+    assert [block.predecessors for block in graph.blocks] == [[], [0], [0, 1]]
+    assert remove_unused_labels(graph) == 1
+    assert linearize([graph]) == [
+        ir.LoadBoolConst(L, True, x),
+        ir.CondJump(L, x, start, end),
+        start,
+        end,
+        ir.Call(L, IRVar('print_bool'), [x], x),
+    ]
+
+
+def test_function_starting_with_a_loop() -> None:
+    # The loop condition is the first block of 'f', with two back edges.
+    # The value of 'a' on entry still reaches the return.
+    optimized = optimize(generate('''
+        fun f(a: Int): Int {
+            while read_int() > 0 do { if read_int() > 10 then { a = 1; continue; } a = 1; }
+            return a + 0;
+        }
+        print_int(f(7))
+    '''))
+    assert run(optimized, b'0\n').stdout == b'7\n'
+    assert run(optimized, b'1\n20\n0\n').stdout == b'1\n'
+
+
+def test_function_returning_its_last_value() -> None:
+    # The folded sum is still returned without a 'return'
+    optimized = optimize(generate('fun f(a: Int): Int { 1 + 2 } print_int(f(3))'))
+    assert isinstance(optimized[-2], ir.Return)
+    assert run(optimized).stdout == b'3\n'
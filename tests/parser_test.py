@@ -1,5 +1,5 @@
 from compiler.parser import parse
-from compiler.tokenizer import tokenize
+from compiler.tokenizer import tokenize, iter_tokens, TokenBuffer
 from compiler.tokenizer import Token, TokenLocation, L
 from compiler.ast import *
 from compiler.types import Int, Bool
@@ -248,4 +248,54 @@ def test_parser_basics() -> None:
                                                                             the_do=Identifier(location=TokenLocation(row=-1, col=-1), name='do'), 
                                                                             body_expr=BinaryOp(location=TokenLocation(row=-1, col=-1), left=Identifier(location=TokenLocation(row=-1, col=-1), name='x'), op='=', 
                                                                                                right=BinaryOp(location=TokenLocation(row=-1, col=-1), left=Identifier(location=TokenLocation(row=-1, col=-1), name='x'), 
-                                                                                                              op='+', right=Literal(location=TokenLocation(row=-1, col=-1), value=1, type=Int()))))
\ No newline at end of file
+                                                                                                              op='+', right=Literal(location=TokenLocation(row=-1, col=-1), value=1, type=Int()))))
+
+def test_parser_streaming() -> None:
+    source = "{ var x = 1; while x < 10 do x = x * 2; x }"
+    tokens = tokenize(source)
+    assert parse(iter_tokens(source)) == parse(tokens)
+    # The token list passed in is left untouched.
+    assert len(tokens) == len(tokenize(source))
+    assert parse(TokenBuffer(source)) == parse(tokens)
+
+
+def test_parser_precedence() -> None:
+    def shape(e: Expression) -> str:
+        if isinstance(e, BinaryOp):
+            return f'({shape(e.left)} {e.op} {shape(e.right)})'
+        if isinstance(e, UnaryOperator):
+            return f'({e.op} {shape(e.right)})'
+        if isinstance(e, Identifier):
+            return e.name
+        return str(e)
+
+    assert shape(parse(tokenize('a or b and c == d < e + f * g'))) == '(a or (b and (c == (d < (e + (f * g))))))'
+    assert shape(parse(tokenize('a * b + c < d == e and f or g'))) == '((((((a * b) + c) < d) == e) and f) or g)'
+    assert shape(parse(tokenize('a - b - c * d / e % f'))) == '((a - b) - (((c * d) / e) % f))'
+    assert shape(parse(tokenize('x = y = a + -b * c'))) == '(x = (y = (a + ((- b) * c))))'
+    assert shape(parse(tokenize('not a == b or c'))) == '(((not a) == b) or c)'
+
+    for source in ['a + * b', 'var x = or; 1', 'a + or', 'and', 'f(and)']:
+        try:
+            parse(tokenize(source))
+            assert False, "Should have raised an exception"
+        except Exception as e:
+            assert 'unexpected operator' in str(e)
+
+
+def test_parser_compact_nodes() -> None:
+    first = parse(tokenize('if a then b else c'))
+    second = parse(tokenize('if x then y'))
+    assert isinstance(first, IfStatement) and isinstance(second, IfStatement)
+    assert first.the_if is second.the_if
+    assert first.the_then is second.the_then
+    assert second.the_else is None
+
+    loop = parse(tokenize('while a do b'))
+    other_loop = parse(tokenize('while c do d'))
+    assert isinstance(loop, WhileStatement) and isinstance(other_loop, WhileStatement)
+    assert loop.the_do is other_loop.the_do
+
+    # Slotted nodes have no per-instance dict
+    assert not hasattr(first, '__dict__')
+    assert first.first_expr.type is second.first_expr.type
@@ -0,0 +1,70 @@
+from compiler import ast
+from compiler.ir import Jump, Label
+from compiler.parser import parse
+from compiler.serialization import dump_ast, dump_ir, load_ast, load_ir, parse_instruction, parse_instructions
+from compiler.tokenizer import L, tokenize
+from compiler.type_checker import typecheck
+from compiler.types import FunType, Int
+from tests.helpers import generate
+
+source = '''
+    fun apply(f: (Int) => Int, x: Int): Int { return f(x); }
+    fun twice(x: Int): Int { return x * 2; }
+    var big = 99999999999999999999;
+    var i: Int = 0;
+    while i < 10 and not (i == 7) do { i = i + 1; if i % 2 == 0 then continue; }
+    { var b = true; if b then 1 else -2 }
+    apply(twice, i)
+'''
+
+
+def test_ast_round_trip() -> None:
+    tree = parse(tokenize(source))
+    typecheck(tree)
+    loaded = load_ast(dump_ast(tree))
+    assert loaded == tree
+    assert loaded.type is Int()
+
+    assert isinstance(loaded, ast.Block)
+    apply = loaded.expressions[0]
+    assert isinstance(apply, ast.FunctionDefinition)
+    assert apply.params[0][1] is FunType([Int()], Int())
+    # Shared nodes stay shared
+    assert loaded.result_expression is loaded.expressions[-1]
+    loop = loaded.expressions[4]
+    assert isinstance(loop, ast.WhileStatement)
+    assert loop.the_while is ast.KEYWORD_WHILE
+
+    untyped = parse(tokenize('{}; { 1; }; x = y'))
+    assert load_ast(dump_ast(untyped)) == untyped
+
+    try:
+        load_ast(dump_ir([]))
+        assert False, "Should have raised an exception"
+    except Exception as e:
+        assert 'not a serialized AST' in str(e)
+
+    data = bytearray(dump_ast(tree))
+    data[4] = 99
+    try:
+        load_ast(bytes(data))
+        assert False, "Should have raised an exception"
+    except Exception as e:
+        assert 'unsupported AST format version 99' in str(e)
+
+
+def test_ir_round_trip() -> None:
+    instructions = generate(source.replace('99999999999999999999', '-1'))
+    assert load_ir(dump_ir(instructions)) == instructions
+
+    text = '\n'.join(str(insn) for insn in instructions)
+    parsed = parse_instructions(text)
+    assert parsed == instructions
+    assert '\n'.join(str(insn) for insn in parsed) == text
+
+    assert parse_instruction('Jump(Label(while_end_3))') == Jump(L, Label(L, 'while_end_3'))
+    try:
+        parse_instruction('Copy(x1)')
+        assert False, "Should have raised an exception"
+    except Exception as e:
+        assert 'not a valid IR instruction' in str(e)
@@ -0,0 +1,39 @@
+from compiler import ir
+from compiler.cfg import build_cfgs
+from compiler.ssa import NOT_A_VARIABLE, UNDEFINED, SSAForm, dominance_frontiers, dominators
+from compiler.tokenizer import L
+from tests.helpers import body, counting_loop, end, r, x, y
+
+
+def test_dominators() -> None:
+    [graph] = build_cfgs(counting_loop)
+    idom = dominators(graph)
+    assert idom == [0, 0, 1, 1]
+    assert dominance_frontiers(graph, idom) == [set(), {1}, {1}, set()]
+
+    # Unreachable blocks have no dominator
+    [graph] = build_cfgs([ir.Jump(L, end), body, ir.Jump(L, end), end])
+    assert dominators(graph) == [0, -1, 0]
+
+
+def test_ssa_form() -> None:
+    [graph] = build_cfgs(counting_loop)
+    ssa = SSAForm(graph)
+    # Only 'x' is written twice, and its values meet at the loop condition
+    [phi] = ssa.phis[1]
+    assert phi.var == x
+    x0, y0 = ssa.results[0]
+    x1 = ssa.results[2][2]
+    assert phi.args == [x0, x1]
+    # Operands read the closest value: the phi in the loop and after it
+    assert ssa.operands[1][1] == [NOT_A_VARIABLE, phi.value, y0]
+    assert ssa.operands[2][2] == [NOT_A_VARIABLE, phi.value, ssa.results[2][1]]
+    assert ssa.operands[3][1] == [NOT_A_VARIABLE, phi.value]
+    assert ssa.results[1] == [UNDEFINED, ssa.results[1][1], UNDEFINED]
+    assert len(set(value for results in ssa.results for value in results if value != UNDEFINED)) == 6
+
+    # Parameters have values on entry, and a read with no write before it is undefined
+    start = ir.FunctionStart(L, 'f', [y])
+    graphs = build_cfgs([start, ir.Copy(L, x, r), ir.Copy(L, y, x), ir.Return(L, x), ir.FunctionEnd(L, 'f')])
+    ssa = SSAForm(graphs[1])
+    assert ssa.operands[0] == [[UNDEFINED], ssa.params, [ssa.results[0][1]]]
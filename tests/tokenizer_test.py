@@ -1,4 +1,4 @@
-from compiler.tokenizer import tokenize, Token, L
+from compiler.tokenizer import tokenize, iter_tokens, Token, TokenBuffer, TokenLocation, TokenStream, L
 
 def test_tokenizer_basics() -> None:
     assert tokenize('aaa 123 bbb') == [
@@ -47,4 +47,64 @@ def test_tokenizer_basics() -> None:
                         // hello
                         """) == [
         Token(loc=L, type="int_literal", text="123"),
-    ]
\ No newline at end of file
+    ]
+
+def test_tokenizer_locations() -> None:
+    tokens = tokenize("""var x = 1; # one
+    // two
+  x != 20""")
+    assert [(t.text, t.loc.row, t.loc.col) for t in tokens] == [
+        ('var', 1, 1), ('x', 1, 5), ('=', 1, 7), ('1', 1, 9), (';', 1, 10),
+        ('x', 3, 3), ('!=', 3, 5), ('20', 3, 8),
+    ]
+
+    assert [t.type for t in tokenize('f(a, b) - c')] == [
+        'identifier', 'punctuation', 'identifier', 'punctuation',
+        'identifier', 'punctuation', 'operator', 'identifier',
+    ]
+
+    try:
+        tokenize('a\n  ! b')
+        assert False, "Should have raised an exception"
+    except Exception as e:
+        assert 'row=2, col=3' in str(e)
+
+
+def test_token_stream() -> None:
+    stream = TokenStream(iter_tokens('a + 1'))
+    assert stream.peek().text == 'a'
+    assert stream.peek(1).text == '+'
+    assert stream.consume().text == 'a'
+    assert stream.previous is not None and stream.previous.text == 'a'
+    assert stream.consume().text == '+'
+    assert stream.consume().text == '1'
+    assert stream.peek().type == 'end'
+    assert stream.consume().type == 'end'
+
+    try:
+        stream.peek(2)
+        assert False, "Should have raised an exception"
+    except ValueError:
+        pass
+
+
+def test_token_buffer() -> None:
+    source = """fun f(x: Int): Int {
+    return x * 2; // twice
+}
+f(21) >= 42"""
+    buffer = TokenBuffer(source)
+    tokens = tokenize(source)
+    assert len(buffer) == len(tokens)
+    assert [(t.text, t.type, t.loc) for t in buffer] == [(t.text, t.type, t.loc) for t in tokens]
+    assert buffer.text(2) == '('
+    assert buffer.type(3) == 'identifier'
+    assert buffer.loc(len(buffer) - 1) == TokenLocation(4, 10)
+
+
+def test_tokenizer_bytes() -> None:
+    source = "var x = 3; // comment with ünicode\nwhile x > 0 do x = x - 1"
+    expected = [(t.text, t.type, t.loc) for t in tokenize(source)]
+    raw = source.encode()
+    assert [(t.text, t.type, t.loc) for t in iter_tokens(raw)] == expected
+    assert [(t.text, t.type, t.loc) for t in TokenBuffer(raw)] == expected
@@ -0,0 +1,43 @@
+from compiler.trampoline import Step, run
+
+
+def test_trampoline() -> None:
+    def depth(n: int) -> Step[int]:
+        if n == 0:
+            return 0
+        return (yield depth(n - 1)) + 1
+
+    # Far deeper than the recursion limit
+    assert run(depth(100_000)) == 100_000
+
+    def plain_values() -> Step[int]:
+        a = yield 1
+        b = yield 2
+        return a + b
+
+    assert run(plain_values()) == 3
+
+    def fail(n: int) -> Step[int]:
+        if n == 0:
+            raise ValueError('bottom')
+        return (yield fail(n - 1))
+
+    def catch() -> Step[str]:
+        try:
+            yield fail(10)
+        except ValueError as e:
+            return str(e)
+        return 'not raised'
+
+    assert run(catch()) == 'bottom'
+
+    def parent() -> Step[str]:
+        return 'parent got ' + (yield catch())
+
+    assert run(parent()) == 'parent got bottom'
+
+    try:
+        run(fail(5000))
+        assert False, "Should have raised an exception"
+    except ValueError:
+        pass
@@ -1,5 +1,7 @@
 
-from compiler.type_checker import typecheck, SymTab
+from compiler.type_checker import typecheck, SymTab, type_mappings
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
 from compiler.ast import *
 from compiler.types import Int, Bool, Unit, FunType
 from compiler.tokenizer import TokenLocation
@@ -95,3 +97,30 @@ def test_type_checker_features() -> None:
 		location=L
 	)
 	assert typecheck(whileexpr, symtab) == Unit()
+
+
+def test_type_checker_scopes() -> None:
+	root = SymTab(mapping=dict(type_mappings))
+	inner = root.child().child()
+	assert inner.mapping == {}
+	assert inner.map('+') is root.map('+')
+	assert '+' in inner and 'x' not in inner
+
+	# Shadowing stays inside the block, and later
+	# declarations in the outer block are still allowed.
+	tree = parse(tokenize('var x = 1; { var x = true; x }; var y = x + 1; y'))
+	assert typecheck(tree, SymTab(mapping=dict(type_mappings))) == Int()
+
+	# Assignment updates the scope where the name is defined
+	symtab = SymTab(mapping=dict(type_mappings))
+	typecheck(parse(tokenize('var x = 1; { { x = 2 } }')), symtab)
+	block = symtab.child()
+	block.add_local('z', Int())
+	block.child().assign('z', Bool())
+	assert block.mapping['z'] == Bool()
+
+	try:
+		typecheck(parse(tokenize('{ var x = 1 }; x')), SymTab(mapping=dict(type_mappings)))
+		assert False, "Should have raised an exception"
+	except Exception as e:
+		assert 'Undefined identifier x' in str(e)
@@ -0,0 +1,26 @@
+import pickle
+
+from compiler.types import Bool, FunType, Int, Unit
+
+
+def test_types_are_interned() -> None:
+    assert Int() is Int()
+    assert Bool() is Bool()
+    assert Unit() is Unit()
+    assert Int() != Bool()
+
+    f = FunType([Int(), Bool()], Unit())
+    assert f is FunType(params=(Int(), Bool()), return_type=Unit())
+    assert f is not FunType([Bool(), Int()], Unit())
+    assert FunType([f], f) is FunType([FunType([Int(), Bool()], Unit())], f)
+    assert f.params == (Int(), Bool())
+
+    assert {Int(): 'int', f: 'f'}[FunType([Int(), Bool()], Unit())] == 'f'
+    assert pickle.loads(pickle.dumps(f)) is f
+    assert repr(f) == 'FunType(params=[Int(), Bool()], return_type=Unit())'
+
+    try:
+        f.return_type = Int()
+        assert False, "Should have raised an exception"
+    except AttributeError:
+        pass
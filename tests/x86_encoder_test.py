@@ -0,0 +1,48 @@
+from compiler.__main__ import compile_to_assembly
+from compiler.assembler import assemble_and_get_executable
+from compiler.x86_encoder import encode
+from tests.helpers import corpus, run_executable
+
+
+def test_encode() -> None:
+    # Expected bytes are from 'as'
+    expected = {
+        'pushq %rbp': '55',
+        'movq %rsp, %rbp': '4889e5',
+        'subq $24, %rsp': '4883ec18',
+        'movq $-1, -8(%rbp)': '48c745f8ffffffff',
+        'movq -200(%r13), %r9': '4d8b8d38ffffff',
+        'movq (%rsp), %r15': '4c8b3c24',
+        'movabsq $-9223372036854775808, %r10': '49ba0000000000000080',
+        'imulq $1000, %r9': '4d69c9e8030000',
+        'idivq -300(%rbp)': '48f7bdd4feffff',
+        'xor %rax, %rax': '4831c0',
+        'setle %al': '0f9ec0',
+        'movb %sil, (%rsp)': '40883424',
+        'call *-16(%rbp)': 'ff55f0',
+        'cqto': '4899',
+        'ret': 'c3',
+    }
+    for line, code in expected.items():
+        assert encode(line).code.hex() == code, line
+    obj = encode('.global f\nf:\n    jmp .Lend\n    pushq $0\n.Lend:\n    leaq f(%rip), %rax\nf_len = . - f\n')
+    assert obj.labels == {'f': 0, '.Lend': 7}
+    assert obj.constants == {'f_len': 14}
+    assert obj.global_names == {'f'}
+    assert [(f.offset, f.symbol, f.pc_relative, f.end) for f in obj.fixups] == [(1, '.Lend', True, 5), (10, 'f', True, 14)]
+    try:
+        encode('movq $4294967296, %rax')
+        assert False, "Should have raised an exception"
+    except Exception as e:
+        assert str(e).startswith('1: ')
+
+
+def test_native_backend_matches_binutils() -> None:
+    for program in corpus:
+        # Optimized, as the compiler emits it
+        assembly = compile_to_assembly(program)
+        outputs = []
+        for backend in ['binutils', 'native']:
+            run = run_executable(assemble_and_get_executable(assembly, backend=backend), b'13\n')
+            outputs.append((run.returncode, run.stdout, run.stderr))
+        assert outputs[0] == outputs[1], program